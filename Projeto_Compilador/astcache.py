@@ -0,0 +1,103 @@
+# astcache.py - Cache em disco das ASTs, em formato binário
+import os
+import marshal
+import hashlib
+import functools
+import lexer
+import parser
+import tables
+from parser import ASTNode, EMPTY_CHILDREN
+
+# Cabeçalho: MAGIC + versão do formato + impressão digital da gramática
+MAGIC = b"PASAST"
+FORMAT_VERSION = 1
+
+class ASTFormatError(ValueError):
+    """Dados que não são uma AST serializada por esta versão do compilador."""
+
+def grammar_fingerprint():
+    """Impressão digital do lexer e da gramática (que determinam a forma da AST)."""
+    return tables.fingerprint(parser.__file__, lexer.__file__)
+
+@functools.lru_cache(maxsize=None)
+def header():
+    """Cabeçalho esperado (calculado uma vez por processo)."""
+    return b"%s %d %d %s\n" % (MAGIC, FORMAT_VERSION, marshal.version, grammar_fingerprint().encode())
+
+def encode(item):
+    """Converte um nó (ou lista de nós) em tuplos/listas serializáveis pelo marshal.
+
+    Cada nó passa a (tipo, valor, linha, filhos); os filhos mantêm o tipo do
+    contentor (tuplo ou lista) e as listas de nós aninhadas continuam listas.
+    """
+    if item is None:
+        return None
+    if isinstance(item, list):
+        return [encode(child) for child in item]
+    children = item.children
+    if isinstance(children, list):
+        children = [encode(child) for child in children]
+    else:
+        children = tuple(encode(child) for child in children)
+    return (item.type, item.value, item.line, children)
+
+def decode(item):
+    """Operação inversa de encode."""
+    if item is None:
+        return None
+    if isinstance(item, list):
+        return [decode(child) for child in item]
+    node_type, value, line, children = item
+    if isinstance(children, list):
+        children = [decode(child) for child in children]
+    elif children:
+        children = tuple([decode(child) for child in children])
+    else:
+        children = EMPTY_CHILDREN
+    node = ASTNode(node_type, children, value)
+    node.line = line
+    return node
+
+def dumps(ast):
+    """Serializa a AST (cabeçalho + marshal)."""
+    return header() + marshal.dumps(encode(ast))
+
+def loads(data):
+    """Reconstrói a AST; lança ASTFormatError se o cabeçalho não corresponder."""
+    expected = header()
+    if not data.startswith(expected):
+        raise ASTFormatError("AST serializada por outra versão do formato ou da gramática")
+    try:
+        return decode(marshal.loads(data[len(expected):]))
+    except (EOFError, ValueError, TypeError) as e:
+        raise ASTFormatError(f"AST serializada inválida: {e}")
+
+class ASTCache:
+    """ASTs já analisadas, guardadas em <cache_dir>/ast/<sha256 da fonte>.ast.
+
+    Uma entrada escrita por outra versão do formato ou da gramática é tratada
+    como inexistente e substituída na gravação seguinte.
+    """
+
+    def __init__(self, cache_dir):
+        self.ast_dir = os.path.join(cache_dir, "ast")
+
+    def path(self, source_code):
+        digest = hashlib.sha256(source_code.encode('utf-8')).hexdigest()
+        return os.path.join(self.ast_dir, f"{digest}.ast")
+
+    def load(self, source_code):
+        """Devolve a AST guardada para source_code ou None."""
+        try:
+            with open(self.path(source_code), 'rb') as f:
+                return loads(f.read())
+        except (OSError, ASTFormatError):
+            return None
+
+    def store(self, source_code, ast):
+        os.makedirs(self.ast_dir, exist_ok=True)
+        path = self.path(source_code)
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(dumps(ast))
+        os.replace(temp_file, path)
@@ -0,0 +1,954 @@
+# benchmark.py - Medições de desempenho do compilador Pascal
+import sys
+import os
+import gc
+import glob
+import time
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def example_sources():
+    """Lê o código de todos os example*.pas."""
+    sources = []
+    for path in sorted(glob.glob(os.path.join(BENCH_DIR, "example*.pas"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            sources.append(f.read())
+    return sources
+
+def large_source(target_bytes):
+    """Concatena os exemplos até atingir (pelo menos) target_bytes caracteres."""
+    chunk = "\n".join(example_sources())
+    copies = max(1, target_bytes // len(chunk) + 1)
+    return "\n".join([chunk] * copies)
+
+def best_of(function, repeat=3):
+    """Executa function repeat vezes e devolve (melhor tempo, último resultado)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+# ===== BENCHMARKS =====
+
+def bench_lexer(size_mb=2):
+    """Compara o lexer com ER por palavra reservada e o lexer com tabela."""
+    from lexer import build_lexer
+
+    data = large_source(int(size_mb * 1024 * 1024))
+    print(f"Entrada: {len(data) / (1024 * 1024):.1f} MB")
+
+    def count_tokens(lexer):
+        lexer.input(data)
+        lexer.lineno = 1
+        return sum(1 for _ in lexer)
+
+    results = {}
+    for name, reserved_table in (("ER por palavra", False), ("tabela reservada", True)):
+        elapsed, tokens = best_of(lambda: count_tokens(build_lexer(reserved_table)))
+        results[name] = tokens / elapsed
+        print(f"   {name:<18} {tokens} tokens em {elapsed:.3f}s ({tokens / elapsed:,.0f} tokens/s)")
+
+    gain = results["tabela reservada"] / results["ER por palavra"]
+    print(f"   Ganho: {gain:.2f}x")
+    return results
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import io, contextlib
+import main
+with contextlib.redirect_stdout(io.StringIO()):
+    main.compile_file({source!r}, {output!r}, debug=False)
+print(time.perf_counter() - start)
+"""
+
+def bench_startup(runs=5):
+    """Tempo de arranque: import a frio + compilação do example1.pas num processo novo."""
+    import tables
+
+    source = os.path.join(BENCH_DIR, "example1.pas")
+
+    def run_once(tables_dir):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            script = STARTUP_SCRIPT.format(source=source, output=os.path.join(temp_dir, "example1.vm"))
+            env = dict(os.environ, PASCAL_TABLES_DIR=tables_dir or temp_dir)
+            env.pop("PYTHONDONTWRITEBYTECODE", None)  # Mede com bytecode em cache, como numa instalação normal
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, "-c", script], cwd=BENCH_DIR, env=env,
+                                    capture_output=True, text=True, check=True)
+            total = time.perf_counter() - start
+            return float(result.stdout.strip().splitlines()[-1]), total
+
+    # Sem tabelas: cada processo gera o lextab/parsetab num diretório vazio
+    # Com tabelas: o passo de build já correu e os processos só as carregam
+    tables.build_tables()
+    scenarios = (("sem tabelas", None), ("tabelas pré-geradas", tables.TABLES_DIR))
+
+    results = {}
+    for name, tables_dir in scenarios:
+        timings = sorted(run_once(tables_dir) for _ in range(runs))
+        inner, total = timings[len(timings) // 2]
+        results[name] = total
+        print(f"   {name:<20} import+compilação {inner * 1000:7.1f} ms | processo {total * 1000:7.1f} ms (mediana de {runs})")
+
+    print(f"   Ganho: {results['sem tabelas'] / results['tabelas pré-geradas']:.2f}x por invocação")
+    return results
+
+def bench_cache(files=200):
+    """Recompilação sem alterações de um diretório com muitos programas, com e sem cache."""
+    import io
+    import contextlib
+    from main import compile_all_examples
+
+    sources = example_sources()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for i in range(files):
+            with open(os.path.join(temp_dir, f"example{i + 1}.pas"), 'w', encoding='utf-8') as f:
+                f.write(sources[i % len(sources)])
+
+        def build(use_cache):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                compile_all_examples(temp_dir, debug=False, use_cache=use_cache)
+                return time.perf_counter() - start
+
+        full = build(use_cache=False)
+        first = build(use_cache=True)    # Preenche a cache
+        noop = build(use_cache=True)     # Nada mudou
+
+    print(f"   {files} arquivos")
+    print(f"   compilação completa          {full:.3f} s")
+    print(f"   primeira compilação c/ cache {first:.3f} s")
+    print(f"   recompilação sem alterações  {noop:.3f} s ({full / noop:.1f}x mais rápida)")
+    return full, noop
+
+class DictASTNode:
+    """Nó da AST na representação anterior (com __dict__ e lista própria de filhos)."""
+
+    def __init__(self, type, children=None, value=None):
+        self.type = type
+        self.children = list(children) if children else []
+        self.value = value
+        self.line = 0
+
+def bench_ast_memory(size_mb=1):
+    """Memória ocupada pela AST: nós com __dict__ vs. nós com __slots__."""
+    import tracemalloc
+    import parser
+    from compiler import Compiler
+    from profiling import count_ast_nodes
+
+    examples = example_sources()
+    chunk = sum(len(source) for source in examples)
+    sources = examples * max(1, int(size_mb * 1024 * 1024) // chunk + 1)
+    print(f"Entrada: {len(sources)} programas, {sum(map(len, sources)) / (1024 * 1024):.1f} MB")
+
+    def retained(node_class):
+        """Memória que fica ocupada pelas ASTs de todos os programas."""
+        original = parser.ASTNode
+        parser.ASTNode = node_class  # As regras do parser usam o nome global
+        try:
+            compiler = Compiler()
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            trees = [compiler.parse(source) for source in sources]
+            size = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+        finally:
+            parser.ASTNode = original
+        return size, sum(count_ast_nodes(tree) for tree in trees)
+
+    results = {}
+    for name, node_class in (("__dict__", DictASTNode), ("__slots__", parser.ASTNode)):
+        size, nodes = retained(node_class)
+        results[name] = size
+        print(f"   {name:<10} {nodes} nós, {size / (1024 * 1024):7.1f} MB ({size / nodes:.0f} bytes/nó)")
+
+    print(f"   Redução: {1 - results['__slots__'] / results['__dict__']:.0%}")
+    return results
+
+def bench_ast_cache(size_mb=1):
+    """Análise sintática vs. carregamento da AST serializada (astcache)."""
+    import astcache
+    from compiler import Compiler
+
+    examples = example_sources()
+    chunk = sum(len(source) for source in examples)
+    sources = examples * max(1, int(size_mb * 1024 * 1024) // chunk + 1)
+    print(f"Entrada: {len(sources)} programas, {sum(map(len, sources)) / (1024 * 1024):.1f} MB")
+
+    compiler = Compiler()
+    parse_time, trees = best_of(lambda: [compiler.parse(source) for source in sources])
+    blobs = [astcache.dumps(tree) for tree in trees]
+    load_time, _ = best_of(lambda: [astcache.loads(blob) for blob in blobs])
+
+    print(f"   parser (PLY)         {parse_time:.3f} s")
+    print(f"   AST serializada      {load_time:.3f} s ({sum(map(len, blobs)) / 1024:.0f} KB)")
+    print(f"   Ganho: {parse_time / load_time:.1f}x")
+    return parse_time, load_time
+
+def deep_program(blocks=300, depth=10):
+    """Programa sintético com comandos e expressões profundamente aninhados."""
+    def expression(level):
+        if level == 0:
+            return "a"
+        operand = expression(level - 1)
+        return f"(({operand} + b) * (c - {level}) div (b + 1) - a)"
+
+    lines = ["program profundo;", "var a, b, c, i: integer;", "begin", "  a := 1; b := 2; c := 3;"]
+    for block in range(blocks):
+        lines.append(f"  for i := 1 to {block % 7 + 1} do")
+        lines.append(f"    if (a > b) and (c <= {block}) then")
+        lines.append("      begin")
+        lines.append(f"        a := {expression(depth)};")
+        lines.append(f"        while a > {block} do a := a - b;")
+        lines.append("        writeln(a, ' ', b)")
+        lines.append("      end")
+        lines.append("    else")
+        lines.append("      c := c + 1;")
+    lines.append("  writeln(a)")
+    lines.append("end.")
+    return "\n".join(lines)
+
+# Método de cada passe que consulta cada tabela de despacho
+DISPATCH_METHODS = {
+    'SemanticAnalyzer': {'statement_handlers': 'analyze_statement', 'expression_handlers': 'check_expression_type'},
+    'CodeGenerator': {'statement_handlers': 'generate_statement', 'expression_handlers': 'generate_expression'},
+}
+
+def chain_method(pass_class, method_name, table_name):
+    """Cópia de pass_class.method_name com a consulta à tabela table_name trocada por uma cadeia if/elif.
+
+    O método é recompilado a partir do código atual, e a cadeia segue a ordem
+    de DISPATCH: a variante só difere dos passes reais na forma de despacho.
+    """
+    import re
+    import inspect
+    import textwrap
+
+    source = textwrap.dedent(inspect.getsource(getattr(pass_class, method_name)))
+    match = re.search(rf"^( *)handler = self\.{table_name}\.get\((\w+)\.type\)$", source, re.M)
+    assert match, f"{pass_class.__name__}.{method_name} não consulta {table_name}"
+    indent, node = match.groups()
+    prefix, node_types = pass_class.DISPATCH[table_name]
+    chain = [f"{indent}{'if' if position == 0 else 'elif'} {node}.type == {node_type!r}: handler = self.{prefix}{node_type}"
+             for position, node_type in enumerate(node_types)]
+    chain.append(f"{indent}else: handler = None")
+    namespace = dict(vars(sys.modules[pass_class.__module__]))
+    exec(source[:match.start()] + "\n".join(chain) + source[match.end():], namespace)
+    return namespace[method_name]
+
+def chain_dispatch_passes():
+    """Subclasses dos dois passes com as cadeias if/elif usadas antes das tabelas."""
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+
+    variants = [("cadeia if/elif",), ("tabelas", SemanticAnalyzer, CodeGenerator)]
+    for pass_class in (SemanticAnalyzer, CodeGenerator):
+        methods = {method_name: chain_method(pass_class, method_name, table_name)
+                   for table_name, method_name in DISPATCH_METHODS[pass_class.__name__].items()}
+        variants[0] += (type("Chain" + pass_class.__name__, (pass_class,), methods),)
+    return variants
+
+def dispatch_visit(pass_class, make_pass, statements, expressions):
+    """Função que visita todos os nós só com o despacho: os métodos de cada tipo de nó não fazem nada."""
+    stubs = {prefix + node_type: lambda self, node: None
+             for prefix, node_types in pass_class.DISPATCH.values() for node_type in node_types}
+    visitor = make_pass(type("Stub" + pass_class.__name__, (pass_class,), stubs))
+    statement = visitor.analyze_statement if hasattr(visitor, 'analyze_statement') else visitor.generate_statement
+    expression = visitor.check_expression_type if hasattr(visitor, 'check_expression_type') else visitor.generate_expression
+
+    def visit_all():
+        for node in statements:
+            statement(node)
+        for node in expressions:
+            expression(node)
+    return visit_all
+
+def interleaved_best(functions, repeat):
+    """Melhor tempo de cada função, alternando-as em cada ronda para que o ruído da máquina as afete por igual."""
+    best = [None] * len(functions)
+    for _ in range(repeat):
+        for position, function in enumerate(functions):
+            elapsed, _ = best_of(function, 1)
+            if best[position] is None or elapsed < best[position]:
+                best[position] = elapsed
+    return best
+
+def bench_dispatch(blocks=300, depth=10, repeat=5):
+    """Custo por nó dos passes semântico e de geração: cadeias if/elif vs. tabelas de despacho."""
+    import semantic
+    from compiler import Compiler
+    from symboltable import SymbolTable
+
+    ast = Compiler().parse(deep_program(blocks, depth))
+    statements, expressions = [], []
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif node is not None:
+            if node.type in semantic.STATEMENT_TYPES:
+                statements.append(node)
+            elif node.type in semantic.EXPRESSION_TYPES:
+                expressions.append(node)
+            stack.extend(node.children)
+    nodes = len(statements) + len(expressions)
+    print(f"Entrada: {len(statements)} comandos e {len(expressions)} expressões (profundidade {depth})")
+
+    results = {}
+    visits = []  # Visitas só com o despacho: semântica e geração de cada variante
+    gc.disable()  # O lixo dos passes anteriores não deve pesar no seguinte
+    try:
+        for name, analyzer_class, generator_class in chain_dispatch_passes():
+            def analyze():
+                analyzer = analyzer_class()
+                assert analyzer.analyze(ast)
+                return analyzer
+            semantic_time, analyzer = best_of(analyze, repeat)
+            generate_time, code = best_of(lambda: generator_class(analyzer.symbol_table).generate(ast), repeat)
+            visits.append(dispatch_visit(analyzer_class, lambda cls: cls(), statements, expressions))
+            visits.append(dispatch_visit(generator_class, lambda cls: cls(SymbolTable()), statements, expressions))
+            results[name] = [None, None, semantic_time, generate_time, hash(tuple(code))]
+            del analyzer, code
+            gc.collect()
+        
+        # Só o despacho, com as variantes alternadas; os passes sem trabalho são
+        # rápidos, pelo que mais repetições tiram o ruído da medição
+        costs = interleaved_best(visits, repeat * 5)
+        for position, result in enumerate(results.values()):
+            result[0], result[1] = costs[2 * position] / nodes, costs[2 * position + 1] / nodes
+    finally:
+        gc.enable()
+
+    for name, (semantic_dispatch, generate_dispatch, semantic_time, generate_time, _) in results.items():
+        print(f"   {name:<15} despacho: semântica {semantic_dispatch * 1e9:5.1f} ns/nó, geração {generate_dispatch * 1e9:5.1f} ns/nó"
+              f" | passe completo: semântica {semantic_time / nodes * 1e9:5.0f} ns/nó, geração {generate_time / nodes * 1e9:5.0f} ns/nó")
+
+    chain, table = results["cadeia if/elif"], results["tabelas"]
+    assert chain[4] == table[4]
+    # Acima de 1 as tabelas ganham; abaixo, a cadeia if/elif é mais rápida nesse passe
+    print(f"   Despacho (cadeia / tabelas): semântica {chain[0] / table[0]:.2f}x, geração {chain[1] / table[1]:.2f}x")
+    return results
+
+def nested_program(depth=12, names=40, statements=30):
+    """Procedimentos aninhados em profundidade, cada um com muitas variáveis locais.
+
+    O corpo de cada procedimento usa variáveis globais, cuja procura sobe
+    por todos os procedimentos envolventes na árvore de escopos, e as suas
+    (as dos procedimentos envolventes não são acessíveis; ver semantic.bind).
+    """
+    def variables(prefix):
+        return ", ".join(f"{prefix}{i}" for i in range(names))
+
+    def body(level):
+        visible = ["g", f"p{level}_"]
+        lines = []
+        for i in range(statements):
+            target = visible[-1] + str(i % names)
+            source = visible[i % len(visible)] + str((i * 7) % names)
+            other = visible[(i * 3) % len(visible)] + str((i * 13) % names)
+            lines.append(f"{target} := {source} + {other} * 2")
+        return ";\n".join(lines)
+
+    def procedure(level):
+        nested = procedure(level + 1) if level + 1 < depth else ""
+        return (f"procedure proc{level};\nvar {variables(f'p{level}_')}: integer;\n{nested}"
+                f"begin\n{body(level)}\nend;\n")
+
+    return (f"program aninhado;\nvar {variables('g')}: integer;\n{procedure(0)}"
+            f"begin\ng0 := 1\nend.\n")
+
+class DottedSymbolTable:
+    """Tabela de símbolos anterior: chaves 'escopo.nome' num único dicionário."""
+
+    def __init__(self):
+        self.symbols = {}
+        self.scopes = ["global"]
+        self.current_scope = "global"
+
+    def enter_scope(self, scope_name):
+        new_scope = f"{self.current_scope}.{scope_name}"
+        self.scopes.append(new_scope)
+        self.current_scope = new_scope
+        return new_scope
+
+    def exit_scope(self):
+        if len(self.scopes) > 1:
+            self.scopes.pop()
+            self.current_scope = self.scopes[-1]
+        return self.current_scope
+
+    def add_symbol(self, name, type, kind, line, value=None):
+        from symboltable import Symbol
+        key = f"{self.current_scope}.{name}"
+        if key in self.symbols:
+            return False
+        self.symbols[key] = Symbol(name, type, kind, self.current_scope, line, value)
+        return True
+
+    def lookup(self, name, current_scope_only=False):
+        key = f"{self.current_scope}.{name}"
+        if key in self.symbols:
+            return self.symbols[key]
+        if not current_scope_only:
+            scope = self.current_scope
+            while "." in scope:
+                scope = scope.rsplit(".", 1)[0]
+                key = f"{scope}.{name}"
+                if key in self.symbols:
+                    return self.symbols[key]
+        return None
+
+    def add_array_dimensions(self, name, dimensions):
+        symbol = self.lookup(name, True)
+        if symbol:
+            symbol.array_dims = dimensions
+            return True
+        return False
+
+    def add_parameter(self, function_name, param_name, param_type):
+        from symboltable import Symbol
+        function = self.lookup(function_name)
+        if function and (function.kind == "function" or function.kind == "procedure"):
+            function.params.append(Symbol(param_name, param_type, "parameter", function.scope, function.line))
+            return True
+        return False
+
+def bench_symbols(depth=12, names=40, statements=30, repeat=5):
+    """Análise semântica de procedimentos aninhados: chaves com pontos vs. árvore de escopos."""
+    from compiler import Compiler
+    from semantic import SemanticAnalyzer
+    from symboltable import SymbolTable
+
+    ast = Compiler().parse(nested_program(depth, names, statements))
+    print(f"Entrada: {depth} procedimentos aninhados, {names} variáveis cada, {statements} atribuições por corpo")
+
+    def analyze(table_class):
+        analyzer = SemanticAnalyzer()
+        analyzer.symbol_table = table_class()
+        assert analyzer.analyze(ast), analyzer.errors
+        return analyzer
+
+    class CountingSymbolTable(SymbolTable):
+        lookups = 0
+        def lookup(self, name, current_scope_only=False):
+            CountingSymbolTable.lookups += 1
+            return super().lookup(name, current_scope_only)
+
+    analyze(CountingSymbolTable)
+    print(f"   {CountingSymbolTable.lookups} procuras por análise")
+
+    results = {}
+    for name, table_class in (("chaves com pontos", DottedSymbolTable), ("árvore de escopos", SymbolTable)):
+        elapsed, _ = best_of(lambda: analyze(table_class), repeat)
+        results[name] = elapsed
+        print(f"   {name:<18} {elapsed * 1000:7.1f} ms por análise")
+
+    print(f"   Ganho: {results['chaves com pontos'] / results['árvore de escopos']:.2f}x")
+    return results
+
+LOOP_PROGRAM = """
+program Ciclos;
+var i, j, total, x: integer; par: boolean;
+begin
+  total := 0;
+  x := -3;
+  for i := 1 to %(outer)d do
+  begin
+    par := (i mod 2) = 0;
+    if par then total := total + i;
+    for j := 1 to %(inner)d do
+    begin
+      x := x + 1;
+      if x > 100 then x := -5
+    end
+  end;
+  writeln(total, ', ', x)
+end.
+"""
+
+def vm_cost(code, inputs=()):
+    """(instruções no .vm, instruções executadas na EWVM) de um programa."""
+    import ewvm
+    from profiling import count_instructions
+    return count_instructions(code), ewvm.run(code, inputs).steps
+
+def bench_peephole(outer=200, inner=50):
+    """Tamanho do .vm e instruções executadas (interpretador ewvm) com e sem peephole."""
+    from compiler import Compiler
+    from peephole import PeepholeOptimizer
+
+    source = LOOP_PROGRAM % {"outer": outer, "inner": inner}
+    optimizer = PeepholeOptimizer()
+    print(f"Entrada: ciclo {outer} x {inner}")
+    results = {}
+    for name, peephole in (("sem peephole", None), ("com peephole", optimizer)):
+        size, steps = vm_cost(Compiler(peephole=peephole).compile(source))
+        results[name] = steps
+        print(f"   {name:<14} {size:5d} instruções no .vm, {steps:9,d} executadas")
+    print(f"   Instruções executadas: -{1 - results['com peephole'] / results['sem peephole']:.1%}")
+    optimizer.print_report()
+    return results
+
+def bench_release(blocks=300, depth=10, repeat=9):
+    """Tamanho do .vm e tempo de geração: listagem anotada (--debug) vs. --release."""
+    from compiler import Compiler
+    from codegen import CodeGenerator
+
+    compiler = Compiler()
+    ast = compiler.parse(deep_program(blocks, depth))
+    assert compiler.analyze(ast)
+    symbol_table = compiler.analyzer.symbol_table
+    print(f"Entrada: {blocks} blocos de profundidade {depth}")
+
+    results = {}
+    gc.disable()
+    try:
+        for name, release in (("anotado", False), ("release", True)):
+            elapsed, code = best_of(lambda: CodeGenerator(symbol_table, release).generate(ast), repeat)
+            size = len("\n".join(code).encode('utf-8'))
+            results[name] = (elapsed, size, len(code))
+            del code
+            gc.collect()
+    finally:
+        gc.enable()
+
+    for name, (elapsed, size, lines) in results.items():
+        print(f"   {name:<8} {lines:7d} linhas, {size / 1024:8.1f} KiB, geração {elapsed * 1000:7.1f} ms")
+
+    annotated, release = results["anotado"], results["release"]
+    print(f"   Tamanho: -{1 - release[1] / annotated[1]:.1%}, linhas: -{1 - release[2] / annotated[2]:.1%}")
+    return results
+
+ARRAY_PROGRAM = """
+program Vetor;
+var a: array[1..%(size)d] of integer; i: integer;
+begin
+  for i := 1 to 10 do
+    a[i * (%(size)d div 10)] := i;
+  writeln(a[%(size)d])
+end.
+"""
+
+def bench_arrays(sizes=(10, 1000, 100_000, 1_000_000)):
+    """Declaração de arrays globais: um pushi 0 por elemento vs. pushn, por tamanho do array."""
+    from compiler import Compiler
+    from codegen import CodeGenerator
+    import ewvm
+
+    class ElementwiseCodeGenerator(CodeGenerator):
+        """Geração anterior: um pushi 0 por elemento."""
+        def declare_variable(self, var_name, type_node):
+            if type_node.type != 'array_type':
+                return super().declare_variable(var_name, type_node)
+            start_idx, end_idx = type_node.value
+            for _ in range(end_idx - start_idx + 1):
+                self.emit("pushi", 0)
+                self.var_counter += 1
+
+    results = {}
+    for size in sizes:
+        compiler = Compiler()
+        ast = compiler.parse(ARRAY_PROGRAM % {"size": size})
+        assert compiler.analyze(ast)
+        symbol_table = compiler.analyzer.symbol_table
+        for name, generator_class in (("pushi 0 x N", ElementwiseCodeGenerator), ("pushn N", CodeGenerator)):
+            generate_time, code = best_of(lambda: generator_class(symbol_table, True).generate(ast))
+            size_kib = len("\n".join(code).encode('utf-8')) / 1024
+            run_time, result = best_of(lambda: ewvm.run(code))
+            assert result.output == "10\n"
+            results[(size, name)] = (len(code), size_kib, generate_time, run_time, result.steps)
+            print(f"   N={size:<9,d} {name:<11} {len(code):9,d} instruções, {size_kib:9.1f} KiB, "
+                  f"geração {generate_time * 1000:8.2f} ms, EWVM {result.steps:9,d} passos em {run_time * 1000:8.1f} ms")
+    return results
+
+CONST_PROGRAM = """
+program Constantes;
+const
+  N = %(iterations)d;
+  WIDTH = 8;
+  AREA = WIDTH * WIDTH;
+  VERBOSE = false;
+var i, total: integer;
+begin
+  total := 0;
+  for i := 1 to N do
+  begin
+    total := total + i mod (AREA - 1) + (WIDTH div 2) * 3 - 1;
+    if VERBOSE and (AREA > 10) then
+      writeln(i, ': ', total)
+  end;
+  writeln(total)
+end.
+"""
+
+def bench_constants(iterations=2000):
+    """Instruções executadas num ciclo com expressões constantes, com e sem avaliação em compilação."""
+    from compiler import Compiler
+    from codegen import CodeGenerator
+
+    compiler = Compiler()
+    ast = compiler.parse(CONST_PROGRAM % {"iterations": iterations})
+    assert compiler.analyze(ast)
+    symbol_table = compiler.analyzer.symbol_table
+    print(f"Entrada: ciclo de {iterations} iterações com expressões sobre constantes")
+
+    folded = CodeGenerator(symbol_table, True).generate(ast)
+    # Sem avaliação: as constantes continuam a ser empilhadas diretamente, mas
+    # as operações sobre elas (e a condição do if) são calculadas na EWVM
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif node is not None:
+            if node.type in ('binary_op', 'unary_op'):
+                node.constant_value = None
+            stack.extend(node.children)
+    unfolded = CodeGenerator(symbol_table, True).generate(ast)
+
+    results = {}
+    for name, code in (("sem avaliação", unfolded), ("com avaliação", folded)):
+        size, steps = vm_cost(code)
+        results[name] = steps
+        print(f"   {name:<14} {size:5d} instruções no .vm, {steps:9,d} executadas")
+    print(f"   Instruções executadas: -{1 - results['com avaliação'] / results['sem avaliação']:.1%}")
+    return results
+
+FOR_LIMIT_PROGRAM = """
+program Limites;
+var texto: string; i, n, k, vogais, total: integer;
+begin
+  texto := 'um texto comprido para contar as vogais de cada palavra';
+  n := %(n)d;
+  k := 3;
+  vogais := 0;
+  total := 0;
+  for i := 1 to length(texto) do
+    if (texto[i] = 97) or (texto[i] = 101) or (texto[i] = 111) then
+      vogais := vogais + 1;
+  for i := 1 to n div 2 * k do
+    total := total + i mod 7;
+  writeln(vogais, ', ', total)
+end.
+"""
+
+def bench_for_limits(n=2000):
+    """Instruções executadas em ciclos for com limites calculados (como em example9.pas)."""
+    from compiler import Compiler
+    from codegen import CodeGenerator
+
+    compiler = Compiler()
+    ast = compiler.parse(FOR_LIMIT_PROGRAM % {"n": n})
+    assert compiler.analyze(ast)
+    symbol_table = compiler.analyzer.symbol_table
+    print(f"Entrada: for até length(texto) e for até n div 2 * k (n = {n})")
+
+    hoisted = CodeGenerator(symbol_table, True).generate(ast)
+    # Sem a posição escondida, o limite volta a ser avaliado em cada iteração
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif node is not None:
+            node.temporary = None
+            stack.extend(node.children)
+    reevaluated = CodeGenerator(symbol_table, True).generate(ast)
+
+    results = {}
+    for name, code in (("limite por iteração", reevaluated), ("limite calculado uma vez", hoisted)):
+        size, steps = vm_cost(code)
+        results[name] = steps
+        print(f"   {name:<25} {size:5d} instruções no .vm, {steps:9,d} executadas")
+    print(f"   Instruções executadas: -{1 - results['limite calculado uma vez'] / results['limite por iteração']:.1%}")
+    return results
+
+SHORT_CIRCUIT_PROGRAM = """
+program Condicoes;
+var i, n, encontrados, limite: integer; texto: string;
+begin
+  n := %(n)d;
+  texto := 'aeiou';
+  encontrados := 0;
+  limite := n div 2;
+  i := 1;
+  while (i <= limite) and (((i * 7 + 3) mod 11 + (i * 13 + 5) mod 17 + (i * i) mod 19) >= 0) do
+  begin
+    if (i mod 2 = 0) or ((i * 31 + 7) mod 23 + (i * 17 + 3) mod 29 + (i * i * i) mod 31 > 40) then
+      encontrados := encontrados + 1;
+    if (i mod 5 = 0) and (texto[(i * i + 3) mod 5 + 1] = 97) then
+      encontrados := encontrados + 10;
+    i := i + 1
+  end;
+  writeln(encontrados)
+end.
+"""
+
+def bench_short_circuit(n=4000):
+    """Instruções executadas com and/or avaliados por inteiro vs. por saltos (operandos da direita caros)."""
+    import ewvm
+    from compiler import Compiler
+
+    source = SHORT_CIRCUIT_PROGRAM % {"n": n}
+    print(f"Entrada: ciclo while de {n // 2} iterações com and/or e operandos da direita caros")
+    results = {}
+    outputs = set()
+    for name, short_circuit in (("avaliação completa", False), ("short-circuit", True)):
+        code = Compiler(release=True, short_circuit=short_circuit).compile(source)
+        outputs.add(ewvm.run(code).output)
+        size, steps = vm_cost(code)
+        results[name] = steps
+        print(f"   {name:<19} {size:5d} instruções no .vm, {steps:9,d} executadas")
+    assert len(outputs) == 1
+    print(f"   Instruções executadas: -{1 - results['short-circuit'] / results['avaliação completa']:.1%}")
+    return results
+
+TAIL_CALL_PROGRAM = """
+program Recursao;
+var r: integer;
+
+function Soma(n, acc: integer): integer;
+begin
+  if n = 0 then
+    Soma := acc
+  else
+    Soma := Soma(n - 1, acc + n);
+end;
+
+function MDC(a, b: integer): integer;
+begin
+  if b = 0 then
+    MDC := a
+  else
+    MDC := MDC(b, a mod b);
+end;
+
+begin
+  r := Soma(%(depth)d, 0);
+  writeln(r, ', ', MDC(r, 832040))
+end.
+"""
+
+def bench_tail_calls(depth=20000):
+    """Recursão final (acumulador e MDC): chamadas normais vs. reutilização do frame."""
+    import ewvm
+    from compiler import Compiler
+    from codegen import CodeGenerator
+
+    class NoTailCalls(CodeGenerator):
+        def find_tail_calls(self, statement_node, found):
+            pass
+
+    compiler = Compiler()
+    ast = compiler.parse(TAIL_CALL_PROGRAM % {"depth": depth})
+    assert compiler.analyze(ast)
+    print(f"Entrada: Soma(n, acc) com profundidade {depth} + MDC")
+    results = {}
+    for name, generator_class in (("chamadas normais", NoTailCalls), ("recursão final", CodeGenerator)):
+        result = ewvm.run(generator_class(compiler.analyzer.symbol_table, True).generate(ast))
+        results[name] = result
+        print(f"   {name:<17} {result.steps:9,d} instruções executadas, pilha máx. {result.max_stack:6,d}, "
+              f"chamadas aninhadas {result.max_calls:6,d}")
+    plain, tail = results["chamadas normais"], results["recursão final"]
+    assert plain.output == tail.output
+    print(f"   Instruções executadas: -{1 - tail.steps / plain.steps:.1%}")
+    return results
+
+def library_program(routines=300, used=5):
+    """Programa com uma biblioteca de routines funções, das quais o bloco principal usa as primeiras used.
+
+    Cada função chama a anterior, pelo que as usadas arrastam consigo a cadeia até F0.
+    """
+    lines = ["program Biblioteca;", "var r: integer;"]
+    for i in range(routines):
+        call = f"F{i - 1}(n - 1)" if i > 0 else "0"
+        lines += [f"function F{i}(n: integer): integer;",
+                  "var k, t: integer;",
+                  "begin",
+                  "  t := 0;",
+                  "  for k := 1 to n do",
+                  "    if (k mod 3 = 0) or (k mod 5 = 0) then",
+                  f"      t := t + k * {i + 1};",
+                  "  if n > 0 then",
+                  f"    t := t + {call};",
+                  f"  F{i} := t",
+                  "end;"]
+    lines.append("begin")
+    lines += [f"  r := F{i}(10);\n  writeln(r);" for i in range(used)]
+    lines.append("end.")
+    return "\n".join(lines)
+
+def bench_dead_code(routines=300, used=5, repeat=5):
+    """Biblioteca de subprogramas quase toda por usar: .vm completo vs. sem o código morto."""
+    import ewvm
+    from compiler import Compiler
+
+    source = library_program(routines, used)
+    print(f"Entrada: {routines} funções, {used} chamadas pelo programa principal")
+    results = {}
+    for name, dead_code in (("tudo", False), ("sem código morto", True)):
+        compiler = Compiler(release=True, dead_code=dead_code)
+        compile_time, code = best_of(lambda: compiler.compile(source), repeat)
+        load_time, _ = best_of(lambda: ewvm.parse_program(code), repeat)
+        size = len("\n".join(code).encode())
+        results[name] = (len(code), size, compile_time, load_time, ewvm.run(code).output)
+        print(f"   {name:<17} {len(code):7d} linhas, {size / 1024:7.1f} KiB, compilação {compile_time * 1000:6.1f} ms, "
+              f"carregamento na VM {load_time * 1000:6.2f} ms")
+    full, pruned = results["tudo"], results["sem código morto"]
+    assert full[4] == pruned[4]
+    print(f"   Removidos {len(compiler.dead_code_result.subprograms)} subprogramas; "
+          f"tamanho -{1 - pruned[1] / full[1]:.1%}, carregamento {full[3] / pruned[3]:.1f}x mais rápido")
+    return results
+
+COMMON_SUBEXPRESSION_PROGRAM = """
+program Vizinhos;
+var i, j, s, d: integer;
+    v: array[1..%(n)d] of integer;
+begin
+  for i := 1 to %(n)d do
+    v[i] := (i * 7) mod 13;
+  s := 0;
+  for j := 1 to %(rounds)d do
+    for i := 2 to %(n)d - 1 do
+    begin
+      d := (v[i - 1] - v[i + 1]) * (v[i - 1] - v[i + 1]);
+      s := s + d + v[i] * v[i] + (v[i] + v[i - 1]) mod 5
+    end;
+  writeln(s)
+end.
+"""
+
+# Entradas dos exemplos na EWVM (example2.pas, ...)
+EXAMPLE_INPUTS = {2: ['3', '9', '4'], 3: ['5'], 4: ['7'], 5: ['1', '2', '3', '4', '5'], 6: ['1011'], 7: ['1011'],
+                  8: ['5', '6'], 9: ['48', '18', '7', '5', '12', '8', 'banana']}
+
+def bench_cse(n=200, rounds=20):
+    """Instruções no .vm e executadas com e sem reutilização de subexpressões comuns."""
+    import ewvm
+    from compiler import Compiler
+    from codegen import CodeGenerator
+
+    programs = []
+    for path in sorted(glob.glob(os.path.join(BENCH_DIR, "example*.pas"))):
+        name = os.path.basename(path)
+        number = int(name[len("example"):-len(".pas")] or 0)
+        with open(path, 'r', encoding='utf-8') as f:
+            programs.append((name, f.read(), EXAMPLE_INPUTS.get(number, [])))
+    programs.append((f"vizinhos ({n} x {rounds})", COMMON_SUBEXPRESSION_PROGRAM % {"n": n, "rounds": rounds}, []))
+
+    results = {}
+    for name, source, inputs in programs:
+        compiler = Compiler()
+        ast = compiler.parse(source)
+        assert compiler.analyze(ast)
+        costs = []
+        outputs = set()
+        for common_subexpressions in (False, True):
+            generator = CodeGenerator(compiler.analyzer.symbol_table, True,
+                                      common_subexpressions=common_subexpressions)
+            code = generator.generate(ast)
+            outputs.add(ewvm.run(code, inputs).output)
+            costs.append(vm_cost(code, inputs))
+        assert len(outputs) == 1
+        (size, steps), (cse_size, cse_steps) = costs
+        results[name] = costs
+        print(f"   {name:<22} .vm {size:5d} -> {cse_size:5d}, executadas {steps:9,d} -> {cse_steps:9,d} "
+              f"(-{1 - cse_steps / steps:.1%})")
+    # Com a redução de força ligada (o padrão) os exemplos não ganham nada
+    examples = [name for name in results if name.startswith("example")]
+    unchanged = sum(1 for name in examples if results[name][0] == results[name][1])
+    print(f"   Exemplos sem diferença com --cse: {unchanged} de {len(examples)}")
+    return results
+
+SWEEP_PROGRAM = """
+program Varrimentos;
+var i, j, t, s: integer;
+    a, b: array[1..%(n)d] of integer;
+begin
+  for i := 1 to %(n)d do
+    a[i] := (i * 7919) mod %(n)d;
+  b[1] := a[1];
+  for i := 2 to %(n)d do
+    b[i] := b[i - 1] + a[i];
+  for i := %(n)d - 1 downto 1 do
+    for j := 1 to i do
+      if a[j] > a[j + 1] then
+      begin
+        t := a[j]; a[j] := a[j + 1]; a[j + 1] := t
+      end;
+  s := 0;
+  for i := 1 to %(n)d do
+    s := s + a[i] * b[i];
+  writeln(s, ', ', a[1], ', ', a[%(n)d])
+end.
+"""
+
+def bench_strength_reduction(n=300):
+    """Ciclos que percorrem arrays (soma prefixa, ordenação, produto interno): endereços calculados vs. mantidos."""
+    import ewvm
+    from compiler import Compiler
+    from codegen import CodeGenerator
+
+    programs = [(f"varrimentos ({n})", SWEEP_PROGRAM % {"n": n}, []),
+                ("example5.pas", open(os.path.join(BENCH_DIR, "example5.pas"), encoding='utf-8').read(),
+                 EXAMPLE_INPUTS[5])]
+    results = {}
+    for name, source, inputs in programs:
+        compiler = Compiler()
+        ast = compiler.parse(source)
+        assert compiler.analyze(ast)
+        costs = []
+        outputs = set()
+        for strength_reduction in (False, True):
+            code = CodeGenerator(compiler.analyzer.symbol_table, True,
+                                 strength_reduction=strength_reduction).generate(ast)
+            outputs.add(ewvm.run(code, inputs).output)
+            costs.append(vm_cost(code, inputs))
+        assert len(outputs) == 1
+        (size, steps), (reduced_size, reduced_steps) = costs
+        results[name] = costs
+        print(f"   {name:<18} .vm {size:5d} -> {reduced_size:5d}, executadas {steps:11,d} -> {reduced_steps:11,d} "
+              f"(-{1 - reduced_steps / steps:.1%})")
+    return results
+
+BENCHMARKS = {
+    'lexer': bench_lexer,
+    'startup': bench_startup,
+    'cache': bench_cache,
+    'ast': bench_ast_memory,
+    'astcache': bench_ast_cache,
+    'dispatch': bench_dispatch,
+    'symbols': bench_symbols,
+    'peephole': bench_peephole,
+    'release': bench_release,
+    'arrays': bench_arrays,
+    'constants': bench_constants,
+    'forlimits': bench_for_limits,
+    'shortcircuit': bench_short_circuit,
+    'tailcalls': bench_tail_calls,
+    'deadcode': bench_dead_code,
+    'cse': bench_cse,
+    'induction': bench_strength_reduction,
+}
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Benchmark desconhecido: {name} (disponíveis: {', '.join(BENCHMARKS)})")
+            return
+        print(f"\n=== BENCHMARK: {name} ===")
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# buildcache.py - Cache incremental dos .vm compilados
+import os
+import json
+import shutil
+import hashlib
+import tables
+
+COMPILER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Fontes cujo conteúdo determina o código gerado
+COMPILER_SOURCES = ("lexer.py", "parser.py", "symboltable.py", "semantic.py", "codegen.py", "compiler.py",
+                    "astcache.py", "visitor.py", "peephole.py", "constfold.py", "ir.py",
+                    "deadcode.py", "cse.py", "induction.py")
+
+MANIFEST_VERSION = 1
+
+def compiler_fingerprint(options=()):
+    """Impressão digital do compilador (fontes + opções que afetam o código gerado)."""
+    paths = [os.path.join(COMPILER_DIR, name) for name in COMPILER_SOURCES]
+    return tables.fingerprint(*paths) + "".join(f"-{option}" for option in options)
+
+def file_hash(path):
+    """SHA-256 do conteúdo de um arquivo."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class BuildCache:
+    """Cache em disco de arquivos .vm, indexada por hash da fonte + versão do compilador.
+
+    Estrutura do diretório:
+        objects/<chave>.vm   código gerado para cada chave
+        manifest.json        entradas por arquivo fonte e estatísticas acumuladas
+    """
+
+    def __init__(self, cache_dir, options=()):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.manifest_file = os.path.join(cache_dir, "manifest.json")
+        self.fingerprint = compiler_fingerprint(options)
+        self.manifest = self.load_manifest()
+        self.pending = {}       # Arquivo fonte -> chave das falhas ainda por guardar
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+
+    def load_manifest(self):
+        """Lê o manifesto (ou cria um vazio se não existir ou for de outra versão)."""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"version": MANIFEST_VERSION, "entries": {}, "objects": {},
+                "stats": {"hits": 0, "misses": 0, "time_saved": 0.0}}
+
+    def key(self, input_file):
+        """Chave de cache: hash da fonte + impressão digital do compilador."""
+        return f"{file_hash(input_file)}-{self.fingerprint}"
+
+    def lookup(self, input_file, output_file):
+        """Verifica a cache para input_file.
+
+        Em caso de acerto garante que output_file está atualizado (sem tocar
+        nele se não mudou, ou copiando-o da cache) e devolve True.
+        """
+        key = self.key(input_file)
+        source = os.path.abspath(input_file)
+        entry = self.manifest["entries"].get(source)
+        object_file = os.path.join(self.objects_dir, f"{key}.vm")
+        compile_time = self.manifest["objects"].get(key)
+
+        if compile_time is None or not os.path.exists(object_file):
+            self.misses += 1
+            self.pending[source] = key
+            return False
+
+        if not (entry and entry["key"] == key and entry["output"] == os.path.abspath(output_file)
+                and self.output_unchanged(entry)):
+            shutil.copyfile(object_file, output_file)
+            self.record_entry(source, key, output_file)
+
+        self.hits += 1
+        self.time_saved += compile_time
+        return True
+
+    def store(self, input_file, output_file, compile_time):
+        """Guarda o resultado de uma compilação que falhou a cache."""
+        source = os.path.abspath(input_file)
+        key = self.pending.pop(source, None) or self.key(input_file)
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        object_file = os.path.join(self.objects_dir, f"{key}.vm")
+        temp_file = f"{object_file}.{os.getpid()}.tmp"
+        shutil.copyfile(output_file, temp_file)
+        os.replace(temp_file, object_file)
+
+        self.manifest["objects"][key] = compile_time
+        self.record_entry(source, key, output_file)
+
+    def output_unchanged(self, entry):
+        """O .vm ainda é o que foi escrito (mesmo tamanho e data de modificação)?"""
+        try:
+            stat = os.stat(entry["output"])
+        except OSError:
+            return False
+        return stat.st_size == entry["output_size"] and stat.st_mtime_ns == entry["output_mtime_ns"]
+
+    def record_entry(self, source, key, output_file):
+        stat = os.stat(output_file)
+        self.manifest["entries"][source] = {
+            "key": key,
+            "output": os.path.abspath(output_file),
+            "output_size": stat.st_size,
+            "output_mtime_ns": stat.st_mtime_ns,
+        }
+
+    def save(self):
+        """Acumula as estatísticas desta execução e escreve o manifesto."""
+        stats = self.manifest["stats"]
+        stats["hits"] += self.hits
+        stats["misses"] += self.misses
+        stats["time_saved"] += self.time_saved
+        stats["last_run"] = {"hits": self.hits, "misses": self.misses, "time_saved": self.time_saved}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_file = f"{self.manifest_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_file, self.manifest_file)
+
+        self.hits = self.misses = 0
+        self.time_saved = 0.0
+
+    def print_stats(self):
+        print(f"Cache: {self.hits} acerto(s), {self.misses} falha(s), {self.time_saved:.3f} s poupados")
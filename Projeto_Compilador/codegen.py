@@ -1,114 +1,128 @@
-from symboltable import SymbolTable
+from symboltable import Storage, REAL, STRING, GLOBAL, LOCAL, PARAMETER, RESULT
+from visitor import NodeVisitor
+from ir import Instruction, Annotation, BLANK, TERMINATORS, BlockBuilder, serialize
+from cse import CommonSubexpressionPlanner
+from induction import InductionVariablePlanner
 
-class CodeGenerator:
-    def __init__(self, symbol_table):
+# Tipos de nó tratados por generate_statement e generate_expression
+STATEMENT_TYPES = ('assignment', 'compound_statement', 'if_statement', 'while_statement',
+                   'for_statement', 'write_statement', 'read_statement', 'procedure_call',
+                   'function_call')
+EXPRESSION_TYPES = ('number', 'string', 'boolean', 'variable', 'function_call', 'array_access',
+                    'length_call', 'binary_op', 'unary_op')
+# Expressões substituídas pelo seu valor quando a análise semântica o calculou
+# (os literais continuam a ser gerados pelos métodos respetivos)
+FOLDED_TYPES = frozenset({'variable', 'binary_op', 'unary_op'})
+
+# Instrução de escrita e conversão da leitura por tipo inferido (por omissão, inteiro;
+# os booleanos são escritos como inteiros e as strings lidas não são convertidas)
+WRITE_INSTRUCTIONS = {STRING: "writes", REAL: "writef"}
+READ_CONVERSIONS = {STRING: None, REAL: "atof"}
+
+class CodeGenerator(NodeVisitor):
+    DISPATCH = {
+        'statement_handlers': ('generate_', STATEMENT_TYPES),
+        'expression_handlers': ('generate_', EXPRESSION_TYPES),
+    }
+    
+    def __init__(self, symbol_table, release=False, short_circuit=False, common_subexpressions=False,
+                 strength_reduction=True):
+        super().__init__()
         self.symbol_table = symbol_table
-        self.code = []
+        # Blocos básicos dos itens gerados (ver ir); builder.append acrescenta ao bloco atual
+        self.builder = BlockBuilder()
+        # Itens imutáveis partilhados por todas as ocorrências (ver ir): cada instrução
+        # e cada comentário são criados uma vez por programa
+        self.instructions = {}  # (opcode, argumento, tipo do argumento) -> Instruction
+        self.comments = {}      # Texto -> Annotation
+        # Listagem anotada (comentários e linhas em branco) exceto no modo release,
+        # em que esses textos nem chegam a ser formatados
+        self.annotate = not release
+        # Condições de if/while com and/or avaliadas por saltos, da esquerda para a
+        # direita e só até o resultado ser conhecido (o Pascal ISO não fixa a ordem)
+        self.short_circuit = short_circuit
+        # Subexpressões repetidas num bloco básico calculadas uma vez (ver cse):
+        # nó -> (Storage da posição escondida, primeira ocorrência), no corpo atual
+        self.common_subexpressions = common_subexpressions
+        self.common_values = {}
+        self.common_addresses = {}
+        # Endereços de a[i] num ciclo for i mantidos numa posição escondida (ver induction):
+        # for_statement -> [(Storage, binding do array)], array_access -> (Storage, deslocamento)
+        self.strength_reduction = strength_reduction
+        self.induction_loops = {}
+        self.induction_accesses = {}
+        self.tail_calls = set()  # Atribuições F := F(...) em posição final na função atual
+        self.frame_size = 0      # Posições reservadas no frame da função atual
         self.label_counter = 0
-        self.current_function = None
-        self.global_vars = {}  # Mapeia nome da variável para índice global
-        self.local_vars = {}   # Mapeia nome da variável para índice local (por função)
-        self.function_vars = {}  # Mapeia função -> {var_name: offset}
+        # Os nomes já vêm resolvidos da análise semântica: cada nó que lê ou
+        # escreve uma variável ou chama um subprograma tem o seu Storage em node.binding
         self.var_counter = 0   # Contador para variáveis globais
-        self.functions = {}    # Mapeia nome da função para informações
-        self.scope_stack = ["global"]  # Pilha de escopos
         
     def generate(self, ast):
-        """Gera código EWVM a partir da AST."""
+        """Gera código EWVM a partir da AST (as linhas do .vm)."""
+        cfg = self.generate_cfg(ast)
+        return serialize(cfg) if cfg is not None else []
+    
+    def generate_cfg(self, ast):
+        """Gera o grafo de fluxo de controlo do programa (None se a AST não for um programa)."""
         if ast is None:
-            return []
+            return None
         
         if ast.type == 'program':
             # Primeiro, declara todas as variáveis globais
             declarations = ast.children[0]
             self.declare_global_variables_only(declarations)
+            main_block = ast.children[1]
+            temporaries = self.symbol_table.global_scope.temporaries
+            temporaries += self.plan_induction_variables(main_block, GLOBAL, self.var_counter + temporaries)
+            temporaries += self.plan_common_subexpressions(main_block, GLOBAL, self.var_counter + temporaries)
+            self.reserve_temporaries(temporaries)
             
             # Marca o início do programa
-            self.code.append("start")
-            self.code.append("")
+            self.emit("start")
+            if self.annotate:
+                self.blank()
             
             # Gera código para o bloco principal
-            main_block = ast.children[1]
             self.generate_compound_statement(main_block)
             
             # Finaliza o programa
-            self.code.append("stop")
-            self.code.append("")
+            self.emit("stop")
+            if self.annotate:
+                self.blank()
             
             # AGORA gera as funções DEPOIS do stop
             self.generate_functions(declarations)
             
-            return self.code
+            return self.builder.finish()
         else:
             print(f"Erro: Nó raiz não é um programa")
-            return []
+            return None
     
-    def enter_function_scope(self, function_name):
-        """Entra no escopo de uma função."""
-        self.scope_stack.append(function_name)
-        self.current_function = function_name
-        self.function_vars[function_name] = {}
-
-    def exit_function_scope(self):
-        """Sai do escopo de uma função."""
-        if len(self.scope_stack) > 1:
-            self.scope_stack.pop()
-            self.current_function = self.scope_stack[-1] if len(self.scope_stack) > 1 else None
-            
-    def is_in_function(self):
-        """Verifica se está dentro de uma função."""
-        return self.current_function is not None and self.current_function != "global"
+    def emit(self, opcode, argument=None):
+        """Acrescenta uma instrução (argument: valor ou rótulo, se a instrução tiver um)."""
+        # 1 e 1.0 são chaves iguais, mas escrevem-se de forma diferente
+        key = (opcode, argument, type(argument))
+        try:
+            instruction = self.instructions[key]
+        except KeyError:
+            instruction = self.instructions[key] = Instruction(opcode, argument)
+        self.builder.append(instruction)
+        if opcode in TERMINATORS:
+            self.builder.end_block()
     
-    def declare_global_variables(self, declarations_node):
-        """Declara variáveis globais e processa declarações de funções."""
-        if declarations_node is None or declarations_node.type != 'declarations':
-            return
-        
-        # Primeiro passo: declara variáveis globais
-        for declaration in declarations_node.children:
-            if declaration.type == 'var_declaration':
-                for var_item in declaration.children:
-                    id_list_node = var_item.children[0]
-                    type_node = var_item.children[1]
-                    
-                    for var_name in id_list_node.value:
-                        # Mapeia a variável para um índice global
-                        self.global_vars[var_name] = self.var_counter
-                        
-                        # Inicializa a variável com valor padrão
-                        if type_node.type == 'array_type':
-                            # Para arrays, inicializa cada elemento
-                            start_idx = type_node.value[0]
-                            end_idx = type_node.value[1]
-                            size = end_idx - start_idx + 1
-                            
-                            self.code.append(f"// Declaração do array {var_name}[{start_idx}..{end_idx}]")
-                            for i in range(size):
-                                self.code.append("pushi 0")
-                                self.var_counter += 1
-                        else:
-                            # Variável simples - inicializa com valor padrão
-                            self.code.append(f"// Declaração da variável {var_name}")
-                            if type_node.value == 'real':
-                                self.code.append("pushf 0.0")
-                            elif type_node.value == 'boolean':
-                                self.code.append("pushi 0")  # false = 0
-                            elif type_node.value == 'string':
-                                self.code.append('pushs ""')
-                            else:  # integer
-                                self.code.append("pushi 0")
-                            
-                            self.var_counter += 1
-    
-        if self.var_counter > 0:
-            self.code.append("")
-        
-        # Segundo passo: gera código para funções
-        for declaration in declarations_node.children:
-            if declaration.type == 'function_declaration':
-                self.generate_function_declaration(declaration)
-            elif declaration.type == 'procedure_declaration':
-                self.generate_procedure_declaration(declaration)
+    def place_label(self, label, subprogram=False):
+        """Começa o bloco básico com o rótulo label (devolvido por new_label ou nome de subprograma)."""
+        self.builder.place_label(label, subprogram)
+    
+    def comment(self, text):
+        annotation = self.comments.get(text)
+        if annotation is None:
+            annotation = self.comments[text] = Annotation(f"// {text}")
+        self.builder.append(annotation)
+    
+    def blank(self):
+        self.builder.append(BLANK)
     
     def declare_global_variables_only(self, declarations_node):
         """Declara apenas variáveis globais, sem processar funções."""
@@ -123,39 +137,93 @@ class CodeGenerator:
                     type_node = var_item.children[1]
                     
                     for var_name in id_list_node.value:
-                        # Mapeia a variável para um índice global
-                        self.global_vars[var_name] = self.var_counter
-                        
-                        # Inicializa a variável com valor padrão
-                        if type_node.type == 'array_type':
-                            # Para arrays, inicializa cada elemento
-                            start_idx = type_node.value[0]
-                            end_idx = type_node.value[1]
-                            size = end_idx - start_idx + 1
-                            
-                            self.code.append(f"// Declaração do array {var_name}[{start_idx}..{end_idx}]")
-                            for i in range(size):
-                                self.code.append("pushi 0")
-                                self.var_counter += 1
-                        else:
-                            # Variável simples - inicializa com valor padrão apropriado
-                            self.code.append(f"// Declaração da variável {var_name}")
-                            if type_node.value == 'real':
-                                self.code.append("pushf 0.0")
-                            elif type_node.value == 'boolean':
-                                self.code.append("pushi 0")  # false = 0
-                            elif type_node.value == 'string':
-                                # Para strings, cria uma string vazia no heap
-                                # Isto cria uma referência de string que é armazenada na variável
-                                self.code.append('pushs ""')
-                            else:  # integer
-                                self.code.append("pushi 0")
-                            
-                            self.var_counter += 1
+                        self.declare_variable(var_name, type_node)
 
-        if self.var_counter > 0:
-            self.code.append("")
+        if self.annotate and self.var_counter > 0:
+            self.blank()
 
+    def declare_variable(self, var_name, type_node):
+        """Reserva e inicializa uma variável global com o valor padrão do seu tipo."""
+        if type_node.type == 'array_type':
+            # Arrays: todos os elementos a 0 com uma única instrução,
+            # qualquer que seja o tamanho
+            start_idx = type_node.value[0]
+            end_idx = type_node.value[1]
+            size = end_idx - start_idx + 1
+            
+            if self.annotate:
+                self.comment(f"Declaração do array {var_name}[{start_idx}..{end_idx}]")
+            self.emit("pushn", size)
+            self.var_counter += size
+        else:
+            # Variável simples - inicializa com valor padrão
+            if self.annotate:
+                self.comment(f"Declaração da variável {var_name}")
+            if type_node.value == 'real':
+                self.emit("pushf", 0.0)
+            elif type_node.value == 'boolean':
+                self.emit("pushi", 0)  # false = 0
+            elif type_node.value == 'string':
+                # Para strings, cria uma string vazia no heap
+                self.emit("pushs", "")
+            else:  # integer
+                self.emit("pushi", 0)
+            
+            self.var_counter += 1
+    
+    def reserve_temporaries(self, count):
+        """Reserva as posições escondidas pedidas pela análise semântica (ex.: limites de ciclos for)."""
+        if count > 0:
+            if self.annotate:
+                self.comment(f"Reserva {count} posição(ões) para valores intermédios")
+            self.emit("pushn", count)
+    
+    def plan_induction_variables(self, body_node, kind, first_index):
+        """Escolhe os acessos a arrays a reduzir nos ciclos for do corpo; devolve quantas posições escondidas usam.
+        
+        As posições são do tipo kind (GLOBAL ou LOCAL), a partir de first_index.
+        """
+        self.induction_loops, self.induction_accesses = {}, {}
+        if not self.strength_reduction:
+            return 0
+        loops, accesses, slots = InductionVariablePlanner().plan(body_node)
+        storages = [Storage(kind, first_index + slot, None) for slot in range(slots)]
+        self.induction_loops = {node: [(storages[slot], array) for slot, array in arrays]
+                                for node, arrays in loops.items()}
+        self.induction_accesses = {node: (storages[slot], offset) for node, (slot, offset) in accesses.items()}
+        return slots
+    
+    def plan_common_subexpressions(self, body_node, kind, first_index):
+        """Escolhe as subexpressões comuns do corpo; devolve quantas posições escondidas usam.
+        
+        As posições são do tipo kind (GLOBAL ou LOCAL), a partir de first_index.
+        """
+        self.common_values, self.common_addresses = {}, {}
+        if not self.common_subexpressions:
+            return 0
+        reduced = {node: offset for node, (storage, offset) in self.induction_accesses.items()}
+        values, addresses, slots = CommonSubexpressionPlanner(self.short_circuit, reduced).plan(body_node)
+        storages = [Storage(kind, first_index + slot, None) for slot in range(slots)]
+        self.common_values = {node: (storages[slot], first) for node, (slot, first) in values.items()}
+        self.common_addresses = {node: (storages[slot], first) for node, (slot, first) in addresses.items()}
+        return slots
+    
+    def generate_common_subexpression(self, storage, first, generate):
+        """Na primeira ocorrência calcula o valor (generate) e guarda uma cópia; nas seguintes lê a cópia."""
+        if first:
+            generate()
+            self.emit("dup", 1)
+            self.builder.append(storage.store)
+        else:
+            if self.annotate:
+                self.comment("Subexpressão comum, já calculada")
+            self.builder.append(storage.load)
+    
+    def subprogram_temporaries(self, name):
+        """Número de posições escondidas do subprograma name (a seguir às variáveis locais)."""
+        scope = self.symbol_table.global_scope.children.get(name)
+        return scope.temporaries if scope is not None else 0
+    
     def generate_functions(self, declarations_node):
         """Gera código para funções e procedimentos."""
         if declarations_node is None or declarations_node.type != 'declarations':
@@ -178,129 +246,115 @@ class CodeGenerator:
     
     def generate_statement(self, statement_node):
         """Gera código para um comando."""
-        if statement_node is None:
-            return
-        
-        if statement_node.type == 'assignment':
-            self.generate_assignment(statement_node)
-        elif statement_node.type == 'compound_statement':
-            self.generate_compound_statement(statement_node)
-        elif statement_node.type == 'if_statement':
-            self.generate_if_statement(statement_node)
-        elif statement_node.type == 'while_statement':
-            self.generate_while_statement(statement_node)
-        elif statement_node.type == 'for_statement':
-            self.generate_for_statement(statement_node)
-        elif statement_node.type == 'write_statement':
-            self.generate_write_statement(statement_node)
-        elif statement_node.type == 'read_statement':
-            self.generate_read_statement(statement_node)
-        elif statement_node.type == 'procedure_call':
-            self.generate_procedure_call(statement_node)
-        elif statement_node.type == 'function_call':
-            self.generate_function_call(statement_node)
+        if statement_node is not None:
+            handler = self.statement_handlers.get(statement_node.type)
+            if handler is not None:
+                handler(statement_node)
     
     def generate_assignment(self, assignment_node):
         """Gera código para uma atribuição."""
         var_node = assignment_node.children[0]
         expr_node = assignment_node.children[1]
         
-        self.code.append(f"// Atribuição para {var_node.value}")
+        if self.annotate:
+            self.comment(f"Atribuição para {var_node.value}")
         
         # DEBUG: Verifica se a expressão existe
         if expr_node is None:
-            self.code.append("// ERRO: Expressão é None!")
+            if self.annotate:
+                self.comment("ERRO: Expressão é None!")
             return
         
-        self.code.append(f"// Gerando expressão do tipo: {expr_node.type}")
+        if self.annotate:
+            self.comment(f"Gerando expressão do tipo: {expr_node.type}")
+        
+        binding = var_node.binding
+        if var_node.type == 'array_access':
+            # Para arrays (globais, ver analyze_assignment), o endereço do
+            # elemento é calculado antes do valor
+            self.generate_element_address(var_node)
+            self.generate_expression(expr_node)
+            self.emit("store", 0)
+            if self.annotate:
+                self.blank()
+            return
+        
+        if assignment_node in self.tail_calls:
+            # F := F(...) no fim de F: o valor de retorno fica na mesma posição
+            self.generate_tail_call(expr_node)
+            if self.annotate:
+                self.blank()
+            return
         
         # Gera código para a expressão
         self.generate_expression(expr_node)
         
         # Armazena o resultado na variável
         if var_node.type == 'variable':
-            var_name = var_node.value
-            
             # Verifica se é uma atribuição de retorno de função
-            if (self.is_in_function() and var_name == self.current_function):
-                # Atribuição de valor de retorno - armazena em variável local especial
-                # Usamos offset 0 para o valor de retorno
-                self.code.append("storel 0")
-                self.code.append("// Valor de retorno armazenado")
+            if binding.kind == RESULT:
+                # Atribuição de valor de retorno - armazena na posição reservada
+                # por quem chama, abaixo dos parâmetros
+                self.builder.append(binding.store)
+                if self.annotate:
+                    self.comment("Valor de retorno armazenado")
                 return
             
-            # Verifica se é uma variável local da função atual
-            if (self.is_in_function() and 
-                self.current_function in self.function_vars and 
-                var_name in self.function_vars[self.current_function]):
-                
-                offset = self.function_vars[self.current_function][var_name]
-                self.code.append(f"storel {offset}")
-            
-            # Senão, é uma variável global
-            elif var_name in self.global_vars:
-                var_index = self.global_vars[var_name]
-                self.code.append(f"storeg {var_index}")
-            else:
-                self.code.append(f"// Erro: variável {var_name} não encontrada")
-                
-        elif var_node.type == 'array_access':
-            # Para arrays, precisa calcular o índice
-            array_name = var_node.value
-            if array_name in self.global_vars:
-                base_index = self.global_vars[array_name]
-                # Gera código para o índice do array
-                self.generate_expression(var_node.children[0])
-                
-                # CORREÇÃO: Subtrai o índice inicial do array
-                array_symbol = self.symbol_table.lookup(array_name)
-                if array_symbol and array_symbol.array_dims:
-                    start_idx = array_symbol.array_dims[0]
-                    if start_idx != 0:  # Se não começa em 0
-                        self.code.append(f"pushi {start_idx}")
-                        self.code.append("sub")  # índice_real = i - start_idx
-                
-                # Adiciona o índice base
-                self.code.append(f"pushi {base_index}")
-                self.code.append("add")
-                # Armazena no endereço calculado
-                self.code.append("storen")
+            # Variável local, parâmetro ou global (ou comentário de erro)
+            self.builder.append(binding.store)
         
-        self.code.append("")
+        if self.annotate:
+            self.blank()
     
     def generate_if_statement(self, if_node):
         """Gera código para um comando if."""
         condition_node = if_node.children[0]
         then_node = if_node.children[1]
         
+        if self.annotate:
+            self.comment("Comando IF")
+        
+        if isinstance(condition_node.constant_value, bool):
+            # Condição conhecida em compilação: só o ramo executado é gerado
+            if self.annotate:
+                self.comment(f"Condição constante ({condition_node.constant_value}): ramo eliminado")
+            if condition_node.constant_value:
+                self.generate_statement(then_node)
+            elif len(if_node.children) > 2:
+                self.generate_statement(if_node.children[2])
+            if self.annotate:
+                self.blank()
+            return
+        
         # Labels para controle de fluxo
         else_label = self.new_label("ELSE")
         end_label = self.new_label("ENDIF")
         
-        self.code.append("// Comando IF")
-        
-        # Gera código para a condição
-        self.generate_expression(condition_node)
-        
-        # Certifica-se de que a condição resulta em um valor booleano (0 ou 1)
-        if condition_node.type == 'binary_op' and condition_node.value in ['EQ', 'NEQ', 'LT', 'GT', 'LTE', 'GTE']:
-            # Já é uma comparação, não precisa fazer nada
-            pass
+        if self.short_circuit:
+            self.generate_branch_if_false(condition_node, else_label)
         else:
-            # Converte para booleano explicitamente (0 se for 0, 1 caso contrário)
-            self.code.append("pushi 0")
-            self.code.append("equal")
-            self.code.append("not")  # Inverte para obter o valor booleano correto
-        
-        # Salta para else se falso (condição = 0)
-        self.code.append(f"jz {else_label}")
+            # Gera código para a condição
+            self.generate_expression(condition_node)
+            
+            # Certifica-se de que a condição resulta em um valor booleano (0 ou 1)
+            if condition_node.type == 'binary_op' and condition_node.value in ['EQ', 'NEQ', 'LT', 'GT', 'LTE', 'GTE']:
+                # Já é uma comparação, não precisa fazer nada
+                pass
+            else:
+                # Converte para booleano explicitamente (0 se for 0, 1 caso contrário)
+                self.emit("pushi", 0)
+                self.emit("equal")
+                self.emit("not")  # Inverte para obter o valor booleano correto
+            
+            # Salta para else se falso (condição = 0)
+            self.emit("jz", else_label)
         
         # Código do bloco then
         self.generate_statement(then_node)
-        self.code.append(f"jump {end_label}")
+        self.emit("jump", end_label)
         
         # Label do else
-        self.code.append(f"{else_label}:")
+        self.place_label(else_label)
         
         # Código do bloco else (se existir)
         if len(if_node.children) > 2:
@@ -308,8 +362,9 @@ class CodeGenerator:
             self.generate_statement(else_node)
         
         # Label do fim
-        self.code.append(f"{end_label}:")
-        self.code.append("")
+        self.place_label(end_label)
+        if self.annotate:
+            self.blank()
     
     def generate_while_statement(self, while_node):
         """Gera código para um comando while."""
@@ -320,27 +375,57 @@ class CodeGenerator:
         start_label = self.new_label("WHILE")
         end_label = self.new_label("ENDWHILE")
         
-        self.code.append("// Início do ciclo while")
-        self.code.append(f"{start_label}:")
+        if self.annotate:
+            self.comment("Início do ciclo while")
+        self.place_label(start_label)
         
         # Gera código para a condição
-        self.code.append("// Condição de permanência no ciclo")
-        self.generate_expression(condition_node)
-        
+        if self.annotate:
+            self.comment("Condição de permanência no ciclo")
         # Salta para o fim se falso
-        self.code.append(f"jz {end_label}")
+        self.generate_branch_if_false(condition_node, end_label)
         
         # Código do corpo do loop
         self.generate_statement(body_node)
         
         # Volta para o início
-        self.code.append(f"jump {start_label}")
+        self.emit("jump", start_label)
         
         # Label do fim
-        self.code.append(f"{end_label}:")
-        self.code.append("// Fim do ciclo while")
-        self.code.append("")
+        self.place_label(end_label)
+        if self.annotate:
+            self.comment("Fim do ciclo while")
+        if self.annotate:
+            self.blank()
 
+    def generate_branch_if_false(self, condition_node, false_label, true_label=None):
+        """Gera a condição e salta para false_label se for falsa (se for verdadeira, continua).
+        
+        Com short_circuit, and/or são traduzidos em saltos: o operando da direita
+        só é avaliado se o da esquerda não decidir o resultado. true_label é um
+        rótulo para onde também se pode saltar quando a condição é verdadeira
+        (evita cadeias de saltos em a or b or c).
+        """
+        operator = condition_node.value.lower() if condition_node.type == 'binary_op' else None
+        left_node, right_node = condition_node.children if operator in ('and', 'or') else (None, None)
+        if self.short_circuit and operator == 'and':
+            # Basta um operando falso para saltar
+            self.generate_branch_if_false(left_node, false_label)
+            self.generate_branch_if_false(right_node, false_label, true_label)
+        elif self.short_circuit and operator == 'or':
+            # Se o da esquerda for verdadeiro, o da direita não é avaliado
+            right_label = self.new_label("OR")
+            own_true_label = true_label or self.new_label("ORTRUE")
+            self.generate_branch_if_false(left_node, right_label, own_true_label)
+            self.emit("jump", own_true_label)
+            self.place_label(right_label)
+            self.generate_branch_if_false(right_node, false_label, true_label)
+            if true_label is None:
+                self.place_label(own_true_label)
+        else:
+            self.generate_expression(condition_node)
+            self.emit("jz", false_label)
+    
     def generate_for_statement(self, for_node):
         """Gera código para um comando for."""
         var_name = for_node.value[0]
@@ -352,105 +437,94 @@ class CodeGenerator:
         start_label = self.new_label("FOR")
         end_label = self.new_label("ENDFOR")
         
-        self.code.append(f"// Ciclo FOR {var_name} {direction}")
+        if self.annotate:
+            self.comment(f"Ciclo FOR {var_name} {direction}")
+        
+        # Variável de controle (local ou global), resolvida pela análise semântica
+        binding = for_node.binding
         
         # Inicializa a variável de controle
         self.generate_expression(start_expr)
         
-        # CORREÇÃO: Verifica se é uma variável local ou global
-        if (self.is_in_function() and 
-            self.current_function in self.function_vars and 
-            var_name in self.function_vars[self.current_function]):
-            
-            # Variável local
-            offset = self.function_vars[self.current_function][var_name]
-            self.code.append(f"storel {offset}")
-        else:
-            # Variável global
-            var_index = self.global_vars[var_name]
-            self.code.append(f"storeg {var_index}")
+        # O valor final é calculado uma só vez, antes do ciclo (exceto se for constante)
+        limit = for_node.temporary
+        if limit is not None:
+            if self.annotate:
+                self.comment("Limite do ciclo, avaliado uma vez")
+            self.generate_expression(end_expr)
+            self.builder.append(limit.store)
+        self.builder.append(binding.store)
+        
+        # Endereços dos elementos a[i] que acompanham a variável de controle
+        induction = self.induction_loops.get(for_node, ()) if self.induction_loops else ()
+        for storage, array in induction:
+            if self.annotate:
+                self.comment(f"Endereço de {array.symbol.name}[{var_name}], atualizado a cada iteração")
+            self.compute_element_address(array, lambda: self.builder.append(binding.load))
+            self.builder.append(storage.store)
         
         # Início do loop
-        self.code.append(f"{start_label}:")
+        self.place_label(start_label)
         
         # Verifica a condição de parada
         # Carrega o valor da variável de controle
-        if (self.is_in_function() and 
-            self.current_function in self.function_vars and 
-            var_name in self.function_vars[self.current_function]):
-            
-            # Variável local
-            offset = self.function_vars[self.current_function][var_name]
-            self.code.append(f"pushl {offset}")
-        else:
-            # Variável global
-            var_index = self.global_vars[var_name]
-            self.code.append(f"pushg {var_index}")
+        self.builder.append(binding.load)
         
-        # Gera código para o valor final
-        self.generate_expression(end_expr)
+        # Carrega o valor final
+        if limit is not None:
+            self.builder.append(limit.load)
+        else:
+            self.generate_expression(end_expr)
 
         if direction == 'to':
             # Para 'to': continua enquanto i <= n, ou seja, para quando i > n
-            self.code.append("infeq")  # i <= n?
-            self.code.append(f"jz {end_label}")  # Se i <= n é falso (i > n), sai do loop
+            self.emit("infeq")  # i <= n?
+            self.emit("jz", end_label)  # Se i <= n é falso (i > n), sai do loop
         else:  # downto
             # Para 'downto': continua enquanto i >= n, ou seja, para quando i < n
-            self.code.append("supeq")  # i >= n?
-            self.code.append(f"jz {end_label}")  # Se i >= n é falso (i < n), sai do loop
+            self.emit("supeq")  # i >= n?
+            self.emit("jz", end_label)  # Se i >= n é falso (i < n), sai do loop
         
         # Corpo do loop
         self.generate_statement(body_node)
         
         # Incrementa/decrementa a variável de controle
         # Carrega o valor atual
-        if (self.is_in_function() and 
-            self.current_function in self.function_vars and 
-            var_name in self.function_vars[self.current_function]):
-            
-            # Variável local
-            offset = self.function_vars[self.current_function][var_name]
-            self.code.append(f"pushl {offset}")
-        else:
-            # Variável global
-            var_index = self.global_vars[var_name]
-            self.code.append(f"pushg {var_index}")
+        self.builder.append(binding.load)
         
         # Incrementa/decrementa
-        self.code.append("pushi 1")
+        self.emit("pushi", 1)
         if direction == 'to':
-            self.code.append("add")
+            self.emit("add")
         else:
-            self.code.append("sub")
+            self.emit("sub")
         
         # Armazena o novo valor
-        if (self.is_in_function() and 
-            self.current_function in self.function_vars and 
-            var_name in self.function_vars[self.current_function]):
-            
-            # Variável local
-            offset = self.function_vars[self.current_function][var_name]
-            self.code.append(f"storel {offset}")
-        else:
-            # Variável global
-            var_index = self.global_vars[var_name]
-            self.code.append(f"storeg {var_index}")
+        self.builder.append(binding.store)
+        for storage, array in induction:
+            self.builder.append(storage.load)
+            self.emit("pushi", 1 if direction == 'to' else -1)
+            self.emit("padd")
+            self.builder.append(storage.store)
         
         # Volta para o início do loop
-        self.code.append(f"jump {start_label}")
+        self.emit("jump", start_label)
         
         # Fim do loop
-        self.code.append(f"{end_label}:")
-        self.code.append("")
+        self.place_label(end_label)
+        if self.annotate:
+            self.blank()
     
     def generate_write_statement(self, write_node):
         """Gera código para write/writeln."""
-        self.code.append("// Comando de escrita")
+        if self.annotate:
+            self.comment("Comando de escrita")
         
         if len(write_node.children) == 0:
             # writeln sem argumentos
-            self.code.append("writeln")
-            self.code.append("")
+            self.emit("writeln")
+            if self.annotate:
+                self.blank()
             return
         
         # Escreve cada expressão
@@ -458,378 +532,341 @@ class CodeGenerator:
         for expr_node in expr_list_node.children:
             self.generate_expression(expr_node)
             
-            # Determina o tipo da expressão para escolher a instrução correta
-            if expr_node.type == 'string':
-                self.code.append("writes")
-            elif expr_node.type == 'number':
-                if isinstance(expr_node.value, float):
-                    self.code.append("writef")
-                else:
-                    self.code.append("writei")
-            elif expr_node.type == 'variable':
-                # Verifica o tipo da variável na tabela de símbolos
-                var_symbol = self.symbol_table.lookup(expr_node.value)
-                if var_symbol and var_symbol.type == 'string':
-                    # Para variáveis string, usa writes diretamente
-                    self.code.append("writes")
-                elif var_symbol and var_symbol.type == 'real':
-                    self.code.append("writef")
-                elif var_symbol and var_symbol.type == 'boolean':
-                    self.code.append("writei")  # Booleanos são escritos como inteiros
-                else:
-                    self.code.append("writei")  # Default para inteiros
-            elif expr_node.type == 'function_call':
-                # Para chamadas de função, verifica o tipo de retorno
-                func_symbol = self.symbol_table.lookup(expr_node.value)
-                if func_symbol and func_symbol.type == 'string':
-                    self.code.append("writes")
-                elif func_symbol and func_symbol.type == 'real':
-                    self.code.append("writef")
-                else:
-                    self.code.append("writei")
-            elif expr_node.type == 'array_access':
-                # Para acesso a arrays, verifica o tipo base
-                array_name = expr_node.value
-                array_symbol = self.symbol_table.lookup(array_name)
-                if array_symbol and array_symbol.type == 'string':
-                    # Acesso a caractere de string retorna código ASCII (inteiro)
-                    self.code.append("writei")
-                else:
-                    self.code.append("writei")  # Arrays normalmente são inteiros
-            else:
-                # Para outras expressões, assume inteiro por padrão
-                self.code.append("writei")
+            # Escolhe a instrução pelo tipo inferido na análise semântica
+            # (um caractere de string é um inteiro: o código ASCII)
+            self.emit(WRITE_INSTRUCTIONS.get(expr_node.inferred_type, "writei"))
 
         # Se for writeln, adiciona quebra de linha
         if write_node.value.upper() == 'WRITELN':
-            self.code.append("writeln")
+            self.emit("writeln")
         
-        self.code.append("")
+        if self.annotate:
+            self.blank()
     
     def generate_read_statement(self, read_node):
         """Gera código para read/readln."""
         if len(read_node.children) == 0:
             return
         
-        self.code.append("// Comando de leitura")
+        if self.annotate:
+            self.comment("Comando de leitura")
         
         # Lê cada variável
         var_list_node = read_node.children[0]
         for var_node in var_list_node.children:
             if var_node.type == 'variable':
-                var_name = var_node.value
-                self.code.append("read")
+                self.emit("read")
                 
-                # Verifica o tipo da variável para converter corretamente
-                var_symbol = self.symbol_table.lookup(var_name)
-                if var_symbol and var_symbol.type == 'string':
-                    # Para strings, não converte - o read já retorna uma referência de string
-                    pass
-                else:
-                    # Para números, converte para inteiro
-                    self.code.append("atoi")
+                # Converte conforme o tipo da variável - o read retorna uma referência de string
+                self.generate_read_conversion(var_node)
                 
                 # Armazena o valor lido na variável
-                if (self.is_in_function() and 
-                    self.current_function in self.function_vars and 
-                    var_name in self.function_vars[self.current_function]):
-                    
-                    # Variável local
-                    offset = self.function_vars[self.current_function][var_name]
-                    self.code.append(f"storel {offset}")
-                else:
-                    # Variável global
-                    var_index = self.global_vars[var_name]
-                    self.code.append(f"storeg {var_index}")
+                self.builder.append(var_node.binding.store)
         
             elif var_node.type == 'array_access':
-                # Para arrays, precisa calcular o endereço e armazenar
-                array_name = var_node.value
-                if array_name in self.global_vars:
-                    base_index = self.global_vars[array_name]
-                    
-                    # Calcula o endereço do array PRIMEIRO
-                    self.code.append("pushgp")  # Endereço base da pilha global
-                    self.code.append(f"pushi {base_index}")  # Índice base do array
-                    self.code.append("padd")  # Endereço base do array
+                # Para arrays (globais, ver analyze_read_statement), precisa
+                # calcular o endereço e armazenar
+                # Calcula o endereço do elemento PRIMEIRO
+                self.generate_element_address(var_node)
 
-                    # Gera código para o índice e ajusta para o índice real
-                    self.generate_expression(var_node.children[0])
-                    
-                    # CORREÇÃO: Subtrai o índice inicial do array
-                    # Para array[1..5], quando i=1, índice real = 1-1 = 0
-                    array_symbol = self.symbol_table.lookup(array_name)
-                    if array_symbol and array_symbol.array_dims:
-                        start_idx = array_symbol.array_dims[0]
-                        if start_idx != 0:  # Se não começa em 0
-                            self.code.append(f"pushi {start_idx}")
-                            self.code.append("sub")  # índice_real = i - start_idx
-                    
-                    self.code.append("padd")  # Endereço final
-
-                    # Lê o valor DEPOIS
-                    self.code.append("read")
-                    self.code.append("atoi")  # Converte string para inteiro
+                # Lê o valor DEPOIS
+                self.emit("read")
+                self.generate_read_conversion(var_node)  # Converte para o tipo do elemento
 
-                    # Agora a pilha está correta: endereço (fundo) + valor (topo)
-                    self.code.append("store 0")
+                # Agora a pilha está correta: endereço (fundo) + valor (topo)
+                self.emit("store", 0)
         
-        self.code.append("")
+        if self.annotate:
+            self.blank()
+    
+    def generate_read_conversion(self, var_node):
+        """Converte a string lida para o tipo inferido do destino (nada para strings)."""
+        conversion = READ_CONVERSIONS.get(var_node.inferred_type, "atoi")
+        if conversion is not None:
+            self.emit(conversion)
     
     def generate_expression(self, expr_node):
         """Gera código para uma expressão."""
-        if expr_node is None:
-            return
-        
-        if expr_node.type == 'number':
-            # Constante numérica
-            if isinstance(expr_node.value, int):
-                self.code.append(f"pushi {expr_node.value}")
-            else:
-                self.code.append(f"pushf {expr_node.value}")
-        
-        elif expr_node.type == 'string':
-            # Constante string - processa o valor corretamente
-            string_value = expr_node.value
-            
-            # Remove todas as aspas duplas do início e fim se existirem
-            while string_value.startswith('"'):
-                string_value = string_value[1:]
-            while string_value.endswith('"'):
-                string_value = string_value[:-1]
-            
-            # Remove aspas simples se existirem (para caracteres literais)
-            while string_value.startswith("'"):
-                string_value = string_value[1:]
-            while string_value.endswith("'"):
-                string_value = string_value[:-1]
-            
-            # Processa escape sequences se necessário
-            # Em Pascal, aspas duplas dentro de strings são representadas como ""
-            # Converte "" para " na string final
-            string_value = string_value.replace('""', '"')
-            
-            # CORREÇÃO: Se for um caractere literal (comprimento 1), gera o código ASCII
-            if len(string_value) == 1:
-                # Para caracteres literais, empilha o código ASCII
-                ascii_code = ord(string_value)
-                self.code.append(f"pushi {ascii_code}")
-                self.code.append(f"// Caractere literal '{string_value}' (ASCII {ascii_code})")
-            else:
-                # Para strings normais, gera a instrução EWVM com aspas duplas
-                self.code.append(f'pushs "{string_value}"')
-        
-        elif expr_node.type == 'boolean':
-            # Constante booleana
-            value = 1 if expr_node.value.lower() == 'true' else 0
-            self.code.append(f"pushi {value}")
-        
-        elif expr_node.type == 'variable':
-            # Variável
-            var_name = expr_node.value
-            
-            # CORREÇÃO: Verifica se é uma referência ao valor de retorno da função atual
-            if (self.is_in_function() and var_name == self.current_function):
-                # Em Pascal, referenciar o nome da função dentro dela mesma acessa o valor de retorno
-                # Como não temos uma forma direta de acessar isso em EWVM, 
-                # assumimos que é sempre verdadeiro (1) para condições booleanas
-                self.code.append("pushi 1")
-                self.code.append(f"// Referência ao valor de retorno da função {var_name}")
-            
-            # Verifica se é uma variável local da função atual
-            elif (self.is_in_function() and 
-                self.current_function in self.function_vars and 
-                var_name in self.function_vars[self.current_function]):
-                
-                offset = self.function_vars[self.current_function][var_name]
-                self.code.append(f"pushl {offset}")
-
-            # Senão, é uma variável global
-            elif var_name in self.global_vars:
-                var_index = self.global_vars[var_name]
-                self.code.append(f"pushg {var_index}")
-            else:
-                self.code.append(f"// Erro: variável {var_name} não encontrada")
-        
-        elif expr_node.type == 'function_call':
-            # Chamada de função
-            self.generate_function_call(expr_node)
-        
-        elif expr_node.type == 'array_access':
-            # Acesso a array
-            array_name = expr_node.value
-            
-            self.code.append(f"// Acesso a array/string: {array_name}")
-            
-            # Verifica se é uma string (acesso a caractere)
-            array_symbol = self.symbol_table.lookup(array_name)
-            if array_symbol and array_symbol.type == 'string':
-                self.code.append(f"// Acesso a caractere da string {array_name}")
-                
-                # Carrega o endereço da string
-                if (self.is_in_function() and 
-                    self.current_function in self.function_vars and 
-                    array_name in self.function_vars[self.current_function]):
-                    
-                    # Variável local ou parâmetro
-                    offset = self.function_vars[self.current_function][array_name]
-                    self.code.append(f"pushl {offset}")
-                elif array_name in self.global_vars:
-                    # Variável global
-                    self.code.append(f"pushg {self.global_vars[array_name]}")
+        if expr_node is not None:
+            if expr_node.constant_value is not None and expr_node.type in FOLDED_TYPES:
+                # Constante ou expressão avaliada em compilação
+                self.generate_constant(expr_node.constant_value)
+                return
+            handler = self.expression_handlers.get(expr_node.type)
+            if handler is not None:
+                common = self.common_values.get(expr_node) if self.common_values else None
+                if common is not None:
+                    self.generate_common_subexpression(*common, lambda: handler(expr_node))
                 else:
-                    # Se não encontrou, assume que é o primeiro parâmetro
-                    self.code.append(f"pushl -1")
-                
-                # Gera código para o índice
-                self.generate_expression(expr_node.children[0])
-                
-                # CORREÇÃO CRUCIAL: Ajustar índice de Pascal (1-based) para EWVM (0-based)
-                self.code.append("pushi 1")
-                self.code.append("sub")  # índice_ewvm = índice_pascal - 1
-                self.code.append("charat")  # Obtém o código do caractere no índice
-            else:
-                # Para arrays normais
-                if array_name in self.global_vars:
-                    base_index = self.global_vars[array_name]
-                    # Empilha o endereço base da pilha global
-                    self.code.append("pushgp")
-                    # Empilha o índice base do array
-                    self.code.append(f"pushi {base_index}")
-                    # Calcula endereço base + índice base
-                    self.code.append("padd")
-                    # Gera código para o índice do array
-                    self.generate_expression(expr_node.children[0])
-                    
-                    # CORREÇÃO: Subtrai o índice inicial do array
-                    if array_symbol and array_symbol.array_dims:
-                        start_idx = array_symbol.array_dims[0]
-                        if start_idx != 0:  # Se não começa em 0
-                            self.code.append(f"pushi {start_idx}")
-                            self.code.append("sub")  # índice_real = i - start_idx
-                    
-                    # Calcula endereço final
-                    self.code.append("padd")
-                    # Carrega o valor do endereço final
-                    self.code.append("load 0")
-        
-        elif expr_node.type == 'length_call':
-            # Função length() para strings
-            arg_node = expr_node.children[0]
+                    handler(expr_node)
+    
+    def generate_number(self, expr_node):
+        """Gera código para uma constante numérica."""
+        # Constante numérica
+        if isinstance(expr_node.value, int):
+            self.emit("pushi", expr_node.value)
+        else:
+            self.emit("pushf", expr_node.value)
+    
+    def generate_constant(self, value):
+        """Empilha um valor calculado em compilação (ver constfold)."""
+        if isinstance(value, bool):
+            self.emit("pushi", int(value))
+        elif isinstance(value, int):
+            self.emit("pushi", value)
+        elif isinstance(value, float):
+            self.emit("pushf", value)
+        else:
+            self.push_string(value)
+    
+    def generate_string(self, expr_node):
+        """Gera código para uma constante string (ou caractere literal)."""
+        self.push_string(expr_node.value)
+    
+    def push_string(self, string_value):
+        """Empilha uma string (ou o código ASCII, se tiver um só caractere)."""
+        # Remove todas as aspas duplas do início e fim se existirem
+        while string_value.startswith('"'):
+            string_value = string_value[1:]
+        while string_value.endswith('"'):
+            string_value = string_value[:-1]
+        
+        # Remove aspas simples se existirem (para caracteres literais)
+        while string_value.startswith("'"):
+            string_value = string_value[1:]
+        while string_value.endswith("'"):
+            string_value = string_value[:-1]
+        
+        # Processa escape sequences se necessário
+        # Em Pascal, aspas duplas dentro de strings são representadas como ""
+        # Converte "" para " na string final
+        string_value = string_value.replace('""', '"')
+        
+        # CORREÇÃO: Se for um caractere literal (comprimento 1), gera o código ASCII
+        if len(string_value) == 1:
+            # Para caracteres literais, empilha o código ASCII
+            ascii_code = ord(string_value)
+            self.emit("pushi", ascii_code)
+            if self.annotate:
+                self.comment(f"Caractere literal '{string_value}' (ASCII {ascii_code})")
+        else:
+            # Para strings normais, gera a instrução EWVM com aspas duplas
+            self.emit("pushs", string_value)
+    
+    def generate_boolean(self, expr_node):
+        """Gera código para uma constante booleana."""
+        # Constante booleana
+        value = 1 if expr_node.value.lower() == 'true' else 0
+        self.emit("pushi", value)
+    
+    def generate_variable(self, expr_node):
+        """Gera código para ler uma variável."""
+        # Variável
+        var_name = expr_node.value
+        binding = expr_node.binding
+        
+        # CORREÇÃO: Verifica se é uma referência ao valor de retorno da função atual
+        if binding.kind == RESULT:
+            # Em Pascal, referenciar o nome da função dentro dela mesma acessa o
+            # valor de retorno, guardado abaixo dos parâmetros
+            self.builder.append(binding.load)
+            if self.annotate:
+                self.comment(f"Referência ao valor de retorno da função {var_name}")
+        else:
+            # Variável local, parâmetro ou global (ou comentário de erro)
+            self.builder.append(binding.load)
+    
+    def generate_array_access(self, expr_node):
+        """Gera código para um acesso a array ou a caractere de string."""
+        # Acesso a array
+        array_name = expr_node.value
+        binding = expr_node.binding
+        
+        if self.annotate:
+            self.comment(f"Acesso a array/string: {array_name}")
+        
+        # Verifica se é uma string (acesso a caractere)
+        if binding.symbol.type is STRING:
+            if self.annotate:
+                self.comment(f"Acesso a caractere da string {array_name}")
             
-            # CORREÇÃO: Precisamos garantir que uma referência de string esteja no topo da pilha
-            if arg_node.type == 'variable':
-                var_name = arg_node.value
-                var_symbol = self.symbol_table.lookup(var_name)
-                
-                # Verifica se é uma variável local da função atual
-                if (self.is_in_function() and 
-                    self.current_function in self.function_vars and 
-                    var_name in self.function_vars[self.current_function]):
-                    
-                    offset = self.function_vars[self.current_function][var_name]
-                    self.code.append(f"pushl {offset}")  # Carrega a referência da string
-                else:
-                    # Variável global
-                    self.code.append(f"pushg {self.global_vars[var_name]}")  # Carrega a referência da string
+            # Carrega o endereço da string
+            if binding.kind in (LOCAL, PARAMETER, GLOBAL):
+                # Variável local, parâmetro ou global
+                self.builder.append(binding.load)
             else:
-                # Para outros tipos de expressões, geramos o código normalmente
-                # Isso deve deixar uma referência de string no topo da pilha
-                self.generate_expression(arg_node)
-            
-            # Agora que temos certeza que uma referência de string está no topo da pilha, chamamos strlen
-            self.code.append("strlen")
-        
-        elif expr_node.type == 'binary_op':
-            # Operação binária
-            left_node = expr_node.children[0]
-            right_node = expr_node.children[1]
-            operator = expr_node.value
+                # Se não encontrou, assume que é o primeiro parâmetro
+                self.emit("pushl", -1)
             
-            # Debug: mostra qual operação está sendo processada
-            self.code.append(f"// Operação binária: {operator}")
+            # Gera código para o índice
+            self.generate_expression(expr_node.children[0])
             
-            # Gera código para os operandos (ordem importante para a pilha)
-            self.generate_expression(left_node)
-            self.generate_expression(right_node)
+            # CORREÇÃO CRUCIAL: Ajustar índice de Pascal (1-based) para EWVM (0-based)
+            self.emit("pushi", 1)
+            self.emit("sub")  # índice_ewvm = índice_pascal - 1
+            self.emit("charat")  # Obtém o código do caractere no índice
+        else:
+            # Para arrays normais
+            if binding.kind == GLOBAL:
+                self.generate_element_address(expr_node)
+                # Carrega o valor do endereço final
+                self.emit("load", 0)
+    
+    def generate_element_address(self, access_node):
+        """Empilha o endereço do elemento de um array global (para load 0/store 0)."""
+        common = self.common_addresses.get(access_node) if self.common_addresses else None
+        if common is not None:
+            self.generate_common_subexpression(*common, lambda: self.generate_element_address_of(access_node))
+        else:
+            self.generate_element_address_of(access_node)
+    
+    def generate_element_address_of(self, access_node):
+        """Endereço a partir do mantido pelo ciclo for (se o acesso foi reduzido) ou calculado por inteiro."""
+        induction = self.induction_accesses.get(access_node) if self.induction_accesses else None
+        if induction is None:
+            self.compute_element_address(access_node.binding,
+                                         lambda: self.generate_expression(access_node.children[0]))
+            return
+        storage, offset = induction
+        self.builder.append(storage.load)
+        if offset != 0:
+            self.emit("pushi", offset)
+            self.emit("padd")
+    
+    def compute_element_address(self, binding, generate_index):
+        """Calcula o endereço do elemento: base do array + índice (generate_index) - índice inicial."""
+        # Empilha o endereço base da pilha global
+        self.emit("pushgp")
+        # Empilha o índice base do array
+        self.emit("pushi", binding.index)
+        # Calcula endereço base + índice base
+        self.emit("padd")
+        # Gera código para o índice do array
+        generate_index()
+        
+        # CORREÇÃO: Subtrai o índice inicial do array
+        # Para array[1..5], quando i=1, índice real = 1-1 = 0
+        array_dims = binding.symbol.array_dims
+        if array_dims:
+            start_idx = array_dims[0]
+            if start_idx != 0:  # Se não começa em 0
+                self.emit("pushi", start_idx)
+                self.emit("sub")  # índice_real = i - start_idx
+        
+        # Calcula endereço final
+        self.emit("padd")
+    
+    def generate_length_call(self, expr_node):
+        """Gera código para uma chamada a length()."""
+        # Função length() para strings
+        arg_node = expr_node.children[0]
+        
+        # CORREÇÃO: Precisamos garantir que uma referência de string esteja no topo da pilha
+        if arg_node.type == 'variable' and arg_node.constant_value is None:
+            # Variável local ou global
+            self.builder.append(arg_node.binding.load)  # Carrega a referência da string
+        else:
+            # Para outros tipos de expressões, geramos o código normalmente
+            # Isso deve deixar uma referência de string no topo da pilha
+            self.generate_expression(arg_node)
+        
+        # Agora que temos certeza que uma referência de string está no topo da pilha, chamamos strlen
+        self.emit("strlen")
+    
+    def generate_binary_op(self, expr_node):
+        """Gera código para uma operação binária."""
+        # Operação binária
+        left_node = expr_node.children[0]
+        right_node = expr_node.children[1]
+        operator = expr_node.value
+        
+        # Debug: mostra qual operação está sendo processada
+        if self.annotate:
+            self.comment(f"Operação binária: {operator}")
+        
+        # Gera código para os operandos (ordem importante para a pilha)
+        self.generate_expression(left_node)
+        self.generate_expression(right_node)
+        
+        # Mapa de operadores estendido para reconhecer todos os formatos possíveis
+        op_map = {
+            # Aritméticos
+            'PLUS': 'add',
+            '+': 'add',
+            'MINUS': 'sub', 
+            '-': 'sub',
+            'TIMES': 'mul',
+            '*': 'mul',
+            'DIVIDE': 'div',
+            '/': 'div',
+            'DIV': 'div',
+            'MOD': 'mod',
+            '%': 'mod',
             
-            # Mapa de operadores estendido para reconhecer todos os formatos possíveis
-            op_map = {
-                # Aritméticos
-                'PLUS': 'add',
-                '+': 'add',
-                'MINUS': 'sub', 
-                '-': 'sub',
-                'TIMES': 'mul',
-                '*': 'mul',
-                'DIVIDE': 'div',
-                '/': 'div',
-                'DIV': 'div',
-                'MOD': 'mod',
-                '%': 'mod',
-                
-                # Comparação
-                'EQ': 'equal',
-                '=': 'equal',
-                'NEQ': 'equal\nnot',
-                '<>': 'equal\nnot',
-                'LT': 'inf',
-                '<': 'inf',
-                'GT': 'sup',
-                '>': 'sup',
-                'LTE': 'infeq',
-                '<=': 'infeq',
-                'GTE': 'supeq',
-                '>=': 'supeq',
-                
-                # Lógicos
-                'AND': 'and',
-                'OR': 'or',
-                'NOT': 'not'
-            }
+            # Comparação
+            'EQ': 'equal',
+            '=': 'equal',
+            'NEQ': 'equal\nnot',
+            '<>': 'equal\nnot',
+            'LT': 'inf',
+            '<': 'inf',
+            'GT': 'sup',
+            '>': 'sup',
+            'LTE': 'infeq',
+            '<=': 'infeq',
+            'GTE': 'supeq',
+            '>=': 'supeq',
             
-            # Trata o operador em diferentes formatos possíveis
-            op_code = None
-            if operator in op_map:
-                op_code = op_map[operator]
-            else:
-                # Tenta converter para letras maiúsculas
-                op_upper = operator.upper()
-                if op_upper in op_map:
-                    op_code = op_map[op_upper]
-        
-            if op_code:
-                if operator == 'NEQ' or operator == '<>':
-                    self.code.append("equal")
-                    self.code.append("not")
-                else:
-                    self.code.append(op_code)
+            # Lógicos
+            'AND': 'and',
+            'OR': 'or',
+            'NOT': 'not'
+        }
+        
+        # Trata o operador em diferentes formatos possíveis
+        op_code = None
+        if operator in op_map:
+            op_code = op_map[operator]
+        else:
+            # Tenta converter para letras maiúsculas
+            op_upper = operator.upper()
+            if op_upper in op_map:
+                op_code = op_map[op_upper]
+        
+        if op_code:
+            if operator == 'NEQ' or operator == '<>':
+                self.emit("equal")
+                self.emit("not")
             else:
-                self.code.append(f"// ERRO: Operador '{operator}' não reconhecido")
-                # Como fallback, assume que é uma comparação > (sup)
-                if operator == '>' or operator.upper() == 'GT':
-                    self.code.append("sup")
-                # Outros operadores de comparação como fallback
-                elif operator == '<' or operator.upper() == 'LT':
-                    self.code.append("inf")
-                elif operator == '>=' or operator.upper() == 'GTE':
-                    self.code.append("supeq")
-                elif operator == '<=' or operator.upper() == 'LTE':
-                    self.code.append("infeq")
-
-        elif expr_node.type == 'unary_op':
-            # Operação unária
-            operand_node = expr_node.children[0]
-            operator = expr_node.value
-            
-            self.generate_expression(operand_node)
-            
-            if operator == 'MINUS' or operator == '-':
-                # Multiplica por -1
-                self.code.append("pushi -1")
-                self.code.append("mul")
-            elif operator == 'NOT' or operator.upper() == 'NOT':
-                self.code.append("not")
+                self.emit(op_code)
+        else:
+            if self.annotate:
+                self.comment(f"ERRO: Operador '{operator}' não reconhecido")
+            # Como fallback, assume que é uma comparação > (sup)
+            if operator == '>' or operator.upper() == 'GT':
+                self.emit("sup")
+            # Outros operadores de comparação como fallback
+            elif operator == '<' or operator.upper() == 'LT':
+                self.emit("inf")
+            elif operator == '>=' or operator.upper() == 'GTE':
+                self.emit("supeq")
+            elif operator == '<=' or operator.upper() == 'LTE':
+                self.emit("infeq")
+    
+    def generate_unary_op(self, expr_node):
+        """Gera código para uma operação unária."""
+        # Operação unária
+        operand_node = expr_node.children[0]
+        operator = expr_node.value
+        
+        self.generate_expression(operand_node)
+        
+        if operator == 'MINUS' or operator == '-':
+            # Multiplica por -1
+            self.emit("pushi", -1)
+            self.emit("mul")
+        elif operator == 'NOT' or operator.upper() == 'NOT':
+            self.emit("not")
     
     def new_label(self, prefix="L"):
         """Gera um novo rótulo."""
@@ -845,38 +882,43 @@ class CodeGenerator:
         local_declarations = function_node.children[2]
         body_node = function_node.children[3]
         
-        self.code.append(f"// Função {function_name}")
-        self.code.append(f"{function_name}:")
-        
-        # Entra no escopo da função
-        self.enter_function_scope(function_name)
+        if self.annotate:
+            self.comment(f"Função {function_name}")
+        self.place_label(function_name, subprogram=True)
         
         # Processa parâmetros
-        param_count = self.process_function_parameters(params_node, function_name)
+        self.process_function_parameters(params_node, function_name)
         
         # Processa declarações locais
         local_var_count = self.process_local_declarations(local_declarations)
         
-        # Reserva espaço para variáveis locais + valor de retorno
-        if local_var_count > 0 or True:  # Sempre reserva pelo menos 1 espaço para retorno
-            total_space = local_var_count + 1  # +1 para valor de retorno
-            self.code.append(f"// Reserva espaço para {local_var_count} variáveis locais + valor de retorno")
+        # Reserva espaço para variáveis locais (a partir do offset 1)
+        if local_var_count > 0 or True:  # Sempre reserva o offset 0
+            total_space = local_var_count + 1  # +1 para o offset 0, por usar
+            if self.annotate:
+                self.comment(f"Reserva espaço para {local_var_count} variáveis locais (a partir do offset 1)")
             for i in range(total_space):
-                self.code.append("pushi 0")
+                self.emit("pushi", 0)
+        temporaries = self.subprogram_temporaries(function_name)
+        temporaries += self.plan_induction_variables(body_node, LOCAL, total_space + temporaries)
+        temporaries += self.plan_common_subexpressions(body_node, LOCAL, total_space + temporaries)
+        self.reserve_temporaries(temporaries)
+        
+        # Chamadas recursivas em posição final reutilizam este frame
+        self.tail_calls = set()
+        self.find_tail_calls(body_node, self.tail_calls)
+        self.frame_size = total_space + temporaries
         
         # Gera código do corpo da função
         self.generate_compound_statement(body_node)
-        
-        # Carrega o valor de retorno (armazenado em offset 0)
-        self.code.append("pushl 0")
-        
-        # Return da função - o valor de retorno deve estar no topo da pilha
-        self.code.append("// Return da função")
-        self.code.append("return")
-        self.code.append("")
-        
-        # Sai do escopo da função
-        self.exit_function_scope()
+        self.tail_calls = set()
+        
+        # Return da função - o valor de retorno já está na posição reservada por quem chama
+        if self.annotate:
+            self.comment("Return da função")
+        self.emit("return")
+        if self.annotate:
+            self.blank()
 
     def generate_procedure_declaration(self, procedure_node):
         """Gera código para declaração de procedimento."""
@@ -885,34 +927,37 @@ class CodeGenerator:
         local_declarations = procedure_node.children[1]
         body_node = procedure_node.children[2]
         
-        self.code.append(f"// Procedimento {procedure_name}")
-        self.code.append(f"{procedure_name}:")
-        
-        # Entra no escopo do procedimento
-        self.enter_function_scope(procedure_name)
+        if self.annotate:
+            self.comment(f"Procedimento {procedure_name}")
+        self.place_label(procedure_name, subprogram=True)
         
         # Processa parâmetros
-        param_count = self.process_function_parameters(params_node, procedure_name)
+        self.process_function_parameters(params_node, procedure_name)
         
         # Processa declarações locais
         local_var_count = self.process_local_declarations(local_declarations)
         
-        # Reserva espaço para variáveis locais
-        if local_var_count > 0:
-            self.code.append(f"// Reserva espaço para {local_var_count} variáveis locais")
-            for i in range(local_var_count):
-                self.code.append("pushi 0")
+        # Reserva espaço para variáveis locais (como nas funções, começam no
+        # offset 1; o offset 0 fica por usar)
+        temporaries = self.subprogram_temporaries(procedure_name)
+        temporaries += self.plan_induction_variables(body_node, LOCAL, local_var_count + 1 + temporaries)
+        temporaries += self.plan_common_subexpressions(body_node, LOCAL, local_var_count + 1 + temporaries)
+        if local_var_count > 0 or temporaries > 0:
+            if self.annotate:
+                self.comment(f"Reserva espaço para {local_var_count} variáveis locais (a partir do offset 1)")
+            for i in range(local_var_count + 1):
+                self.emit("pushi", 0)
+        self.reserve_temporaries(temporaries)
         
         # Gera código do corpo do procedimento
         self.generate_compound_statement(body_node)
         
         # Return do procedimento
-        self.code.append("// Return do procedimento")
-        self.code.append("return")
-        self.code.append("")
-        
-        # Sai do escopo do procedimento
-        self.exit_function_scope()
+        if self.annotate:
+            self.comment("Return do procedimento")
+        self.emit("return")
+        if self.annotate:
+            self.blank()
 
     def process_function_parameters(self, params_node, function_name):
         """Processa os parâmetros de uma função."""
@@ -920,7 +965,8 @@ class CodeGenerator:
             return 0
         
         param_count = 0
-        self.code.append(f"// Parâmetros da função {function_name}")
+        if self.annotate:
+            self.comment(f"Parâmetros da função {function_name}")
         
         # Conta o total de parâmetros primeiro
         for param_node in params_node.children:
@@ -935,8 +981,8 @@ class CodeGenerator:
             
             for param_name in id_list_node.value:
                 # Parâmetros têm offset negativo, começando do mais distante
-                self.function_vars[function_name][param_name] = -current_offset
-                self.code.append(f"// Parâmetro {param_name} no offset {-current_offset}")
+                if self.annotate:
+                    self.comment(f"Parâmetro {param_name} no offset {-current_offset}")
                 current_offset -= 1
         
         return param_count
@@ -948,10 +994,6 @@ class CodeGenerator:
         
         local_var_count = 0
         
-        # Reserva offset 0 para valor de retorno da função
-        if self.current_function and self.current_function != "global":
-            self.function_vars[self.current_function]["__return__"] = 0
-        
         for declaration in declarations_node.children:
             if declaration.type == 'var_declaration':
                 for var_item in declaration.children:
@@ -959,10 +1001,10 @@ class CodeGenerator:
                     type_node = var_item.children[1]
                     
                     for var_name in id_list_node.value:
-                        # Mapeia variável local para offset positivo (1, 2, 3...)
-                        # Offset 0 é reservado para valor de retorno
-                        self.function_vars[self.current_function][var_name] = local_var_count + 1
-                        self.code.append(f"// Variável local {var_name} no offset {local_var_count + 1}")
+                        # Variável local no offset positivo (1, 2, 3...)
+                        # O offset 0 fica por usar
+                        if self.annotate:
+                            self.comment(f"Variável local {var_name} no offset {local_var_count + 1}")
                         local_var_count += 1
         
         return local_var_count
@@ -971,41 +1013,88 @@ class CodeGenerator:
         """Gera código para chamada de função."""
         func_name = call_node.value
         
-        self.code.append(f"// Chamada da função {func_name}")
+        if self.annotate:
+            self.comment(f"Chamada da função {func_name}")
+        
+        # Posição do valor de retorno, abaixo dos argumentos
+        self.emit("pushi", 0)
         
         # Empilha argumentos na ordem correta (da esquerda para a direita)
+        arguments = self.generate_arguments(call_node)
+        
+        # Empilha o endereço da função e chama
+        self.builder.append(call_node.binding.load)
+        self.emit("call")
+        
+        # Retira os argumentos, deixando o valor de retorno no topo
+        if arguments > 0:
+            self.emit("pop", arguments)
+    
+    def generate_arguments(self, call_node):
+        """Empilha os argumentos de uma chamada, da esquerda para a direita; devolve quantos são."""
         if len(call_node.children) > 0:
             args_node = call_node.children[0]
             if args_node.type == 'argument_list':
-                # Empilha argumentos na ordem normal (não reversa)
                 for arg_node in args_node.children:
                     self.generate_expression(arg_node)
+                return len(args_node.children)
+        return 0
+    
+    def find_tail_calls(self, statement_node, found):
+        """Junta a found as atribuições F := F(...) em posição final no corpo da função F.
         
-        # Empilha o endereço da função e chama
-        self.code.append(f"pusha {func_name}")
-        self.code.append("call")
-
-        # Para funções que retornam string, precisamos garantir que o resultado seja uma referência de string
-        func_symbol = self.symbol_table.lookup(func_name)
-        if func_symbol and func_symbol.type == 'string':
-            # Já temos uma referência de string no topo da pilha, não precisamos fazer nada
-            pass
+        Uma atribuição está em posição final se for o último comando executado
+        antes do return: o último comando do corpo ou de um bloco/ramo de if
+        que esteja ele próprio em posição final.
+        """
+        if statement_node is None:
+            return
+        if statement_node.type == 'compound_statement':
+            statements = [statement for statement in statement_node.children if statement is not None]
+            if statements:
+                self.find_tail_calls(statements[-1], found)
+        elif statement_node.type == 'if_statement':
+            for branch in statement_node.children[1:]:
+                self.find_tail_calls(branch, found)
+        elif statement_node.type == 'assignment':
+            target_node, expr_node = statement_node.children
+            if (target_node.type == 'variable' and target_node.binding.kind == RESULT
+                    and expr_node.type == 'function_call' and expr_node.constant_value is None
+                    and expr_node.binding is not None
+                    and expr_node.binding.symbol is target_node.binding.symbol):
+                found.add(statement_node)
+    
+    def generate_tail_call(self, call_node):
+        """Chamada recursiva em posição final: novos parâmetros no mesmo frame e salto para o início."""
+        func_name = call_node.value
+        if self.annotate:
+            self.comment(f"Chamada recursiva final de {func_name}: reutiliza o frame")
+        
+        # Os argumentos são todos avaliados antes de alterar os parâmetros
+        arguments = self.generate_arguments(call_node)
+        for offset in range(-1, -arguments - 1, -1):
+            self.emit("storel", offset)
+        
+        # Liberta as variáveis locais (o início da função volta a reservá-las)
+        self.emit("pop", self.frame_size)
+        self.emit("jump", func_name)
 
     def generate_procedure_call(self, call_node):
         """Gera código para chamada de procedimento."""
         proc_name = call_node.value
         
-        self.code.append(f"// Chamada do procedimento {proc_name}")
+        if self.annotate:
+            self.comment(f"Chamada do procedimento {proc_name}")
         
         # Empilha argumentos na ordem correta
-        if len(call_node.children) > 0:
-            args_node = call_node.children[0]
-            if args_node.type == 'argument_list':
-                # Empilha argumentos da direita para a esquerda
-                for arg_node in args_node.children:
-                    self.generate_expression(arg_node)
+        arguments = self.generate_arguments(call_node)
         
         # Empilha o endereço do procedimento e chama
-        self.code.append(f"pusha {proc_name}")
-        self.code.append("call")
-        self.code.append("")
+        self.builder.append(call_node.binding.load)
+        self.emit("call")
+        
+        # Retira os argumentos
+        if arguments > 0:
+            self.emit("pop", arguments)
+        if self.annotate:
+            self.blank()
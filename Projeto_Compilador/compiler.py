@@ -0,0 +1,130 @@
+# compiler.py - Pipeline de compilação reentrante
+import copy
+from lexer import lexer as shared_lexer, TokenBuffer
+from parser import parser as shared_parser, parse_code
+from semantic import SemanticAnalyzer
+from codegen import CodeGenerator
+from deadcode import eliminate_dead_code
+from ir import serialize
+from profiling import NullProfiler, count_ast_nodes, count_instructions
+
+class Compiler:
+    """Pipeline completo de compilação com estado próprio.
+
+    Cada instância tem o seu clone do lexer e do parser e cria um novo
+    SemanticAnalyzer e CodeGenerator por compilação. Instâncias diferentes
+    podem assim compilar em paralelo (ex.: uma por thread), sem partilharem
+    o input, o número de linha ou as pilhas do parser.
+    
+    Com um profiler (ver profiling.PhaseProfiler) cada fase é medida e são
+    registados os números de tokens, nós da AST e instruções geradas.
+    Com uma ast_cache (ver astcache.ASTCache) as fontes já analisadas são
+    carregadas da cache em vez de passarem outra vez pelo parser.
+    Com um peephole (ver peephole.PeepholeOptimizer) os blocos gerados passam
+    pelas regras de otimização escolhidas, antes da serialização. Com release=True o código é gerado
+    sem comentários nem linhas em branco; com short_circuit=True as condições
+    com and/or de if/while são avaliadas por saltos; com common_subexpressions=True
+    as subexpressões repetidas num bloco básico são calculadas uma vez (ver cse).
+    O código morto (ver deadcode) é removido do grafo de fluxo de controlo,
+    exceto com dead_code=False.
+    """
+
+    def __init__(self, profiler=None, ast_cache=None, peephole=None, release=False, short_circuit=False,
+                 dead_code=True, common_subexpressions=False):
+        self.lexer = shared_lexer.clone()
+        self.parser = copy.copy(shared_parser)  # As tabelas LALR são só de leitura
+        self.analyzer = None
+        self.generator = None
+        self.profiler = profiler or NullProfiler()
+        self.ast_cache = ast_cache
+        self.peephole = peephole
+        self.release = release
+        self.short_circuit = short_circuit
+        self.dead_code = dead_code
+        self.common_subexpressions = common_subexpressions
+        self.dead_code_result = None  # DeadCodeResult da última geração
+        # Erros léxicos/sintáticos da última análise: uma AST obtida depois de
+        # erros (recuperados pelo PLY) não vai para a cache
+        self.error_count = 0
+        self.lexer.lexerrorf = self.count_errors(self.lexer.lexerrorf)
+        self.parser.errorfunc = self.count_errors(self.parser.errorfunc)
+
+    def count_errors(self, handler):
+        """Envolve um tratador de erros do PLY para contar os erros desta instância."""
+        def counting_handler(arg):
+            self.error_count += 1
+            return handler(arg)
+        return counting_handler
+
+    def tokenize(self, source_code):
+        """Devolve um TokenBuffer com os tokens do código fonte.
+
+        O buffer é lido à medida que é percorrido; passado a parse(), o parser
+        reutiliza os mesmos tokens em vez de analisar o código outra vez.
+        Com um profiler ativo o buffer é lido de imediato, para medir a fase.
+        """
+        self.error_count = 0
+        tokens = TokenBuffer(self.lexer, source_code)
+        if self.profiler.enabled:
+            with self.profiler.phase("análise léxica"):
+                tokens.fill()
+            self.profiler.count("tokens", len(tokens))
+        return tokens
+
+    def parse(self, source_code, tokens=None):
+        """Análise sintática; devolve a AST ou None em caso de erro.
+
+        tokens é um TokenBuffer devolvido por tokenize(source_code) (opcional).
+        """
+        with self.profiler.phase("análise sintática"):
+            ast = self.ast_cache.load(source_code) if self.ast_cache else None
+            if ast is None:
+                if tokens is None:
+                    self.error_count = 0
+                    self.lexer.lineno = 1
+                    ast = parse_code(source_code, self.lexer, self.parser)
+                else:
+                    ast = parse_code(source_code, tokens, self.parser)
+                if ast is not None and self.ast_cache and self.error_count == 0:
+                    self.ast_cache.store(source_code, ast)
+        if self.profiler.enabled:
+            self.profiler.count("nós da AST", count_ast_nodes(ast))
+        return ast
+
+    def analyze(self, ast):
+        """Análise semântica; devolve True se não houver erros."""
+        with self.profiler.phase("análise semântica"):
+            self.analyzer = SemanticAnalyzer()
+            result = self.analyzer.analyze(ast)
+        return result
+
+    def generate(self, ast):
+        """Geração de código EWVM (requer uma análise semântica bem-sucedida)."""
+        with self.profiler.phase("geração de código"):
+            self.generator = CodeGenerator(self.analyzer.symbol_table, self.release, self.short_circuit,
+                                           self.common_subexpressions)
+            cfg = self.generator.generate_cfg(ast)
+        if cfg is None:
+            return []
+        if self.dead_code:
+            with self.profiler.phase("código morto"):
+                self.dead_code_result = eliminate_dead_code(cfg)
+            self.profiler.count("instruções removidas (código morto)", self.dead_code_result.instructions)
+            self.profiler.count("subprogramas removidos", len(self.dead_code_result.subprograms))
+        if self.peephole:
+            removed_before = self.peephole.total_removed()
+            with self.profiler.phase("otimização peephole"):
+                self.peephole.optimize(cfg)
+            self.profiler.count("instruções removidas (peephole)", self.peephole.total_removed() - removed_before)
+        with self.profiler.phase("serialização"):
+            code = serialize(cfg)
+        if self.profiler.enabled:
+            self.profiler.count("instruções", count_instructions(code))
+        return code
+
+    def compile(self, source_code):
+        """Compila o código fonte; devolve a lista de instruções ou None."""
+        ast = self.parse(source_code)
+        if ast is None or not self.analyze(ast):
+            return None
+        return self.generate(ast)
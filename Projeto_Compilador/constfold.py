@@ -0,0 +1,104 @@
+# constfold.py - Avaliação de expressões constantes em tempo de compilação
+#
+# Os valores são os do Python: int (integer), float (real), bool (boolean) e
+# str (string). None significa "não é constante". Só se avaliam as operações
+# cujo resultado é o mesmo que o código gerado daria na EWVM; as restantes
+# (ex.: '/' entre inteiros, que é gerado como div) ficam para a execução.
+from symboltable import INTEGER, REAL, BOOLEAN, STRING
+
+def value_type(value):
+    """Descritor do tipo de um valor constante."""
+    if isinstance(value, bool):
+        return BOOLEAN
+    if isinstance(value, int):
+        return INTEGER
+    if isinstance(value, float):
+        return REAL
+    return STRING
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def literal_value(node):
+    """Valor de um nó literal (number, string ou boolean); None nos restantes."""
+    if node.type in ('number', 'string'):
+        return node.value
+    if node.type == 'boolean':
+        return node.value.lower() == 'true'
+    return None
+
+def truncated_div(a, b):
+    """Divisão inteira com truncatura para zero, como o div da EWVM."""
+    quotient = abs(a) // abs(b)
+    return quotient if (a >= 0) == (b >= 0) else -quotient
+
+def arithmetic(operation):
+    def fold(a, b):
+        return operation(a, b) if is_number(a) and is_number(b) else None
+    return fold
+
+def real_division(a, b):
+    """'/' só é avaliado com um operando real (entre inteiros é gerado como div)."""
+    if not (is_number(a) and is_number(b)) or (is_integer(a) and is_integer(b)) or b == 0:
+        return None
+    return a / b
+
+def integer_division(a, b):
+    if not (is_integer(a) and is_integer(b)) or b == 0:
+        return None
+    return truncated_div(a, b)
+
+def integer_modulo(a, b):
+    quotient = integer_division(a, b)
+    return None if quotient is None else a - b * quotient
+
+ordering = arithmetic  # Comparações de ordem só entre números
+
+def equality(operation):
+    def fold(a, b):
+        if is_number(a) and is_number(b) or type(a) is type(b):
+            return operation(a, b)
+        return None
+    return fold
+
+def logical(operation):
+    def fold(a, b):
+        return operation(a, b) if isinstance(a, bool) and isinstance(b, bool) else None
+    return fold
+
+# Operador (lexema, em minúsculas) -> função (a, b) -> valor ou None
+BINARY_OPERATIONS = {
+    '+': arithmetic(lambda a, b: a + b),
+    '-': arithmetic(lambda a, b: a - b),
+    '*': arithmetic(lambda a, b: a * b),
+    '/': real_division,
+    'div': integer_division,
+    'mod': integer_modulo,
+    '=': equality(lambda a, b: a == b),
+    '<>': equality(lambda a, b: a != b),
+    '<': ordering(lambda a, b: a < b),
+    '>': ordering(lambda a, b: a > b),
+    '<=': ordering(lambda a, b: a <= b),
+    '>=': ordering(lambda a, b: a >= b),
+    'and': logical(lambda a, b: a and b),
+    'or': logical(lambda a, b: a or b),
+}
+
+def fold_binary(operator, left, right):
+    """Valor de left <operador> right, ou None se não for avaliável em compilação."""
+    if left is None or right is None:
+        return None
+    operation = BINARY_OPERATIONS.get(operator.lower())
+    return operation(left, right) if operation is not None else None
+
+def fold_unary(operator, operand):
+    """Valor de -operand ou not operand, ou None."""
+    operator = operator.lower()
+    if operator == '-' and is_number(operand):
+        return -operand
+    if operator == 'not' and isinstance(operand, bool):
+        return not operand
+    return None
@@ -0,0 +1,338 @@
+# cse.py - Eliminação de subexpressões comuns dentro de blocos básicos
+#
+# Num troço de código sem saltos (comandos seguidos, até à condição de um if
+# ou aos limites de um for), uma expressão sem chamadas que se repete sobre
+# variáveis que não mudaram pelo meio é calculada uma vez e copiada para uma
+# posição escondida (dup 1; store); as ocorrências seguintes leem a cópia.
+# O endereço de um elemento de array conta como uma subexpressão à parte:
+# readln(a[i]); s := s + a[i] calcula o endereço de a[i] uma só vez.
+#
+# O percurso segue a ordem de avaliação do gerador de código (codegen).
+# Cada escrita numa variável (ou num elemento de um array) muda a versão do
+# que lê essa variável; uma chamada pode escrever em qualquer global e muda
+# tudo. Só se guarda uma subexpressão quando as instruções poupadas nas
+# reutilizações pagam as duas acrescentadas na primeira ocorrência.
+from collections import Counter
+from symboltable import GLOBAL, STRING
+
+# Expressões substituídas pelo seu valor na geração (ver codegen.FOLDED_TYPES)
+FOLDED_TYPES = frozenset({'variable', 'binary_op', 'unary_op'})
+LITERAL_TYPES = frozenset({'number', 'string', 'boolean'})
+
+# Instruções a mais da primeira ocorrência: dup 1 e o store para a posição escondida
+SAVE_COST = 2
+
+# Marcas em events à volta de um operando que pode não ser avaliado (ver collect)
+SAVE, RESTORE = 'guarda', 'repõe'
+
+def variable_id(binding):
+    """Identifica a posição de uma variável: global ou no frame (locais, parâmetros e resultado)."""
+    return ('global' if binding.kind == GLOBAL else 'frame', binding.index)
+
+def array_id(binding):
+    """Identifica o conteúdo de um array global (qualquer elemento)."""
+    return ('array', binding.index)
+
+class CommonSubexpressionPlanner:
+    """Escolhe, no corpo de um subprograma (ou do programa), as subexpressões a reutilizar.
+
+    plan(body) devolve (values, addresses, slots): values mapeia nós de
+    expressões e addresses nós array_access (o endereço do elemento) em
+    (posição, primeira), com posição o número da posição escondida (0, 1, ...)
+    e primeira True na ocorrência que calcula e guarda o valor; slots é o
+    número de posições necessárias.
+    """
+
+    def __init__(self, short_circuit=False, reduced=None):
+        self.short_circuit = short_circuit  # Condições com and/or avaliadas por saltos (ver codegen)
+        self.reduced = reduced or {}        # Acessos com o endereço mantido pelo ciclo for -> deslocamento (ver induction)
+        self.keys = {}  # Chave de uma expressão -> número (as chaves encaixadas não são recalculadas)
+
+    def plan(self, body):
+        self.collect(body)
+        counts = Counter(event[1] for event in self.events if event[0] is not None and event[1] is not None)
+        excluded = set()
+        while True:
+            sites, firsts, reuses, costs = self.simulate(counts, excluded)
+            unprofitable = {identity for identity, cost in costs.items()
+                            if reuses[identity] * (cost - 1) <= SAVE_COST * firsts[identity]}
+            if not unprofitable:
+                break
+            excluded |= unprofitable
+
+        values, addresses = {}, {}
+        region_slots = {}
+        slot_of = {}
+        for site, identity, first in sites:
+            if identity not in slot_of:
+                region = identity[0]
+                slot_of[identity] = region_slots.get(region, 0)
+                region_slots[region] = slot_of[identity] + 1
+            kind, node = site
+            (values if kind == 'value' else addresses)[node] = (slot_of[identity], first)
+        return values, addresses, max(region_slots.values(), default=0)
+
+    def collect(self, body):
+        """Percorre o corpo uma vez e junta em events as ocorrências, pela ordem de avaliação.
+
+        Cada ocorrência é [local, identidade, instruções, fim], com fim a posição
+        a seguir às das suas subexpressões (saltadas se for reutilizada) e
+        identidade None se não valer a pena guardá-la. Os
+        operandos da direita de and/or com short_circuit ficam entre [None, SAVE]
+        e [None, RESTORE]. A identidade inclui o troço: as de troços diferentes
+        nunca coincidem.
+        """
+        self.events = []
+        self.versions = Counter()
+        self.epoch = 0          # Muda a cada chamada
+        self.region = 0
+        self.statement(body)
+
+    def simulate(self, counts, excluded):
+        """Escolhe as reutilizações das identidades repetidas e não excluídas.
+
+        Devolve os locais escolhidos, (local, identidade, primeira), e por
+        identidade as primeiras ocorrências, as reutilizações e as instruções.
+        """
+        events = self.events
+        sites = []
+        firsts, reuses, costs = Counter(), Counter(), {}
+        available = set()  # Identidades já guardadas
+        saved = []
+        position, total = 0, len(events)
+        while position < total:
+            event = events[position]
+            site, identity = event[0], event[1]
+            position += 1
+            if site is None:
+                if identity is SAVE:
+                    saved.append(set(available))
+                else:
+                    available = saved.pop()
+            elif identity is not None and counts[identity] > 1 and identity not in excluded:
+                if identity in available:
+                    reuses[identity] += 1
+                    sites.append((site, identity, False))
+                    position = event[3]
+                else:
+                    available.add(identity)
+                    firsts[identity] += 1
+                    costs[identity] = event[2]
+                    sites.append((site, identity, True))
+        return sites, firsts, reuses, costs
+
+    # ----- Troços e escritas -----
+
+    def end_region(self):
+        """Um rótulo ou um salto: o que foi guardado antes deixa de estar disponível."""
+        self.region += 1
+
+    def write(self, written_id):
+        self.versions[written_id] += 1
+
+    def call(self):
+        self.epoch += 1
+
+    # ----- Comandos, pela ordem do gerador -----
+
+    def statement(self, node):
+        if node is None:
+            return
+        kind = node.type
+        if kind == 'compound_statement':
+            for statement in node.children:
+                self.statement(statement)
+        elif kind == 'assignment':
+            self.assignment(node)
+        elif kind == 'write_statement':
+            if node.children:
+                for expr_node in node.children[0].children:
+                    self.expression(expr_node)
+        elif kind == 'read_statement':
+            if node.children:
+                for var_node in node.children[0].children:
+                    if var_node.type == 'variable':
+                        self.write(variable_id(var_node.binding))
+                    elif var_node.type == 'array_access':
+                        self.address(var_node)
+                        self.write(array_id(var_node.binding))
+        elif kind in ('procedure_call', 'function_call'):
+            self.arguments(node)
+            self.call()
+        elif kind == 'if_statement':
+            self.if_statement(node)
+        elif kind == 'while_statement':
+            self.end_region()
+            self.condition(node.children[0])
+            self.end_region()
+            self.statement(node.children[1])
+            self.end_region()
+        elif kind == 'for_statement':
+            start_expr, end_expr, body_node = node.children
+            self.expression(start_expr)
+            if node.temporary is not None:
+                self.expression(end_expr)
+            self.write(variable_id(node.binding))
+            self.end_region()
+            self.statement(body_node)
+            self.end_region()
+
+    def assignment(self, node):
+        target, expr_node = node.children
+        if expr_node is None:
+            return
+        binding = target.binding
+        if target.type == 'array_access':
+            self.address(target)
+            self.expression(expr_node)
+            self.write(array_id(binding))
+        else:
+            self.expression(expr_node)
+            self.write(variable_id(binding))
+
+    def if_statement(self, node):
+        condition_node = node.children[0]
+        if isinstance(condition_node.constant_value, bool):
+            # Só o ramo escolhido é gerado, sem saltos
+            if condition_node.constant_value:
+                self.statement(node.children[1])
+            elif len(node.children) > 2:
+                self.statement(node.children[2])
+            return
+        self.condition(condition_node)
+        for branch in node.children[1:]:
+            self.end_region()
+            self.statement(branch)
+        self.end_region()
+
+    def condition(self, node):
+        """Condição de if/while; com short_circuit, o operando da direita de and/or pode não ser avaliado."""
+        if self.short_circuit and node.type == 'binary_op' and node.value.lower() in ('and', 'or'):
+            left_node, right_node = node.children
+            self.condition(left_node)
+            self.events.append([None, SAVE])
+            self.condition(right_node)
+            self.events.append([None, RESTORE])
+        else:
+            self.expression(node)
+
+    def arguments(self, call_node):
+        if call_node.children and call_node.children[0].type == 'argument_list':
+            for arg_node in call_node.children[0].children:
+                self.expression(arg_node)
+
+    # ----- Expressões -----
+    #
+    # expression e address devolvem a descrição da expressão percorrida:
+    # (chave, instruções geradas, leituras), ou None se não puder ser
+    # reutilizada (tem chamadas). A chave é um número, o mesmo para expressões
+    # iguais; as leituras são as variáveis e arrays lidos, por uma ordem fixa.
+
+    def expression(self, node):
+        """Percorre uma expressão pela ordem de avaliação; devolve a sua descrição."""
+        if node is None:
+            return None
+        kind = node.type
+        if node.constant_value is not None and kind in FOLDED_TYPES or kind in LITERAL_TYPES:
+            value = node.constant_value if node.constant_value is not None else node.value
+            return self.key(('constant', repr(value))), 1, ()
+        if kind == 'variable':
+            return self.variable(node)
+        event = self.occurrence(('value', node))
+        description = None
+        if kind == 'binary_op':
+            left = self.expression(node.children[0])
+            right = self.expression(node.children[1])
+            if left is not None and right is not None:
+                operator = node.value.lower()
+                cost = left[1] + right[1] + (2 if operator in ('<>', 'neq') else 1)
+                description = self.key(('binary', operator, left[0], right[0])), cost, merge(left[2], right[2])
+        elif kind == 'unary_op':
+            operand = self.expression(node.children[0])
+            if operand is not None:
+                operator = node.value.lower()
+                cost = operand[1] + {'-': 2, 'minus': 2, 'not': 1}.get(operator, 0)
+                description = self.key(('unary', operator, operand[0])), cost, operand[2]
+        elif kind == 'array_access':
+            binding = node.binding
+            if binding.symbol.type is STRING:
+                index = self.expression(node.children[0])
+                if index is not None:
+                    read = variable_id(binding)
+                    # Carrega a string, índice, pushi 1; sub; charat
+                    description = (self.key(('character', read, index[0])), index[1] + 4,
+                                   merge(index[2], (read,)))
+            elif binding.kind == GLOBAL:
+                address = self.address(node)
+                if address is not None:
+                    description = (self.key(('element', address[0])), address[1] + 1,
+                                   merge(address[2], (array_id(binding),)))
+        elif kind == 'length_call':
+            arg_node = node.children[0]
+            if arg_node.type == 'variable' and arg_node.constant_value is None:
+                argument = self.variable(arg_node)
+            else:
+                argument = self.expression(arg_node)
+            if argument is not None:
+                description = self.key(('length', argument[0])), argument[1] + 1, argument[2]
+        elif kind == 'function_call':
+            self.arguments(node)
+            self.call()
+        self.finish(event, description)
+        return description
+
+    def variable(self, node):
+        if node.binding is None:
+            return None
+        read = variable_id(node.binding)
+        return self.key(('variable', read)), 1, (read,)
+
+    def address(self, node):
+        """Percorre o endereço de um elemento de um array global (antes de load 0 ou store 0)."""
+        event = self.occurrence(('address', node))
+        mark = len(self.events)
+        index = self.expression(node.children[0])
+        if node in self.reduced:
+            # O índice não é gerado: as suas ocorrências não podem ser guardadas nem reutilizadas
+            del self.events[mark:]
+        description = None
+        if index is not None:
+            binding = node.binding
+            if node in self.reduced:
+                # Posição escondida do ciclo; [pushi deslocamento; padd]
+                cost = 1 if self.reduced[node] == 0 else 3
+            else:
+                dims = binding.symbol.array_dims
+                start = dims[0] if dims else 0
+                # pushgp; pushi base; padd; índice; [pushi início; sub]; padd
+                cost = 3 + index[1] + (2 if start != 0 else 0) + 1
+            description = self.key(('address', binding.index, index[0])), cost, index[2]
+        self.finish(event, description)
+        return description
+
+    def key(self, key):
+        return self.keys.setdefault(key, len(self.keys))
+
+    def occurrence(self, site):
+        """Junta a events a ocorrência que começa; finish completa-a depois das subexpressões."""
+        event = [site, None, 0, 0]
+        self.events.append(event)
+        return event
+
+    def finish(self, event, description):
+        """Marca o fim das subexpressões e, se valer a pena guardar a expressão, a sua identidade."""
+        event[3] = len(self.events)
+        if description is not None and description[1] >= 2:
+            # Sem chamadas, as versões são as mesmas do início da expressão
+            key, cost, reads = description
+            versions = self.versions
+            event[1] = (self.region, self.epoch, key, tuple([versions[read] for read in reads]))
+            event[2] = cost
+
+def merge(first, second):
+    """Junta duas sequências ordenadas de leituras, sem repetições."""
+    if not second or first == second:
+        return first
+    if not first:
+        return second
+    return tuple(sorted(set(first).union(second)))
@@ -0,0 +1,123 @@
+# deadcode.py - Eliminação de código morto sobre o grafo de fluxo de controlo (ver ir)
+#
+# A procura parte do bloco de entrada do programa e segue as arestas do grafo
+# e as chamadas (pusha F): os subprogramas que nunca chegam a ser chamados e
+# os blocos a que nenhum caminho chega (ex.: o return depois de uma recursão
+# final) são removidos. Antes disso, os saltos com condição constante
+# (pushi k; jz L) passam a jump L ou desaparecem. No fim, caem os saltos
+# para o bloco que se segue e os rótulos que deixaram de ser usados, e cada
+# bloco sem rótulo junta-se ao anterior.
+from ir import Instruction, JUMPS, TERMINATORS
+
+class DeadCodeResult:
+    """O que eliminate_dead_code removeu."""
+
+    def __init__(self, instructions, subprograms, labels):
+        self.instructions = instructions  # Instruções removidas
+        self.subprograms = subprograms    # Nomes dos subprogramas removidos, pela ordem da listagem
+        self.labels = labels              # Rótulos retirados (sem contar os dos subprogramas)
+
+    def __repr__(self):
+        return (f"DeadCodeResult(instructions={self.instructions}, subprograms={self.subprograms}, "
+                f"labels={self.labels})")
+
+def eliminate_dead_code(cfg):
+    """Remove do grafo o código inalcançável; devolve um DeadCodeResult."""
+    removed = fold_constant_branches(cfg)
+    cfg.link()
+    reachable, called = reachable_blocks(cfg)
+    subprograms = []
+    blocks = []
+    for block in cfg.blocks:
+        if block in reachable:
+            blocks.append(block)
+            continue
+        removed += len(block.instructions())
+        if block.subprogram:
+            subprograms.append(block.label)
+    cfg.blocks = blocks
+    removed += cfg.remove_jumps_to_next()
+    labels = remove_unused_labels(cfg, called)
+    cfg.link()
+    return DeadCodeResult(removed, subprograms, labels)
+
+def fold_constant_branches(cfg):
+    """pushi k; jz L no fim de um bloco: jump L se k for 0, nada nos outros casos.
+
+    Devolve o número de instruções removidas.
+    """
+    removed = 0
+    for block in cfg.blocks:
+        items = block.items
+        # Só o fim do bloco interessa: procura as duas últimas instruções a partir daí
+        position = len(items) - 1
+        while position >= 0 and type(items[position]) is not Instruction:
+            position -= 1
+        if position < 0 or items[position].opcode != "jz":
+            continue
+        branch_position = position
+        position -= 1
+        while position >= 0 and type(items[position]) is not Instruction:
+            position -= 1
+        if position < 0 or items[position].opcode != "pushi":
+            continue
+        branch = items[branch_position]
+        if items[position].argument == 0:
+            items[branch_position] = Instruction("jump", branch.argument)
+            removed += 1
+        else:
+            del items[branch_position]
+            removed += 2
+        del items[position]
+    return removed
+
+def reachable_blocks(cfg):
+    """Blocos alcançáveis a partir da entrada, pelas arestas e pelos subprogramas chamados.
+
+    Devolve também os rótulos chamados (pusha) a partir desses blocos.
+    """
+    reached = set()
+    called = set()
+    pending = [cfg.blocks[0]]
+    while pending:
+        block = pending.pop()
+        if block in reached:
+            continue
+        reached.add(block)
+        pending.extend(block.successors)
+        for item in block.items:
+            if type(item) is Instruction and item.opcode == "pusha" and item.argument in cfg.labels:
+                called.add(item.argument)
+                pending.append(cfg.labels[item.argument])
+    return reached, called
+
+def remove_unused_labels(cfg, called):
+    """Retira os rótulos sem saltos nem chamadas e junta cada bloco sem rótulo ao anterior.
+
+    called são os rótulos chamados pelos blocos que ficaram (ver
+    reachable_blocks); os saltos só podem estar no fim de cada bloco.
+    Depois de removidos os blocos inalcançáveis, um bloco sem rótulo só pode
+    ser alcançado pelo anterior, que continua nele sem saltar.
+    Devolve o número de rótulos retirados.
+    """
+    used = set(called)
+    for block in cfg.blocks:
+        last = block.last_instruction()
+        if last is not None and last.opcode in JUMPS:
+            used.add(last.argument)
+    removed = 0
+    blocks = [cfg.blocks[0]]
+    for block in cfg.blocks[1:]:
+        if block.label is not None and block.label not in used:
+            block.label = None
+            block.subprogram = False
+            removed += 1
+        previous = blocks[-1]
+        last = previous.last_instruction()
+        if block.label is None and (last is None or last.opcode not in TERMINATORS):
+            previous.items.extend(block.leading)
+            previous.items.extend(block.items)
+        else:
+            blocks.append(block)
+    cfg.blocks = blocks
+    return removed
@@ -0,0 +1,281 @@
+# ewvm.py - Interpretador do subconjunto da EWVM usado pelo compilador
+#
+# Serve para testar o código gerado sem a máquina virtual web: executa um
+# programa .vm com uma lista de linhas de input e devolve o texto escrito,
+# o número de instruções executadas e as profundidades máximas da pilha e
+# das chamadas. Os operadores aritméticos e relacionais inteiros rejeitam
+# operandos que não sejam inteiros, tal como a EWVM.
+
+class VMError(Exception):
+    """Erro de execução (instrução desconhecida, tipo inválido, limite de passos...)."""
+
+class Address:
+    """Endereço de uma posição da pilha (devolvido por pushgp/pushfp e somado com padd)."""
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, Address) and other.index == self.index
+
+    def __repr__(self):
+        return f"Address({self.index})"
+
+class CodeAddress:
+    """Endereço de código (pusha), consumido por call."""
+    __slots__ = ('pc',)
+
+    def __init__(self, pc):
+        self.pc = pc
+
+class VMResult:
+    """Resultado de uma execução."""
+
+    def __init__(self, output, steps, max_stack, max_calls):
+        self.output = output          # Texto escrito pelo programa
+        self.steps = steps            # Instruções executadas
+        self.max_stack = max_stack    # Maior tamanho da pilha
+        self.max_calls = max_calls    # Maior profundidade de chamadas
+
+    def __repr__(self):
+        return (f"VMResult(steps={self.steps}, max_stack={self.max_stack}, "
+                f"max_calls={self.max_calls}, output={self.output!r})")
+
+def parse_program(code):
+    """Converte as linhas do .vm em (instruções, rótulos -> índice da instrução seguinte)."""
+    instructions = []
+    labels = {}
+    for raw_line in code:
+        line = raw_line.strip()
+        if not line or line.startswith("//"):
+            continue
+        if line.endswith(":") and not line.startswith(("pushs", "err")):
+            labels[line[:-1]] = len(instructions)
+            continue
+        opcode, _, argument = line.partition(" ")
+        argument = argument.strip()
+        if argument.startswith('"') and argument.endswith('"') and len(argument) >= 2:
+            argument = argument[1:-1]
+        instructions.append((opcode.lower(), argument))
+    return instructions, labels
+
+def integer(value, opcode):
+    if type(value) is not int:
+        raise VMError(f"{opcode}: operando inteiro esperado, encontrado {value!r}")
+    return value
+
+def real(value, opcode):
+    if type(value) is not float:
+        raise VMError(f"{opcode}: operando real esperado, encontrado {value!r}")
+    return value
+
+def truncated_div(a, b):
+    """Divisão inteira com truncatura para zero (como em C)."""
+    if b == 0:
+        raise VMError("div: divisão por zero")
+    quotient = abs(a) // abs(b)
+    return quotient if (a >= 0) == (b >= 0) else -quotient
+
+def truncated_mod(a, b):
+    if b == 0:
+        raise VMError("mod: divisão por zero")
+    return a - b * truncated_div(a, b)
+
+INTEGER_OPERATIONS = {
+    'add': lambda a, b: a + b,
+    'sub': lambda a, b: a - b,
+    'mul': lambda a, b: a * b,
+    'div': truncated_div,
+    'mod': truncated_mod,
+    'inf': lambda a, b: int(a < b),
+    'infeq': lambda a, b: int(a <= b),
+    'sup': lambda a, b: int(a > b),
+    'supeq': lambda a, b: int(a >= b),
+    'and': lambda a, b: int(bool(a) and bool(b)),
+    'or': lambda a, b: int(bool(a) or bool(b)),
+}
+
+REAL_OPERATIONS = {
+    'fadd': lambda a, b: a + b,
+    'fsub': lambda a, b: a - b,
+    'fmul': lambda a, b: a * b,
+    'fdiv': lambda a, b: a / b,
+    'finf': lambda a, b: int(a < b),
+    'finfeq': lambda a, b: int(a <= b),
+    'fsup': lambda a, b: int(a > b),
+    'fsupeq': lambda a, b: int(a >= b),
+}
+
+def run(code, inputs=(), max_steps=10_000_000):
+    """Executa o programa (lista de linhas .vm) e devolve um VMResult."""
+    instructions, labels = parse_program(code)
+    inputs = list(inputs)
+    output = []
+    stack = []
+    calls = []           # (pc de retorno, fp) de cada chamada
+    gp = fp = 0
+    pc = 0
+    steps = 0
+    max_stack = 0
+    max_calls = 0
+
+    def target(label):
+        if label not in labels:
+            raise VMError(f"rótulo desconhecido: {label}")
+        return labels[label]
+
+    def pop():
+        if len(stack) <= 0:
+            raise VMError("pilha vazia")
+        return stack.pop()
+
+    while True:
+        if pc >= len(instructions):
+            raise VMError("fim do código sem stop")
+        opcode, argument = instructions[pc]
+        pc += 1
+        steps += 1
+        if steps > max_steps:
+            raise VMError(f"limite de {max_steps} passos excedido")
+
+        if opcode in INTEGER_OPERATIONS:
+            b = integer(pop(), opcode)
+            a = integer(pop(), opcode)
+            stack.append(INTEGER_OPERATIONS[opcode](a, b))
+        elif opcode in REAL_OPERATIONS:
+            b = real(pop(), opcode)
+            a = real(pop(), opcode)
+            stack.append(REAL_OPERATIONS[opcode](a, b))
+        elif opcode == 'pushi':
+            stack.append(int(argument))
+        elif opcode == 'pushf':
+            stack.append(float(argument))
+        elif opcode == 'pushs':
+            stack.append(argument)
+        elif opcode == 'pushn':
+            stack.extend([0] * int(argument))
+        elif opcode == 'pushg':
+            stack.append(stack[gp + int(argument)])
+        elif opcode == 'storeg':
+            stack[gp + int(argument)] = pop()
+        elif opcode == 'pushl':
+            stack.append(stack[fp + int(argument)])
+        elif opcode == 'storel':
+            stack[fp + int(argument)] = pop()
+        elif opcode == 'pushgp':
+            stack.append(Address(gp))
+        elif opcode == 'pushfp':
+            stack.append(Address(fp))
+        elif opcode == 'padd':
+            offset = integer(pop(), opcode)
+            address = pop()
+            stack.append(Address(address.index + offset))
+        elif opcode == 'load':
+            address = pop()
+            stack.append(stack[address.index + int(argument)])
+        elif opcode == 'store':
+            value = pop()
+            address = pop()
+            stack[address.index + int(argument)] = value
+        elif opcode == 'loadn':
+            offset = integer(pop(), opcode)
+            address = pop()
+            stack.append(stack[address.index + offset])
+        elif opcode == 'storen':
+            value = pop()
+            offset = integer(pop(), opcode)
+            address = pop()
+            stack[address.index + offset] = value
+        elif opcode == 'dup':
+            count = int(argument)
+            stack.extend(stack[len(stack) - count:])
+        elif opcode == 'pop':
+            for _ in range(int(argument)):
+                pop()
+        elif opcode == 'swap':
+            b = pop()
+            a = pop()
+            stack.extend((b, a))
+        elif opcode == 'equal':
+            b = pop()
+            a = pop()
+            stack.append(int(a == b))
+        elif opcode == 'not':
+            stack.append(int(integer(pop(), opcode) == 0))
+        elif opcode == 'itof':
+            stack.append(float(integer(pop(), opcode)))
+        elif opcode == 'ftoi':
+            stack.append(int(real(pop(), opcode)))
+        elif opcode == 'jump':
+            pc = target(argument)
+        elif opcode == 'jz':
+            if pop() == 0:
+                pc = target(argument)
+        elif opcode == 'pusha':
+            stack.append(CodeAddress(target(argument)))
+        elif opcode == 'call':
+            address = pop()
+            if not isinstance(address, CodeAddress):
+                raise VMError(f"call: endereço de código esperado, encontrado {address!r}")
+            calls.append((pc, fp))
+            max_calls = max(max_calls, len(calls))
+            fp = len(stack)
+            pc = address.pc
+        elif opcode == 'return':
+            if not calls:
+                raise VMError("return fora de uma chamada")
+            del stack[fp:]
+            pc, fp = calls.pop()
+        elif opcode == 'start':
+            fp = len(stack)
+        elif opcode == 'stop':
+            return VMResult("".join(output), steps, max_stack, max_calls)
+        elif opcode == 'nop':
+            pass
+        elif opcode == 'read':
+            if not inputs:
+                raise VMError("read: input esgotado")
+            stack.append(str(inputs.pop(0)))
+        elif opcode == 'atoi':
+            value = pop()
+            try:
+                stack.append(int(value))
+            except (TypeError, ValueError):
+                raise VMError(f"atoi: {value!r} não é um inteiro")
+        elif opcode == 'atof':
+            value = pop()
+            try:
+                stack.append(float(value))
+            except (TypeError, ValueError):
+                raise VMError(f"atof: {value!r} não é um real")
+        elif opcode == 'writei':
+            output.append(str(integer(pop(), opcode)))
+        elif opcode == 'writef':
+            output.append(str(real(pop(), opcode)))
+        elif opcode == 'writes':
+            value = pop()
+            if not isinstance(value, str):
+                raise VMError(f"writes: string esperada, encontrado {value!r}")
+            output.append(value)
+        elif opcode == 'writeln':
+            output.append("\n")
+        elif opcode == 'strlen':
+            stack.append(len(pop()))
+        elif opcode == 'charat':
+            index = integer(pop(), opcode)
+            string = pop()
+            if not 0 <= index < len(string):
+                raise VMError(f"charat: índice {index} fora da string {string!r}")
+            stack.append(ord(string[index]))
+        elif opcode == 'concat':
+            b = pop()
+            a = pop()
+            stack.append(a + b)
+        elif opcode == 'err':
+            raise VMError(argument)
+        else:
+            raise VMError(f"instrução desconhecida: {opcode}")
+
+        if len(stack) > max_stack:
+            max_stack = len(stack)
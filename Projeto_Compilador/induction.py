@@ -0,0 +1,137 @@
+# induction.py - Redução de força nos acessos a arrays indexados pela variável de um ciclo for
+#
+# Num ciclo for i := ..., o endereço de a[i] avança uma posição por iteração.
+# Em vez de o calcular em cada acesso (pushgp; pushi base; padd; i; pushi
+# início; sub; padd), guarda-se numa posição escondida, iniciada à entrada do
+# ciclo e somada de 1 (ou -1 com downto) junto com i; o acesso passa a pushg
+# dessa posição e a[i + c] / a[i - c] somam-lhe a constante.
+#
+# A variável do ciclo não pode mudar no corpo: se o corpo lhe escrever (ou,
+# sendo global, se chamar algum subprograma), o endereço deixaria de
+# acompanhar i e o ciclo fica como está. Cada array só é reduzido quando os
+# acessos poupam mais do que as instruções que o avançam em cada iteração.
+from symboltable import GLOBAL, STRING
+from cse import variable_id
+
+# Instruções por iteração para avançar o endereço: load; pushi ±1; padd; store
+STEP_COST = 4
+
+class InductionVariablePlanner:
+    """Escolhe os acessos a arrays globais a calcular a partir de um endereço que acompanha i.
+
+    plan(body) devolve (loops, accesses, slots): loops mapeia cada for_statement
+    na lista de (posição, binding do array) a iniciar e avançar no ciclo;
+    accesses mapeia nós array_access em (posição, deslocamento), com o endereço
+    do elemento igual ao da posição mais o deslocamento; slots é o número de
+    posições escondidas necessárias (os ciclos encaixados usam posições diferentes).
+    """
+
+    def plan(self, body):
+        self.loops = {}
+        self.accesses = {}
+        self.slots = 0
+        self.statement(body, 0)
+        return self.loops, self.accesses, self.slots
+
+    def statement(self, node, next_slot):
+        """Percorre node; next_slot é a primeira posição livre (as anteriores são dos ciclos exteriores)."""
+        if node is None:
+            return
+        if node.type == 'for_statement':
+            start_expr, end_expr, body_node = node.children
+            self.statement(start_expr, next_slot)
+            self.statement(end_expr, next_slot)
+            loop_id = variable_id(node.binding)
+            if self.changes_variable(body_node, node.binding):
+                self.statement(body_node, next_slot)
+                return
+            candidates = {}  # Array -> [(acesso, deslocamento)]
+            self.find_accesses(body_node, loop_id, candidates)
+            reduced = []
+            for found in candidates.values():
+                if sum(self.saving(access, offset) for access, offset in found) > STEP_COST:
+                    slot = next_slot + len(reduced)
+                    reduced.append((slot, found[0][0].binding))
+                    for access, offset in found:
+                        self.accesses[access] = (slot, offset)
+            if reduced:
+                self.loops[node] = reduced
+            next_slot += len(reduced)
+            self.slots = max(self.slots, next_slot)
+            self.statement(body_node, next_slot)
+            return
+        for child in node.children:
+            self.statement(child, next_slot)
+
+    def changes_variable(self, node, binding):
+        """O corpo pode alterar a variável do ciclo (atribuição, leitura, outro for ou chamada)?"""
+        target = variable_id(binding)
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if node is None:
+                continue
+            kind = node.type
+            if kind == 'assignment' and node.children[0].type == 'variable':
+                if self.writes(node.children[0], target):
+                    return True
+            elif kind == 'read_statement' and node.children:
+                if any(var_node.type == 'variable' and self.writes(var_node, target)
+                       for var_node in node.children[0].children):
+                    return True
+            elif kind == 'for_statement' and variable_id(node.binding) == target:
+                return True
+            elif kind in ('procedure_call', 'function_call') and binding.kind == GLOBAL:
+                return True
+            pending.extend(node.children)
+        return False
+
+    def writes(self, var_node, target):
+        return var_node.binding is not None and variable_id(var_node.binding) == target
+
+    def find_accesses(self, node, loop_id, candidates):
+        """Junta a candidates os acessos a arrays globais com índice i, i + c, c + i ou i - c."""
+        if node is None:
+            return
+        if node.type == 'array_access':
+            binding = node.binding
+            if binding is not None and binding.kind == GLOBAL and binding.symbol.type is not STRING:
+                offset = self.index_offset(node.children[0], loop_id)
+                if offset is not None:
+                    candidates.setdefault(binding.index, []).append((node, offset))
+        for child in node.children:
+            self.find_accesses(child, loop_id, candidates)
+
+    def index_offset(self, index_node, loop_id):
+        """Deslocamento c se o índice for i, i + c, c + i ou i - c (c constante inteira), senão None."""
+        if self.is_loop_variable(index_node, loop_id):
+            return 0
+        if index_node.type != 'binary_op' or index_node.constant_value is not None:
+            return None
+        left, right = index_node.children
+        operator = index_node.value
+        if operator == '+':
+            if self.is_loop_variable(left, loop_id) and type(right.constant_value) is int:
+                return right.constant_value
+            if self.is_loop_variable(right, loop_id) and type(left.constant_value) is int:
+                return left.constant_value
+        elif operator == '-':
+            if self.is_loop_variable(left, loop_id) and type(right.constant_value) is int:
+                return -right.constant_value
+        return None
+
+    def is_loop_variable(self, node, loop_id):
+        return (node.type == 'variable' and node.constant_value is None and node.binding is not None
+                and variable_id(node.binding) == loop_id)
+
+    def saving(self, access, offset):
+        """Instruções poupadas num acesso: o cálculo completo menos a leitura do endereço."""
+        dims = access.binding.symbol.array_dims
+        start = dims[0] if dims else 0
+        index_cost = 1 if access.children[0].type == 'variable' else 3
+        full = 3 + index_cost + (2 if start != 0 else 0) + 1
+        return full - reduced_cost(offset)
+
+def reduced_cost(offset):
+    """Instruções do endereço reduzido: a posição escondida e, se houver, + deslocamento."""
+    return 1 if offset == 0 else 3
@@ -0,0 +1,194 @@
+# ir.py - Representação intermédia entre a AST e o texto .vm
+#
+# O gerador de código produz instruções e anotações tipadas diretamente
+# em blocos básicos (ver BlockBuilder): um bloco começa num
+# rótulo ou na primeira instrução depois de um jump, jz, return ou stop.
+# Os saltos para rótulos são as arestas entre blocos, sobre as quais
+# trabalham as otimizações do fluxo de controlo. O texto .vm é produzido
+# apenas por serialize(), que percorre os blocos pela ordem em que estão.
+
+JUMPS = frozenset({"jump", "jz"})                            # O argumento é um rótulo
+TERMINATORS = frozenset({"jump", "jz", "return", "stop"})    # Terminam um bloco básico
+NO_FALLTHROUGH = frozenset({"jump", "return", "stop"})       # Não seguem para o bloco seguinte
+
+class Instruction:
+    """Instrução EWVM: opcode e argumento (int, float, string ou nome de rótulo; None se não tiver).
+
+    As instruções não são alteradas depois de criadas e podem ser partilhadas
+    (ex.: as de leitura e escrita de cada Storage); line é o texto no .vm.
+    """
+    __slots__ = ('opcode', 'argument', 'line')
+
+    def __init__(self, opcode, argument=None):
+        self.opcode = opcode
+        self.argument = argument
+        if argument is None:
+            self.line = opcode
+        elif opcode == "pushs":
+            self.line = f'pushs "{argument}"'
+        else:
+            self.line = f"{opcode} {argument}"
+
+    def __eq__(self, other):
+        return (isinstance(other, Instruction) and other.opcode == self.opcode
+                and type(other.argument) is type(self.argument) and other.argument == self.argument)
+
+    def __hash__(self):
+        return hash((self.opcode, self.argument))
+
+    def __repr__(self):
+        return f"Instruction({self.line!r})"
+
+class Annotation:
+    """Comentário ou linha em branco da listagem anotada (não é executado)."""
+    __slots__ = ('line',)
+
+    def __init__(self, line):
+        self.line = line
+
+    def __repr__(self):
+        return f"Annotation({self.line!r})"
+
+def comment(text):
+    return Annotation(f"// {text}")
+
+BLANK = Annotation("")
+
+class BasicBlock:
+    """Instruções executadas em sequência, do rótulo (se houver) até ao primeiro salto.
+
+    items tem as instruções e as anotações pela ordem da listagem. As
+    anotações entre um salto (ou return/stop) e o rótulo seguinte pertencem ao
+    bloco do rótulo e ficam em leading, escritas antes dele: se o bloco for
+    removido, o comentário que o anuncia também é.
+    """
+    __slots__ = ('label', 'subprogram', 'leading', 'items', 'successors', 'predecessors')
+
+    def __init__(self, label=None, subprogram=False):
+        self.label = label
+        self.subprogram = subprogram  # Entrada de uma função ou procedimento
+        self.leading = []
+        self.items = []
+        self.successors = []    # Blocos seguintes (salto e/ou continuação)
+        self.predecessors = []
+
+    def instructions(self):
+        return [item for item in self.items if isinstance(item, Instruction)]
+
+    def last_instruction(self):
+        for item in reversed(self.items):
+            if isinstance(item, Instruction):
+                return item
+        return None
+
+    def remove_last_instruction(self):
+        """Retira a última instrução (as anotações depois dela ficam)."""
+        for position in range(len(self.items) - 1, -1, -1):
+            if type(self.items[position]) is Instruction:
+                del self.items[position]
+                return
+
+    def __repr__(self):
+        return f"BasicBlock({self.label!r}, {len(self.instructions())} instruções)"
+
+class BlockBuilder:
+    """Arruma os itens em blocos básicos à medida que são produzidos.
+
+    append(item) acrescenta uma instrução ou anotação ao bloco atual; depois
+    de uma instrução que termina o bloco (TERMINATORS) chama-se end_block(),
+    e os rótulos entram por place_label(). finish() devolve o grafo.
+    """
+
+    def __init__(self):
+        self.blocks = [BasicBlock()]
+        self.append = self.blocks[0].items.append
+
+    def end_block(self):
+        """O que vier a seguir a um jump, jz, return ou stop é outro bloco."""
+        block = BasicBlock()
+        self.blocks.append(block)
+        self.append = block.items.append
+
+    def place_label(self, name, subprogram=False):
+        """Começa o bloco com o rótulo name."""
+        block = self.blocks[-1]
+        if len(self.blocks) > 1 and block.label is None and block.last_instruction() is None:
+            # Bloco aberto por end_block só com anotações: ficam antes do rótulo
+            block.label = name
+            block.subprogram = subprogram
+            block.leading, block.items = block.items, []
+        else:
+            block = BasicBlock(name, subprogram)
+            self.blocks.append(block)
+        self.append = block.items.append
+
+    def finish(self):
+        """Grafo com os blocos produzidos (as anotações depois do último salto ficam no bloco dele)."""
+        blocks = self.blocks
+        last = blocks[-1]
+        if len(blocks) > 1 and last.label is None and last.last_instruction() is None:
+            blocks.pop()
+            blocks[-1].items.extend(last.items)
+        return ControlFlowGraph(blocks)
+
+class ControlFlowGraph:
+    """Blocos básicos pela ordem da listagem e as arestas entre eles.
+
+    O primeiro bloco é a entrada do programa; os subprogramas começam nos
+    blocos com o seu nome. As arestas (successors e predecessors) só são
+    calculadas por link(), que os passes que as usam chamam depois de
+    alterar os blocos.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.labels = {}
+
+    def link(self):
+        """Calcula successors e predecessors a partir da última instrução de cada bloco."""
+        self.labels = {block.label: block for block in self.blocks if block.label is not None}
+        for block in self.blocks:
+            block.successors = []
+            block.predecessors = []
+        for position, block in enumerate(self.blocks):
+            last = block.last_instruction()
+            opcode = last.opcode if last is not None else None
+            if opcode in JUMPS and last.argument in self.labels:
+                block.successors.append(self.labels[last.argument])
+            if opcode not in NO_FALLTHROUGH and position + 1 < len(self.blocks):
+                following = self.blocks[position + 1]
+                if following not in block.successors:
+                    block.successors.append(following)
+            for successor in block.successors:
+                successor.predecessors.append(block)
+
+    def remove_jumps_to_next(self):
+        """Retira cada jump L em que L é a instrução seguinte (só há blocos vazios pelo meio,
+        ex.: if sem else); devolve o número de saltos retirados."""
+        removed = 0
+        blocks = self.blocks
+        for position, block in enumerate(blocks):
+            last = block.last_instruction()
+            if last is None or last.opcode != "jump":
+                continue
+            for following in range(position + 1, len(blocks)):
+                if blocks[following].label == last.argument:
+                    block.remove_last_instruction()
+                    removed += 1
+                    break
+                if blocks[following].last_instruction() is not None:
+                    break
+        return removed
+
+    def instruction_count(self):
+        return sum(len(block.instructions()) for block in self.blocks)
+
+def serialize(cfg):
+    """Linhas do .vm: rótulo e itens de cada bloco, pela ordem dos blocos."""
+    lines = []
+    for block in cfg.blocks:
+        lines.extend([item.line for item in block.leading])
+        if block.label is not None:
+            lines.append(f"{block.label}:")
+        lines.extend([item.line for item in block.items])
+    return lines
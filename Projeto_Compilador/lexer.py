@@ -1,4 +1,7 @@
+import sys
+import types
 import ply.lex as lex
+import tables
 
 tokens = (
     # Palavras reservadas
@@ -161,6 +164,35 @@ def t_ID(t):
     r'[a-zA-Z][a-zA-Z0-9_]*'
     return t
 
+# ===== PALAVRAS RESERVADAS - Tabela para classificação numa só passagem =====
+
+# Palavra em minúsculas -> tipo do token (mesmas palavras das regras acima)
+reserved = {
+    'program': 'PROGRAM', 'procedure': 'PROCEDURE', 'function': 'FUNCTION',
+    'begin': 'BEGIN', 'end': 'END', 'const': 'CONST', 'type': 'TYPE',
+    'var': 'VAR', 'integer': 'INTEGER', 'real': 'REAL', 'boolean': 'BOOLEAN',
+    'string': 'STRING', 'array': 'ARRAY', 'of': 'OF', 'if': 'IF',
+    'then': 'THEN', 'else': 'ELSE', 'while': 'WHILE', 'downto': 'DOWNTO',
+    'do': 'DO', 'for': 'FOR', 'to': 'TO', 'div': 'DIV', 'mod': 'MOD',
+    'and': 'AND', 'or': 'OR', 'not': 'NOT', 'true': 'TRUE', 'false': 'FALSE',
+    'readln': 'READLN', 'writeln': 'WRITELN', 'read': 'READ', 'write': 'WRITE',
+    'length': 'LENGTH',
+}
+
+def _t_id_reserved(t):
+    r'[a-zA-Z][a-zA-Z0-9_]*'
+    token_type = reserved.get(t.value.lower())
+    if token_type is not None:
+        # As regras com ER exigem '\b' depois da palavra: uma letra não-ASCII
+        # logo a seguir (ex.: 'endé') mantém o prefixo como identificador
+        next_char = t.lexer.lexdata[t.lexer.lexpos:t.lexer.lexpos + 1]
+        if not (next_char.isalnum() or next_char == '_'):
+            t.type = token_type
+            return t
+    # Uma única cópia de cada nome, partilhada pela AST e pela tabela de símbolos
+    t.value = sys.intern(t.value)
+    return t
+
 # ===== OPERADORES E DELIMITADORES =====
 
 # Operadores de dois caracteres devem vir antes dos de um caractere
@@ -243,8 +275,98 @@ def t_error(t):
 
 # ===== CONSTRUÇÃO DO LEXER =====
 
+def lextab_name(reserved_table=True):
+    """Nome do módulo lextab correspondente à versão atual deste ficheiro."""
+    prefix = 'lextab' if reserved_table else 'lextab_regex'
+    return tables.table_name(prefix, __file__)
+
+def build_lexer(reserved_table=True, optimize=True):
+    """Constrói um lexer.
+
+    Com reserved_table=True as palavras reservadas são reconhecidas pela regra
+    de identificadores e classificadas através da tabela `reserved`, em vez de
+    uma ER por palavra. O fluxo de tokens produzido é idêntico nos dois modos.
+
+    Com optimize=True o lexer é carregado do lextab persistido (gerado na
+    primeira execução após qualquer alteração a este ficheiro).
+    """
+    rules = {name: value for name, value in globals().items() if name.startswith('t_')}
+    if reserved_table:
+        for token_type in reserved.values():
+            del rules[f't_{token_type}']
+        rules['t_ID'] = _t_id_reserved
+    module = types.SimpleNamespace(tokens=tokens, __file__=__file__, **rules)
+    
+    if not optimize:
+        return lex.lex(module=module)
+    
+    name = lextab_name(reserved_table)
+    lextab = tables.load_table(name)
+    if lextab is not None:
+        return lex.lex(module=module, optimize=True, lextab=lextab)
+    with tables.generating(name) as outputdir:
+        return lex.lex(module=module, optimize=True, lextab=name, outputdir=outputdir)
+
 # Construir o lexer
-lexer = lex.lex()
+lexer = build_lexer()
+
+# ===== BUFFER DE TOKENS =====
+
+class TokenBuffer:
+    """Tokens de um código fonte, lidos do lexer uma única vez e reproduzíveis.
+
+    Os tokens são lidos à medida que são pedidos e guardados, de forma que a
+    listagem de debug e o parser percorrem a mesma sequência sem voltar a
+    analisar o código. Implementa a interface de lexer usada pelo yacc
+    (input/token): input() com o mesmo código volta ao início do buffer.
+    """
+
+    def __init__(self, lexer, data):
+        self.lexer = lexer
+        self.data = data
+        self.tokens = []
+        self.position = 0       # Próximo token a devolver por token()
+        self.exhausted = False
+        lexer.input(data)
+        lexer.lineno = 1
+
+    def read_next(self):
+        """Lê mais um token do lexer; devolve False no fim do código."""
+        if self.exhausted:
+            return False
+        tok = self.lexer.token()
+        if tok is None:
+            self.exhausted = True
+            return False
+        self.tokens.append(tok)
+        return True
+
+    def fill(self):
+        """Lê todos os tokens que faltam."""
+        while self.read_next():
+            pass
+        return self
+
+    def __iter__(self):
+        index = 0
+        while index < len(self.tokens) or self.read_next():
+            yield self.tokens[index]
+            index += 1
+
+    def __len__(self):
+        return len(self.fill().tokens)
+
+    def input(self, data):
+        if data != self.data:
+            raise ValueError("TokenBuffer: o código não corresponde ao do buffer")
+        self.position = 0
+
+    def token(self):
+        if self.position == len(self.tokens) and not self.read_next():
+            return None
+        tok = self.tokens[self.position]
+        self.position += 1
+        return tok
 
 # Função para testar o lexer
 def test_lexer(data):
@@ -1,14 +1,37 @@
 # main.py - Arquivo principal do compilador Pascal (CORRIGIDO)
 import sys
 import os
+import io
 import glob
-from lexer import lexer, test_lexer
-from parser import parse_code, print_ast
-from semantic import SemanticAnalyzer
-from codegen import CodeGenerator
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from parser import print_ast
+from compiler import Compiler
+from buildcache import BuildCache
+from astcache import ASTCache
+from profiling import PhaseProfiler
+from peephole import PeepholeOptimizer, PeepholeError, RULES as PEEPHOLE_RULES
 
-def compile_file(input_file, output_file=None, debug=True):  # Debug ativado por padrão
-    """Compila um arquivo Pascal."""
+CACHE_DIR_NAME = ".pascache"
+
+def compile_file(input_file, output_file=None, debug=True, profile=False, profile_json=None,
+                 ast_cache=None, peephole=None, release=False, short_circuit=False,
+                 common_subexpressions=False, dead_code=True):  # Debug ativado por padrão
+    """Compila um arquivo Pascal.
+    
+    Com profile=True mostra, por fase, o tempo de relógio, o tempo de CPU e o
+    pico de memória (tracemalloc), além do número de tokens, nós da AST e
+    instruções; com profile_json o mesmo perfil é escrito nesse arquivo JSON.
+    Com ast_cache (astcache.ASTCache) a AST de fontes já analisadas vem da cache.
+    Com peephole (lista de nomes de regras de peephole.RULES) o código gerado
+    é otimizado e é mostrado quantas instruções cada regra removeu.
+    Com release=True o .vm sai sem comentários nem linhas em branco; com
+    short_circuit=True os and/or das condições de if/while são avaliados por saltos;
+    com common_subexpressions=True as subexpressões repetidas num bloco básico
+    são calculadas uma vez; com dead_code=False o código inalcançável e os
+    subprogramas nunca chamados ficam no .vm.
+    """
     try:
         # Lê o arquivo de entrada
         with open(input_file, 'r', encoding='utf-8') as f:
@@ -23,18 +46,25 @@ def compile_file(input_file, output_file=None, debug=True):  # Debug ativado por
         print(f"Compilando: {input_file}")
         print(f"{'='*60}")
         
-        # Análise léxica
+        profiler = PhaseProfiler() if profile or profile_json else None
+        optimizer = PeepholeOptimizer(peephole) if peephole is not None else None
+        compiler = Compiler(profiler, ast_cache, optimizer, release, short_circuit, dead_code,
+                            common_subexpressions)
+        
+        # Análise léxica (os tokens são lidos uma vez e reutilizados pelo parser)
+        tokens = None
+        if debug or profiler:
+            tokens = compiler.tokenize(source_code)
         if debug:
             print("\n=== ANÁLISE LÉXICA ===")
-            tokens = test_lexer(source_code)
-            for token_type, token_value, line_no in tokens:
-                print(f"Linha {line_no}: {token_type} - '{token_value}'")
+            for tok in tokens:
+                print(f"Linha {tok.lineno}: {tok.type} - '{tok.value}'")
         
         # Análise sintática
         if debug:
             print("\n=== ANÁLISE SINTÁTICA ===")
         
-        ast = parse_code(source_code)
+        ast = compiler.parse(source_code, tokens)
         if ast is None:
             print("Erro: Falha na análise sintática")
             return False
@@ -47,28 +77,27 @@ def compile_file(input_file, output_file=None, debug=True):  # Debug ativado por
         if debug:
             print("\n=== ANÁLISE SEMÂNTICA ===")
         
-        analyzer = SemanticAnalyzer()
-        if not analyzer.analyze(ast):
-            analyzer.print_errors()
-            analyzer.print_warnings()
+        if not compiler.analyze(ast):
+            compiler.analyzer.print_errors()
+            compiler.analyzer.print_warnings()
             print("Erro: Falha na análise semântica")
             return False
         
         if debug:
-            analyzer.symbol_table.print_table()
-            analyzer.print_warnings()
+            compiler.analyzer.symbol_table.print_table()
+            compiler.analyzer.print_warnings()
         
         # Geração de código
         if debug:
             print("\n=== GERAÇÃO DE CÓDIGO ===")
         
-        generator = CodeGenerator(analyzer.symbol_table)
-        code = generator.generate(ast)
+        code = compiler.generate(ast)
         
         # Escreve o código gerado no arquivo de saída
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for line in code:
-                f.write(f"{line}\n")
+        with compiler.profiler.phase("escrita do .vm"):
+            with open(output_file, 'w', encoding='utf-8') as f:
+                for line in code:
+                    f.write(f"{line}\n")
         
         print(f"   Compilação concluída com sucesso!")
         print(f"   Código gerado em: {output_file}")
@@ -77,6 +106,15 @@ def compile_file(input_file, output_file=None, debug=True):  # Debug ativado por
         print(f"   Linhas de código gerado: {len(code)}")
         print(f"   Tamanho do arquivo: {os.path.getsize(output_file)} bytes")
         
+        if optimizer:
+            optimizer.print_report()
+        
+        if profile:
+            profiler.print_report()
+        if profile_json:
+            profiler.write_json(profile_json, input_file)
+            print(f"   Perfil escrito em: {profile_json}")
+        
         return True
     
     except FileNotFoundError:
@@ -106,8 +144,56 @@ def find_pascal_files(directory="."):
     files.sort(key=extract_number)
     return files
 
-def compile_all_examples(directory=".", debug=True):  # Debug ativado por padrão
-    """Compila todos os arquivos example*.pas encontrados no diretório."""
+def default_output_file(input_file):
+    """Arquivo .vm gerado por omissão para input_file."""
+    base_name = os.path.splitext(input_file)[0]
+    return f"{base_name}.vm"
+
+def compile_job(input_file, debug, capture=False, profile=False, profile_json=False, ast_cache=None,
+                peephole=None, release=False, short_circuit=False, common_subexpressions=False,
+                dead_code=True):
+    """Compila um arquivo medindo o tempo de relógio e de CPU.
+    
+    Com capture=True o texto impresso é devolvido em vez de escrito, para que
+    os resultados dos processos paralelos sejam mostrados por ordem.
+    Com profile_json=True o perfil é escrito em <arquivo>.profile.json.
+    Devolve (sucesso, texto impresso, tempo de relógio, tempo de CPU).
+    """
+    output_file = default_output_file(input_file)
+    json_file = f"{os.path.splitext(input_file)[0]}.profile.json" if profile_json else None
+    
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    if capture:
+        buffer = io.StringIO()
+        with contextlib.redirect_stdout(buffer):
+            success = compile_file(input_file, output_file, debug, profile, json_file, ast_cache, peephole,
+                                   release, short_circuit, common_subexpressions, dead_code)
+        output = buffer.getvalue()
+    else:
+        success = compile_file(input_file, output_file, debug, profile, json_file, ast_cache, peephole, release,
+                               short_circuit, common_subexpressions, dead_code)
+        output = ""
+    return success, output, time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+def init_compile_worker():
+    """Inicializa um processo de compilação com as tabelas do parser já carregadas."""
+    Compiler()
+
+def compile_all_examples(directory=".", debug=True, jobs=1, use_cache=False,
+                         profile=False, profile_json=False, peephole=None, release=False,
+                         short_circuit=False, common_subexpressions=False,
+                         dead_code=True):  # Debug ativado por padrão
+    """Compila todos os arquivos example*.pas encontrados no diretório.
+    
+    Com jobs > 1 os arquivos são distribuídos por um conjunto de processos;
+    o texto de cada compilação e o resumo continuam a sair pela ordem dos arquivos.
+    Com use_cache=True os arquivos sem alterações são servidos da cache em
+    <diretório>/.pascache em vez de recompilados, e os restantes reutilizam a
+    AST guardada se só o compilador tiver mudado. profile, profile_json,
+    peephole, release, short_circuit, common_subexpressions e dead_code têm
+    o mesmo significado que em compile_job.
+    """
     pascal_files = find_pascal_files(directory)
     
     if not pascal_files:
@@ -121,23 +207,64 @@ def compile_all_examples(directory=".", debug=True):  # Debug ativado por padrã
     
     successful_compilations = 0
     failed_compilations = 0
+    timings = []  # (arquivo, tempo de relógio, tempo de CPU)
     
-    for input_file in pascal_files:
-        try:
-            base_name = os.path.splitext(input_file)[0]
-            output_file = f"{base_name}.vm"
-            
-            if compile_file(input_file, output_file, debug):
-                successful_compilations += 1
-            else:
-                failed_compilations += 1
+    wall_start = time.perf_counter()
+    
+    # A cache é consultada aqui, antes de distribuir trabalho pelos processos
+    options = build_options(peephole, release, short_circuit, common_subexpressions, dead_code)
+    cache = BuildCache(os.path.join(directory, CACHE_DIR_NAME), options) if use_cache else None
+    ast_cache = ASTCache(os.path.join(directory, CACHE_DIR_NAME)) if use_cache else None
+    cached_files = set()
+    if cache:
+        for input_file in pascal_files:
+            if cache.lookup(input_file, default_output_file(input_file)):
+                cached_files.add(input_file)
+    
+    pool = None
+    if jobs > 1:
+        print(f"Compilando com {jobs} processos")
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=init_compile_worker)
+        futures = {input_file: pool.submit(compile_job, input_file, debug, True, profile, profile_json, ast_cache,
+                                           peephole, release, short_circuit, common_subexpressions, dead_code)
+                   for input_file in pascal_files if input_file not in cached_files}
+    
+    try:
+        for input_file in pascal_files:
+            try:
+                if input_file in cached_files:
+                    print(f"\nEm cache (sem alterações): {input_file}")
+                    successful_compilations += 1
+                    continue
+                
+                if pool:
+                    success, output, wall_time, cpu_time = futures[input_file].result()
+                    print(output, end="")
+                else:
+                    success, output, wall_time, cpu_time = compile_job(input_file, debug, False, profile, profile_json,
+                                                                       ast_cache, peephole, release,
+                                                                       short_circuit, common_subexpressions,
+                                                                       dead_code)
                 
-        except KeyboardInterrupt:
-            print("\n  Compilação interrompida pelo usuário")
-            break
-        except Exception as e:
-            print(f"Erro inesperado ao compilar {input_file}: {e}")
-            failed_compilations += 1
+                timings.append((input_file, wall_time, cpu_time))
+                if success:
+                    successful_compilations += 1
+                    if cache:
+                        cache.store(input_file, default_output_file(input_file), wall_time)
+                else:
+                    failed_compilations += 1
+                    
+            except KeyboardInterrupt:
+                print("\n  Compilação interrompida pelo usuário")
+                break
+            except Exception as e:
+                print(f"Erro inesperado ao compilar {input_file}: {e}")
+                failed_compilations += 1
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    
+    wall_total = time.perf_counter() - wall_start
     
     # Resumo final
     print(f"\n{'='*60}")
@@ -156,6 +283,21 @@ def compile_all_examples(directory=".", debug=True):  # Debug ativado por padrã
                 size = os.path.getsize(output_file)
                 print(f"   - {output_file} ({size} bytes)")
     
+    if timings:
+        print(f"\nTempos por arquivo:")
+        for input_file, wall_time, cpu_time in timings:
+            print(f"   - {input_file}: {wall_time * 1000:.1f} ms (CPU {cpu_time * 1000:.1f} ms)")
+        
+        cpu_total = sum(cpu_time for _, _, cpu_time in timings)
+        print(f"\nTempo total (relógio): {wall_total:.3f} s")
+        print(f"Tempo total (CPU, soma dos arquivos): {cpu_total:.3f} s")
+        print(f"Processos: {max(jobs, 1)}")
+    
+    if cache:
+        print()
+        cache.print_stats()
+        cache.save()
+    
     return failed_compilations == 0
 
 def create_example_files():
@@ -163,6 +305,61 @@ def create_example_files():
     # Como os arquivos já existem, esta função pode ser simplificada
     return []
 
+def parse_jobs(argv):
+    """Lê o número de processos da opção -j N (ou -jN); por omissão 1."""
+    for i, arg in enumerate(argv):
+        if arg == "-j" and i + 1 < len(argv):
+            value = argv[i + 1]
+        elif arg.startswith("-j") and len(arg) > 2:
+            value = arg[2:]
+        else:
+            continue
+        if not value.isdigit() or int(value) < 1:
+            print(f"Número de processos inválido: '{value}' (a usar 1)")
+            return 1
+        return int(value)
+    return 1
+
+def parse_peephole(argv):
+    """Regras de --peephole (todas) ou --peephole=regra1,regra2; None sem a opção.
+    
+    Lança PeepholeError se alguma regra não existir.
+    """
+    for arg in argv:
+        if arg == "--peephole":
+            return list(PEEPHOLE_RULES)
+        if arg.startswith("--peephole="):
+            rules = [name for name in arg.split("=", 1)[1].split(",") if name]
+            PeepholeOptimizer(rules)  # Valida os nomes
+            return rules
+    return None
+
+def parse_release(argv):
+    """True com --release (.vm sem anotações); --debug (o padrão) mantém a listagem anotada.
+
+    Lança ValueError se as duas opções forem dadas.
+    """
+    release = "--release" in argv
+    if release and "--debug" in argv:
+        raise ValueError("--release e --debug não podem ser usados em conjunto")
+    return release
+
+def build_options(peephole, release=False, short_circuit=False, common_subexpressions=False,
+                  dead_code=True):
+    """Opções que mudam o código gerado (entram na chave da cache de build)."""
+    options = ()
+    if peephole is not None:
+        options += (f"peephole={','.join(peephole)}",)
+    if release:
+        options += ("release",)
+    if short_circuit:
+        options += ("short-circuit",)
+    if common_subexpressions:
+        options += ("cse",)
+    if not dead_code:
+        options += ("no-dead-code",)
+    return options
+
 def main():
     """Função principal."""
     print("COMPILADOR PASCAL STANDARD")
@@ -185,8 +382,18 @@ def main():
             print("  python main.py                    # Compila todos os example*.pas")
             print("  python main.py arquivo.pas        # Compila um arquivo específico")
             print("  python main.py arquivo.pas -d     # Compila com modo debug")
-            print("  python main.py --all [-d]         # Compila todos os example*.pas")
+            print("  python main.py --all [-d] [-j N]  # Compila todos os example*.pas (N processos)")
+            print("  ... --cache                       # Reutiliza os .vm (e as ASTs) de fontes sem alterações")
+            print("  ... --profile [--profile-json]    # Perfil por fase (tempo, CPU, memória) [+ JSON]")
+            print("  ... --peephole[=regra,...]        # Otimização peephole (por omissão, todas as regras):")
+            for name, (*_, description) in PEEPHOLE_RULES.items():
+                print(f"        {name:<18}{description}")
+            print("  ... --release | --debug           # .vm sem comentários | listagem anotada (padrão)")
+            print("  ... --short-circuit               # and/or de if/while avaliados por saltos (da esquerda)")
+            print("  ... --cse                         # Subexpressões repetidas num bloco calculadas uma vez")
+            print("  ... --no-dead-code                # Mantém o código inalcançável e os subprogramas não chamados")
             print("  python main.py --create           # Cria arquivos de exemplo")
+            print("  python main.py --build-tables     # Regenera as tabelas lextab/parsetab")
             print("  python main.py --help             # Mostra esta ajuda")
             return
         
@@ -197,10 +404,29 @@ def main():
                 print("Todos os arquivos de exemplo já existem")
             return
         
-        elif sys.argv[1] == "--all":
+        elif sys.argv[1] == "--build-tables":
+            from tables import build_tables
+            print("Gerando tabelas do lexer e do parser...")
+            for table_file in build_tables():
+                print(f"   - {table_file}")
+            return
+        
+        try:
+            peephole = parse_peephole(sys.argv)
+            release = parse_release(sys.argv)
+        except ValueError as e:  # Inclui PeepholeError
+            print(f"Erro: {e}")
+            return
+        short_circuit = "--short-circuit" in sys.argv
+        common_subexpressions = "--cse" in sys.argv
+        dead_code = "--no-dead-code" not in sys.argv
+        
+        if sys.argv[1] == "--all":
             print("Modo: Compilação de todos os example*.pas")
             debug = "-d" in sys.argv
-            compile_all_examples(".", debug)
+            compile_all_examples(".", debug, parse_jobs(sys.argv), "--cache" in sys.argv,
+                                 "--profile" in sys.argv, "--profile-json" in sys.argv, peephole, release,
+                                 short_circuit, common_subexpressions, dead_code)
             return
         
         else:
@@ -210,7 +436,30 @@ def main():
             debug = True  # Debug sempre ativado
             
             print(f"Modo: Compilação de arquivo específico")
-            compile_file(input_file, output_file, debug)
+            profile = "--profile" in sys.argv
+            profile_json = None
+            if "--profile-json" in sys.argv:
+                profile_json = f"{os.path.splitext(input_file)[0]}.profile.json"
+            
+            if "--cache" not in sys.argv:
+                compile_file(input_file, output_file, debug, profile, profile_json, peephole=peephole, release=release,
+                             short_circuit=short_circuit, common_subexpressions=common_subexpressions,
+                             dead_code=dead_code)
+                return
+            
+            output_file = output_file or default_output_file(input_file)
+            cache_dir = os.path.join(os.path.dirname(input_file) or ".", CACHE_DIR_NAME)
+            cache = BuildCache(cache_dir, build_options(peephole, release, short_circuit, common_subexpressions,
+                                                        dead_code))
+            if cache.lookup(input_file, output_file):
+                print(f"Em cache (sem alterações): {input_file} -> {output_file}")
+            else:
+                start = time.perf_counter()
+                if compile_file(input_file, output_file, debug, profile, profile_json, ASTCache(cache_dir), peephole,
+                                release, short_circuit, common_subexpressions, dead_code):
+                    cache.store(input_file, output_file, time.perf_counter() - start)
+            cache.print_stats()
+            cache.save()
 
 if __name__ == "__main__":
     try:
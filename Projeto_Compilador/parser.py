@@ -1,14 +1,31 @@
 # parser.py - Analisador sintático para Pascal Standard (CORRIGIDO CONFORME PROFESSOR)
+import sys
 import ply.yacc as yacc
+import lexer as lexer_module
+import tables
 from lexer import tokens  # Importa os tokens do lexer
 
 # Estrutura para representar a AST (Abstract Syntax Tree)
+# Filhos partilhados por todas as folhas da AST
+EMPTY_CHILDREN = ()
+
 class ASTNode:
-    def __init__(self, type, children=None, value=None):
+    # Sem __dict__: cada nó guarda apenas estes campos. Os tipos são
+    # as strings literais das regras (internadas, uma única cópia por tipo)
+    __slots__ = ('type', 'children', 'value', 'line', 'binding', 'inferred_type', 'constant_value',
+                 'temporary')
+
+    def __init__(self, type, children=EMPTY_CHILDREN, value=None):
         self.type = type
-        self.children = children if children else []
+        # Filhos em número fixo vêm num tuplo; só as listas que as regras ainda
+        # vão estender (ex.: declarations) são listas. As folhas partilham EMPTY_CHILDREN
+        self.children = children if children is not None else EMPTY_CHILDREN
         self.value = value
         self.line = 0  # Linha do código fonte
+        self.binding = None  # Armazenamento do nome (symboltable.Storage), ligado pela análise semântica
+        self.inferred_type = None  # Tipo de uma expressão, inferido pela análise semântica
+        self.constant_value = None  # Valor de uma expressão constante, calculado pela análise semântica
+        self.temporary = None  # Posição escondida para um valor intermédio (ex.: limite de um for)
         
     def __repr__(self):
         return f"ASTNode({self.type}, {self.value}, {len(self.children)} children)"
@@ -30,7 +47,7 @@ precedence = (
 # Programa principal
 def p_program(p):
     '''program : PROGRAM ID SEMICOLON declarations compound_statement DOT'''
-    p[0] = ASTNode('program', [p[4], p[5]], p[2])
+    p[0] = ASTNode('program', (p[4], p[5]), p[2])
     p[0].line = p.lineno(1)
 
 # Declarações
@@ -64,14 +81,14 @@ def p_var_list(p):
 
 def p_var_item(p):
     '''var_item : id_list COLON type SEMICOLON'''
-    p[0] = ASTNode('var_item', [p[1], p[3]])
+    p[0] = ASTNode('var_item', (p[1], p[3]))
     p[0].line = p.lineno(2)
 
 def p_id_list(p):
     '''id_list : id_list COMMA ID
                | ID'''
     if len(p) == 2:
-        p[0] = ASTNode('id_list', [], [p[1]])
+        p[0] = ASTNode('id_list', value=[p[1]])
         p[0].line = p.lineno(1)
     else:
         p[1].value.append(p[3])
@@ -88,12 +105,12 @@ def p_simple_type(p):
                    | REAL
                    | BOOLEAN
                    | STRING'''
-    p[0] = ASTNode('type', [], p[1])
+    p[0] = ASTNode('type', value=p[1])
     p[0].line = p.lineno(1)
 
 def p_array_type(p):
     '''array_type : ARRAY LBRACKET INTEGER_CONST DOTDOT INTEGER_CONST RBRACKET OF simple_type'''
-    p[0] = ASTNode('array_type', [p[8]], [p[3], p[5]])
+    p[0] = ASTNode('array_type', (p[8],), [p[3], p[5]])
     p[0].line = p.lineno(1)
 
 # Declaração de constantes
@@ -113,7 +130,7 @@ def p_const_list(p):
 
 def p_const_item(p):
     '''const_item : ID EQ expr_bool SEMICOLON'''
-    p[0] = ASTNode('const_item', [p[3]], p[1])
+    p[0] = ASTNode('const_item', (p[3],), p[1])
     p[0].line = p.lineno(2)
 
 # Declaração de tipos
@@ -133,29 +150,29 @@ def p_type_list(p):
 
 def p_type_item(p):
     '''type_item : ID EQ type SEMICOLON'''
-    p[0] = ASTNode('type_item', [p[3]], p[1])
+    p[0] = ASTNode('type_item', (p[3],), p[1])
     p[0].line = p.lineno(2)
 
 # Declaração de funções
 def p_function_declaration(p):
     '''function_declaration : FUNCTION ID LPAREN parameter_list RPAREN COLON simple_type SEMICOLON declarations compound_statement SEMICOLON'''
-    p[0] = ASTNode('function_declaration', [p[4], p[7], p[9], p[10]], p[2])
+    p[0] = ASTNode('function_declaration', (p[4], p[7], p[9], p[10]), p[2])
     p[0].line = p.lineno(1)
 
 def p_function_declaration_no_params(p):
     '''function_declaration : FUNCTION ID COLON simple_type SEMICOLON declarations compound_statement SEMICOLON'''
-    p[0] = ASTNode('function_declaration', [ASTNode('parameter_list', []), p[4], p[6], p[7]], p[2])
+    p[0] = ASTNode('function_declaration', (ASTNode('parameter_list'), p[4], p[6], p[7]), p[2])
     p[0].line = p.lineno(1)
 
 # Declaração de procedimentos
 def p_procedure_declaration(p):
     '''procedure_declaration : PROCEDURE ID LPAREN parameter_list RPAREN SEMICOLON declarations compound_statement SEMICOLON'''
-    p[0] = ASTNode('procedure_declaration', [p[4], p[7], p[8]], p[2])
+    p[0] = ASTNode('procedure_declaration', (p[4], p[7], p[8]), p[2])
     p[0].line = p.lineno(1)
 
 def p_procedure_declaration_no_params(p):
     '''procedure_declaration : PROCEDURE ID SEMICOLON declarations compound_statement SEMICOLON'''
-    p[0] = ASTNode('procedure_declaration', [ASTNode('parameter_list', []), p[4], p[5]], p[2])
+    p[0] = ASTNode('procedure_declaration', (ASTNode('parameter_list'), p[4], p[5]), p[2])
     p[0].line = p.lineno(1)
 
 # Lista de parâmetros
@@ -170,7 +187,7 @@ def p_parameter_list(p):
 
 def p_parameter(p):
     '''parameter : id_list COLON simple_type'''
-    p[0] = ASTNode('parameter', [p[1], p[3]])
+    p[0] = ASTNode('parameter', (p[1], p[3]))
     p[0].line = p.lineno(2)
 
 # Comando composto
@@ -205,7 +222,7 @@ def p_statement(p):
 # Comando de atribuição
 def p_assignment_statement(p):
     '''assignment_statement : var ASSIGN expr_bool'''
-    p[0] = ASTNode('assignment', [p[1], p[3]])
+    p[0] = ASTNode('assignment', (p[1], p[3]))
     p[0].line = p.lineno(2)
 
 # Comando if
@@ -213,15 +230,15 @@ def p_if_statement(p):
     '''if_statement : IF expr_bool THEN statement ELSE statement
                     | IF expr_bool THEN statement'''
     if len(p) == 5:  # sem else
-        p[0] = ASTNode('if_statement', [p[2], p[4]])
+        p[0] = ASTNode('if_statement', (p[2], p[4]))
     else:  # com else
-        p[0] = ASTNode('if_statement', [p[2], p[4], p[6]])
+        p[0] = ASTNode('if_statement', (p[2], p[4], p[6]))
     p[0].line = p.lineno(1)
 
 # Comando while
 def p_while_statement(p):
     '''while_statement : WHILE expr_bool DO statement'''
-    p[0] = ASTNode('while_statement', [p[2], p[4]])
+    p[0] = ASTNode('while_statement', (p[2], p[4]))
     p[0].line = p.lineno(1)
 
 # Comando for
@@ -241,7 +258,7 @@ def p_for_statement(p):
         # Se é uma string direta
         direction = 'to' if str(token).upper() == 'TO' else 'downto'
     
-    p[0] = ASTNode('for_statement', [p[4], p[6], p[8]], [p[2], direction])
+    p[0] = ASTNode('for_statement', (p[4], p[6], p[8]), [p[2], direction])
     p[0].line = p.lineno(1)
 
 # Comando read/readln
@@ -250,9 +267,9 @@ def p_read_statement(p):
                       | READLN LPAREN variable_list RPAREN
                       | READLN'''
     if len(p) == 2:  # readln sem argumentos
-        p[0] = ASTNode('read_statement', [], p[1])
+        p[0] = ASTNode('read_statement', value=p[1])
     else:
-        p[0] = ASTNode('read_statement', [p[3]], p[1])
+        p[0] = ASTNode('read_statement', (p[3],), p[1])
     p[0].line = p.lineno(1)
 
 # Comando write/writeln
@@ -263,11 +280,11 @@ def p_write_statement(p):
                        | WRITE LPAREN RPAREN
                        | WRITELN LPAREN RPAREN'''
     if len(p) == 2:  # writeln sem argumentos
-        p[0] = ASTNode('write_statement', [], p[1])
+        p[0] = ASTNode('write_statement', value=p[1])
     elif len(p) == 4:  # write() ou writeln() vazios
-        p[0] = ASTNode('write_statement', [], p[1])
+        p[0] = ASTNode('write_statement', value=p[1])
     else:
-        p[0] = ASTNode('write_statement', [p[3]], p[1])
+        p[0] = ASTNode('write_statement', (p[3],), p[1])
     p[0].line = p.lineno(1)
 
 # Lista de variáveis
@@ -295,9 +312,9 @@ def p_procedure_call(p):
     '''procedure_call : ID LPAREN argument_list RPAREN
                       | ID'''
     if len(p) == 2:
-        p[0] = ASTNode('procedure_call', [], p[1])
+        p[0] = ASTNode('procedure_call', value=p[1])
     else:
-        p[0] = ASTNode('procedure_call', [p[3]], p[1])
+        p[0] = ASTNode('procedure_call', (p[3],), p[1])
     p[0].line = p.lineno(1)
 
 # Lista de argumentos
@@ -324,7 +341,7 @@ def p_expr_bool(p):
     if len(p) == 2:
         p[0] = p[1]
     else:
-        p[0] = ASTNode('binary_op', [p[1], p[3]], p[2])
+        p[0] = ASTNode('binary_op', (p[1], p[3]), p[2])
         p[0].line = p.lineno(2)
 
 # OpRel : EQ | NE | LT | LE | GT | GE
@@ -345,7 +362,7 @@ def p_expr(p):
     if len(p) == 2:
         p[0] = p[1]
     else:
-        p[0] = ASTNode('binary_op', [p[1], p[3]], p[2])
+        p[0] = ASTNode('binary_op', (p[1], p[3]), p[2])
         p[0].line = p.lineno(2)
 
 # OpAd : MAIS | MENOS | OU
@@ -363,7 +380,7 @@ def p_termo(p):
     if len(p) == 2:
         p[0] = p[1]
     else:
-        p[0] = ASTNode('binary_op', [p[1], p[3]], p[2])
+        p[0] = ASTNode('binary_op', (p[1], p[3]), p[2])
         p[0].line = p.lineno(2)
 
 # OpMul : VEZES | DIV | AND
@@ -392,14 +409,14 @@ def p_fator(p):
 
 def p_fator_length(p):
     '''fator : LENGTH LPAREN expr_bool RPAREN'''
-    p[0] = ASTNode('length_call', [p[3]], 'length')
+    p[0] = ASTNode('length_call', (p[3],), 'length')
     p[0].line = p.lineno(1)
     
 # Unary operators
 def p_unary_op_precedence(p):
     '''unary_op : MINUS fator %prec UMINUS
                 | NOT fator %prec NOT'''
-    p[0] = ASTNode('unary_op', [p[2]], p[1])
+    p[0] = ASTNode('unary_op', (p[2],), p[1])
     p[0].line = p.lineno(1)
 
 # Const : INT | REAL | STRING
@@ -410,13 +427,13 @@ def p_const(p):
              | TRUE
              | FALSE'''
     if p[1] in ['true', 'false', 'TRUE', 'FALSE']:
-        p[0] = ASTNode('boolean', [], p[1])
+        p[0] = ASTNode('boolean', value=p[1])
     elif isinstance(p[1], int):
-        p[0] = ASTNode('number', [], p[1])
+        p[0] = ASTNode('number', value=p[1])
     elif isinstance(p[1], float):
-        p[0] = ASTNode('number', [], p[1])
+        p[0] = ASTNode('number', value=p[1])
     else:
-        p[0] = ASTNode('string', [], p[1])
+        p[0] = ASTNode('string', value=p[1])
     p[0].line = p.lineno(1)
 
 # Var : ID | ID "[" Expr "]"
@@ -424,15 +441,15 @@ def p_var(p):
     '''var : ID
            | ID LBRACKET expr RBRACKET'''
     if len(p) == 2:
-        p[0] = ASTNode('variable', [], p[1])
+        p[0] = ASTNode('variable', value=p[1])
     else:
-        p[0] = ASTNode('array_access', [p[3]], p[1])
+        p[0] = ASTNode('array_access', (p[3],), p[1])
     p[0].line = p.lineno(1)
 
 # FuncCall : ID "(" Args ")"
 def p_func_call(p):
     '''func_call : ID LPAREN argument_list RPAREN'''
-    p[0] = ASTNode('function_call', [p[3]], p[1])
+    p[0] = ASTNode('function_call', (p[3],), p[1])
     p[0].line = p.lineno(1)
 
 # Regra vazia
@@ -447,12 +464,38 @@ def p_error(p):
     else:
         print("Erro sintático: Fim de arquivo inesperado")
 
+def parsetab_name():
+    """Nome do módulo parsetab correspondente à versão atual da gramática."""
+    return tables.table_name('parsetab', __file__, lexer_module.__file__)
+
+def build_parser(optimize=True):
+    """Constrói o parser LALR.
+
+    Com optimize=True as tabelas são carregadas do parsetab persistido, sem
+    validar a gramática nem comparar assinaturas; o nome do módulo muda
+    sempre que a gramática muda, o que força a regeneração.
+    """
+    module = sys.modules[__name__]
+    if not optimize:
+        return yacc.yacc(module=module, debug=False, write_tables=False)
+    
+    name = parsetab_name()
+    parsetab = tables.load_table(name)
+    if parsetab is not None:
+        return yacc.yacc(module=module, optimize=True, debug=False, tabmodule=parsetab)
+    with tables.generating(name) as outputdir:
+        return yacc.yacc(module=module, optimize=True, debug=False,
+                         tabmodule=name, outputdir=outputdir)
+
 # Construir o parser
-parser = yacc.yacc()
+parser = build_parser()
 
 # Função para testar o parser
-def parse_code(code):
-    from lexer import lexer
+def parse_code(code, lexer=None, parser=parser):
+    """Analisa code. Por omissão usa o lexer e o parser partilhados do módulo;
+    quem compila em paralelo deve passar os seus (ver compiler.Compiler)."""
+    if lexer is None:
+        lexer = lexer_module.lexer
     try:
         result = parser.parse(code, lexer=lexer)
         return result
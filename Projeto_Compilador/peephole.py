@@ -0,0 +1,173 @@
+# peephole.py - Otimização peephole das instruções EWVM geradas
+#
+# Corre sobre os blocos básicos (ver ir), antes da serialização. Cada regra
+# olha para uma janela de instruções consecutivas do mesmo bloco (as anotações
+# pelo meio são ignoradas e ficam onde estão) e devolve as instruções que a
+# substituem, ou None se não se aplicar.
+from ir import Instruction
+
+class PeepholeError(ValueError):
+    """Regra de otimização desconhecida."""
+
+# Instruções cujo resultado é sempre um inteiro
+INTEGER_RESULTS = frozenset({"pushi", "div", "mod", "charat", "strlen", "atoi"})
+
+def negate_constant(window):
+    """pushi N; pushi -1; mul -> pushi -N (e o mesmo com pushf)."""
+    value, factor, operation = window
+    if factor.opcode != "pushi" or factor.argument != -1 or operation.opcode != "mul":
+        return None
+    if value.opcode in ("pushi", "pushf") and type(value.argument) in (int, float):
+        return [Instruction(value.opcode, -value.argument)]
+    return None
+
+def truth_test(window):
+    """pushi 0; equal; not; jz L -> jz L (jz já salta quando o valor é 0)."""
+    zero, equal, negation, branch = window
+    if (zero.opcode == "pushi" and zero.argument == 0 and equal.opcode == "equal"
+            and negation.opcode == "not" and branch.opcode == "jz"):
+        return [branch]
+    return None
+
+# Operações com elemento neutro à direita: x op n == x
+IDENTITIES = {("add", 0), ("sub", 0), ("padd", 0), ("mul", 1)}
+
+def identity(window):
+    """pushi 0; add/sub/padd, pushi 1; mul e, se x for inteiro, x; pushi 1; div -> x."""
+    value, constant, operation = window
+    if constant.opcode != "pushi" or type(constant.argument) is not int:
+        return None
+    if (operation.opcode, constant.argument) in IDENTITIES:
+        return [value]
+    # div é a divisão inteira: com um real à esquerda, x div 1 não é x
+    if operation.opcode == "div" and constant.argument == 1 and value.opcode in INTEGER_RESULTS:
+        return [value]
+    return None
+
+# Pares (leitura, escrita) da mesma zona de memória
+SLOT_OPCODES = {"pushg": "storeg", "pushl": "storel"}
+
+def load_store(window):
+    """pushg n; storeg n -> nada (escreve no slot o valor que lá estava)."""
+    load, store = window
+    if SLOT_OPCODES.get(load.opcode) == store.opcode and store.argument == load.argument:
+        return []
+    return None
+
+# Nome -> (tamanho da janela, opcodes da última instrução da janela, função,
+# descrição); a ordem é a de aplicação. jump-to-next não usa janela: olha para
+# o fim de cada bloco e os rótulos seguintes.
+RULES = {
+    "negate-constant": (3, ("mul",), negate_constant, "pushi N; pushi -1; mul -> pushi -N"),
+    "truth-test": (4, ("jz",), truth_test, "pushi 0; equal; not; jz L -> jz L"),
+    "identity": (3, ("add", "sub", "padd", "mul", "div"), identity,
+                 "x; pushi 0; add/sub/padd, x; pushi 1; mul (e div, x inteiro) -> x"),
+    "load-store": (2, tuple(SLOT_OPCODES.values()), load_store, "pushg n; storeg n -> (nada)"),
+    "jump-to-next": (0, (), None, "jump L; L: -> L:"),
+}
+
+class PeepholeOptimizer:
+    """Aplica as regras escolhidas (por omissão todas) e conta o efeito de cada uma.
+
+    As contagens acumulam-se entre chamadas a optimize, pelo que o mesmo
+    otimizador pode reportar o total de vários programas.
+    """
+
+    def __init__(self, rules=None):
+        names = list(RULES) if rules is None else list(rules)
+        unknown = [name for name in names if name not in RULES]
+        if unknown:
+            raise PeepholeError(f"Regra(s) de otimização desconhecida(s): {', '.join(unknown)} "
+                                f"(disponíveis: {', '.join(RULES)})")
+        self.rule_names = names
+        # Opcode -> regras cuja janela pode acabar numa instrução com esse opcode
+        self.rules_by_opcode = {}
+        for name in names:
+            size, opcodes, rule, _ = RULES[name]
+            for opcode in opcodes:
+                self.rules_by_opcode.setdefault(opcode, []).append((name, size, rule))
+        self.jump_to_next = "jump-to-next" in names
+        self.applied = {name: 0 for name in names}   # Vezes que cada regra foi aplicada
+        self.removed = {name: 0 for name in names}   # Instruções removidas por cada regra
+        self.instructions_before = 0
+        self.instructions_after = 0
+
+    def optimize(self, cfg):
+        """Aplica as regras aos blocos de cfg, no lugar.
+
+        Basta uma passagem: as janelas que acabam em cada instrução são tentadas
+        quando ela entra e outra vez depois de cada substituição no fim do bloco.
+        """
+        before = cfg.instruction_count()
+        removed = self.total_removed()
+        for block in cfg.blocks:
+            self.optimize_block(block)
+        if self.jump_to_next:
+            jumps = cfg.remove_jumps_to_next()
+            self.applied["jump-to-next"] += jumps
+            self.removed["jump-to-next"] += jumps
+        self.instructions_before += before
+        self.instructions_after += before - (self.total_removed() - removed)
+
+    def optimize_block(self, block):
+        """Uma passagem sobre os itens do bloco."""
+        output = []
+        window = []  # Posições em output das instruções já vistas
+        changed = False
+        rules_by_opcode = self.rules_by_opcode
+
+        for item in block.items:
+            output.append(item)
+            if type(item) is not Instruction:
+                continue
+
+            window.append(len(output) - 1)
+            # Tenta as regras sobre as janelas que acabam na instrução nova
+            # (e de novo depois de cada substituição)
+            rules = rules_by_opcode.get(item.opcode)
+            while rules:
+                applied = False
+                for name, size, rule in rules:
+                    if len(window) < size:
+                        continue
+                    positions = window[-size:]
+                    instructions = [output[position] for position in positions]
+                    replacement = rule(instructions)
+                    if replacement is None:
+                        continue
+                    # As instruções do início da janela que a regra mantém ficam
+                    # no lugar; as restantes saem (as anotações ficam) e as que
+                    # as substituem entram no fim
+                    kept = 0
+                    while (kept < len(replacement) and kept < size
+                           and replacement[kept] is instructions[kept]):
+                        kept += 1
+                    for position in reversed(positions[kept:]):
+                        del output[position]
+                    del window[len(window) - size + kept:]
+                    for instruction in replacement[kept:]:
+                        output.append(instruction)
+                        window.append(len(output) - 1)
+                    self.count(name, size - len(replacement))
+                    changed = applied = True
+                    break
+                rules = rules_by_opcode.get(output[window[-1]].opcode) if applied and window else None
+
+        if changed:
+            block.items = output
+
+    def count(self, name, removed):
+        self.applied[name] += 1
+        self.removed[name] += removed
+
+    def total_removed(self):
+        return sum(self.removed.values())
+
+    def print_report(self):
+        """Imprime, por regra, quantas vezes foi aplicada e quantas instruções removeu."""
+        print("\n=== OTIMIZAÇÃO PEEPHOLE ===")
+        print(f"{'Regra':<18}{'Aplicações':>12}{'Removidas':>12}")
+        for name in self.rule_names:
+            print(f"{name:<18}{self.applied[name]:>12}{self.removed[name]:>12}")
+        print(f"Instruções: {self.instructions_before} -> {self.instructions_after} "
+              f"({self.total_removed()} removidas)")
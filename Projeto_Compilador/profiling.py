@@ -0,0 +1,120 @@
+# profiling.py - Instrumentação por fase do compilador (--profile)
+import sys
+import json
+import time
+import platform
+import tracemalloc
+from contextlib import contextmanager
+
+import ply
+
+class PhaseProfiler:
+    """Mede o tempo de relógio, o tempo de CPU e o pico de memória de cada fase."""
+
+    enabled = True
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.phases = []     # [{"phase", "wall", "cpu", "peak_memory"}]
+        self.counters = {}   # Ex.: tokens, nós da AST, instruções
+
+    @contextmanager
+    def phase(self, name):
+        """Mede o bloco como uma fase com o nome dado."""
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            peak = None
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - memory_before
+                if started_tracing:
+                    tracemalloc.stop()
+            self.phases.append({"phase": name, "wall": wall, "cpu": cpu, "peak_memory": peak})
+
+    def count(self, name, value):
+        self.counters[name] = value
+
+    def to_dict(self, source=None):
+        """Resultado em formato serializável (JSON)."""
+        from buildcache import compiler_fingerprint
+        return {
+            "source": source,
+            "compiler": compiler_fingerprint(),
+            "python": platform.python_version(),
+            "ply": ply.__version__,
+            "trace_memory": self.trace_memory,
+            "phases": self.phases,
+            "totals": {
+                "wall": sum(phase["wall"] for phase in self.phases),
+                "cpu": sum(phase["cpu"] for phase in self.phases),
+            },
+            "counters": self.counters,
+        }
+
+    def write_json(self, path, source=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(source), f, indent=2)
+
+    def print_report(self, file=sys.stdout):
+        """Imprime a tabela de fases e os contadores."""
+        print("\n=== PERFIL DA COMPILAÇÃO ===", file=file)
+        print(f"{'Fase':<22}{'Relógio (ms)':>14}{'CPU (ms)':>12}{'Pico mem. (KB)':>16}", file=file)
+        for phase in self.phases:
+            peak = f"{phase['peak_memory'] / 1024:.1f}" if phase["peak_memory"] is not None else "-"
+            print(f"{phase['phase']:<22}{phase['wall'] * 1000:>14.2f}{phase['cpu'] * 1000:>12.2f}{peak:>16}", file=file)
+        wall_total = sum(phase["wall"] for phase in self.phases)
+        cpu_total = sum(phase["cpu"] for phase in self.phases)
+        print(f"{'Total':<22}{wall_total * 1000:>14.2f}{cpu_total * 1000:>12.2f}", file=file)
+        if self.trace_memory:
+            print("(tempos medidos com o tracemalloc ativo)", file=file)
+        for name, value in self.counters.items():
+            print(f"{name}: {value}", file=file)
+
+class NullProfiler:
+    """Perfilador que não mede nada (usado quando --profile não está ativo)."""
+
+    enabled = False
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def count(self, name, value):
+        pass
+
+def count_ast_nodes(node):
+    """Número de nós da AST."""
+    if node is None:
+        return 0
+    total = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current is None:
+            continue
+        if isinstance(current, list):
+            stack.extend(current)
+            continue
+        total += 1
+        stack.extend(current.children)
+    return total
+
+def count_instructions(code):
+    """Número de instruções EWVM (sem comentários, linhas vazias e rótulos)."""
+    total = 0
+    for line in code:
+        if line and not line.startswith("//") and not line.endswith(":"):
+            total += 1
+    return total
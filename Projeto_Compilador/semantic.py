@@ -1,11 +1,44 @@
 # semantic.py - Analisador semântico para Pascal Standard (CORRIGIDO)
-from symboltable import SymbolTable
+from symboltable import (SymbolTable, ArrayType, INTEGER, REAL, BOOLEAN, STRING, NUMERIC_TYPES,
+                         scalar_type, array_type,
+                         Storage, GLOBAL, LOCAL, PARAMETER, RESULT, LABEL, UNRESOLVED)
+from visitor import NodeVisitor
+from constfold import value_type, literal_value, fold_binary, fold_unary
 
-class SemanticAnalyzer:
+# Tipos de nó tratados por analyze_statement e check_expression_type
+STATEMENT_TYPES = ('assignment', 'compound_statement', 'if_statement', 'while_statement',
+                   'for_statement', 'procedure_call', 'read_statement', 'write_statement')
+EXPRESSION_TYPES = ('number', 'string', 'boolean', 'variable', 'array_access', 'length_call',
+                    'function_call', 'binary_op', 'unary_op')
+
+# Pares (tipo esperado, tipo encontrado) compatíveis além de tipos iguais:
+# integer pode ser usado onde se espera real (mas não o contrário)
+COMPATIBLE_TYPES = frozenset({(REAL, INTEGER)})
+
+def comparison_type(node, node_type):
+    """Tipo de um operando de comparação: um literal de um só caractere é
+    empilhado como código ASCII e compara-se com um caractere de string (integer)."""
+    if node.type == 'string' and len(node.value) == 1:
+        return INTEGER
+    return node_type
+
+class SemanticAnalyzer(NodeVisitor):
+    DISPATCH = {
+        'statement_handlers': ('analyze_', STATEMENT_TYPES),
+        'expression_handlers': ('check_', EXPRESSION_TYPES),
+    }
+    
     def __init__(self):
+        super().__init__()
         self.symbol_table = SymbolTable()
         self.errors = []
         self.warnings = []
+        # Armazenamento: tamanho da área global e, no subprograma em análise,
+        # o seu símbolo, o armazenamento do valor de retorno e o nº de variáveis locais
+        self.global_size = 0
+        self.subprogram = None
+        self.result_storage = None
+        self.local_count = 0
     
     def analyze(self, ast):
         """Analisa a árvore sintática abstrata."""
@@ -53,12 +86,14 @@ class SemanticAnalyzer:
             id_list_node = var_item.children[0]
             type_node = var_item.children[1]
             
-            var_type = self.get_type_name(type_node)
+            var_type = self.get_type(type_node)
             
             # Adiciona cada variável à tabela de símbolos
             for var_name in id_list_node.value:
                 if not self.symbol_table.add_symbol(var_name, var_type, 'variable', var_item.line):
                     self.errors.append(f"Erro na linha {var_item.line}: Variável '{var_name}' já declarada no escopo atual")
+                else:
+                    self.allocate_variable(self.symbol_table.lookup(var_name, True), type_node)
                 
                 # Se for um array, adiciona as dimensões
                 if type_node.type == 'array_type':
@@ -86,7 +121,7 @@ class SemanticAnalyzer:
             type_name = type_item.value
             type_node = type_item.children[0]
             
-            type_value = self.get_type_name(type_node)
+            type_value = self.get_type(type_node)
             
             if not self.symbol_table.add_symbol(type_name, type_value, 'type', type_item.line):
                 self.errors.append(f"Erro na linha {type_item.line}: Tipo '{type_name}' já declarado no escopo atual")
@@ -95,7 +130,7 @@ class SemanticAnalyzer:
         """Analisa declarações de funções."""
         function_name = function_node.value
         return_type_node = function_node.children[1]
-        return_type = self.get_type_name(return_type_node)
+        return_type = self.get_type(return_type_node)
         
         # Adiciona a função à tabela de símbolos
         if not self.symbol_table.add_symbol(function_name, return_type, 'function', function_node.line):
@@ -103,7 +138,7 @@ class SemanticAnalyzer:
             return
         
         # Entra no escopo da função
-        self.symbol_table.enter_scope(function_name)
+        context = self.enter_subprogram(function_name)
         
         # Analisa os parâmetros
         params_node = function_node.children[0]
@@ -121,7 +156,7 @@ class SemanticAnalyzer:
         self.check_function_return(function_name, body_node)
         
         # Sai do escopo da função
-        self.symbol_table.exit_scope()
+        self.exit_subprogram(context)
     
     def analyze_procedure_declaration(self, procedure_node):
         """Analisa declarações de procedimentos."""
@@ -133,7 +168,7 @@ class SemanticAnalyzer:
             return
         
         # Entra no escopo do procedimento
-        self.symbol_table.enter_scope(procedure_name)
+        context = self.enter_subprogram(procedure_name)
         
         # Analisa os parâmetros
         params_node = procedure_node.children[0]
@@ -148,27 +183,95 @@ class SemanticAnalyzer:
         self.analyze_compound_statement(body_node)
         
         # Sai do escopo do procedimento
-        self.symbol_table.exit_scope()
+        self.exit_subprogram(context)
     
     def analyze_parameters(self, params_node, subprogram_name):
         """Analisa os parâmetros de funções e procedimentos."""
         if params_node.type != 'parameter_list':
             return
         
+        # Os parâmetros ficam abaixo do frame: o primeiro no offset -n, o último no -1,
+        # e o valor de retorno (reservado por quem chama) no offset -(n + 1)
+        offset = -sum(len(param_node.children[0].value) for param_node in params_node.children)
+        self.result_storage = Storage(RESULT, offset - 1, self.subprogram)
+        
         for param_node in params_node.children:
             id_list_node = param_node.children[0]
             type_node = param_node.children[1]
             
-            param_type = self.get_type_name(type_node)
+            param_type = self.get_type(type_node)
             
             # Adiciona cada parâmetro à tabela de símbolos
             for param_name in id_list_node.value:
                 if not self.symbol_table.add_symbol(param_name, param_type, 'parameter', param_node.line):
                     self.errors.append(f"Erro na linha {param_node.line}: Parâmetro '{param_name}' duplicado")
+                else:
+                    param_symbol = self.symbol_table.lookup(param_name, True)
+                    param_symbol.storage = Storage(PARAMETER, offset, param_symbol)
+                offset += 1
                 
                 # Adiciona o parâmetro à lista de parâmetros da função/procedimento
                 self.symbol_table.add_parameter(subprogram_name, param_name, param_type)
     
+    def allocate_variable(self, symbol, type_node):
+        """Reserva o armazenamento de uma variável, global ou local ao subprograma atual."""
+        if self.subprogram is None:
+            symbol.storage = Storage(GLOBAL, self.global_size, symbol)
+            if type_node.type == 'array_type':
+                start, end = type_node.value
+                self.global_size += end - start + 1  # Um valor por elemento
+            else:
+                self.global_size += 1
+        else:
+            # As variáveis locais começam no offset 1 (o offset 0 fica por usar)
+            self.local_count += 1
+            symbol.storage = Storage(LOCAL, self.local_count, symbol)
+    
+    def allocate_temporary(self):
+        """Reserva uma posição escondida, global ou local ao subprograma atual, a seguir às variáveis."""
+        self.symbol_table.scope.temporaries += 1
+        if self.subprogram is None:
+            storage = Storage(GLOBAL, self.global_size, None)
+            self.global_size += 1
+        else:
+            self.local_count += 1
+            storage = Storage(LOCAL, self.local_count, None)
+        return storage
+    
+    def enter_subprogram(self, name):
+        """Entra no escopo de uma função/procedimento; devolve o contexto a repor em exit_subprogram."""
+        symbol = self.symbol_table.lookup(name, True)
+        symbol.storage = Storage(LABEL, name, symbol)
+        context = (self.subprogram, self.result_storage, self.local_count)
+        self.subprogram = symbol
+        self.result_storage = Storage(RESULT, -1, symbol)  # Sem parâmetros; ver analyze_parameters
+        self.local_count = 0
+        self.symbol_table.enter_scope(name)
+        return context
+    
+    def exit_subprogram(self, context):
+        """Sai do escopo do subprograma atual."""
+        self.symbol_table.exit_scope()
+        self.subprogram, self.result_storage, self.local_count = context
+    
+    def bind(self, node, symbol):
+        """Liga um nó que lê ou escreve o nome ao seu armazenamento visto do subprograma atual."""
+        storage = symbol.storage
+        if self.subprogram is not None and symbol.name == self.subprogram.name:
+            # Dentro do subprograma, o seu nome designa o valor de retorno
+            node.binding = self.result_storage
+        elif storage is not None and (storage.kind == GLOBAL or
+                                      (storage.kind != LABEL and symbol.scope == self.symbol_table.current_scope)):
+            node.binding = storage
+        else:
+            if symbol.kind != 'constant':
+                # Tipos, subprogramas fora do seu corpo e variáveis de subprogramas
+                # envolventes: o gerador não tem como os ler nem escrever
+                self.errors.append(f"Erro na linha {getattr(node, 'line', 0)}: '{symbol.name}' não é "
+                                   f"uma variável acessível neste ponto")
+            # As constantes são substituídas pelo valor (constant_value)
+            node.binding = Storage(UNRESOLVED, None, symbol)
+    
     def analyze_compound_statement(self, compound_node):
         """Analisa um bloco de comandos."""
         if compound_node.type != 'compound_statement':
@@ -179,25 +282,10 @@ class SemanticAnalyzer:
     
     def analyze_statement(self, statement_node):
         """Analisa um comando."""
-        if statement_node is None:
-            return
-        
-        if statement_node.type == 'assignment':
-            self.analyze_assignment(statement_node)
-        elif statement_node.type == 'compound_statement':
-            self.analyze_compound_statement(statement_node)
-        elif statement_node.type == 'if_statement':
-            self.analyze_if_statement(statement_node)
-        elif statement_node.type == 'while_statement':
-            self.analyze_while_statement(statement_node)
-        elif statement_node.type == 'for_statement':
-            self.analyze_for_statement(statement_node)
-        elif statement_node.type == 'procedure_call':
-            self.analyze_procedure_call(statement_node)
-        elif statement_node.type == 'read_statement':
-            self.analyze_read_statement(statement_node)
-        elif statement_node.type == 'write_statement':
-            self.analyze_write_statement(statement_node)
+        if statement_node is not None:
+            handler = self.statement_handlers.get(statement_node.type)
+            if handler is not None:
+                handler(statement_node)
     
     def analyze_assignment(self, assignment_node):
         """Analisa uma atribuição."""
@@ -216,16 +304,25 @@ class SemanticAnalyzer:
             self.errors.append(f"Erro na linha {var_node.line}: Não é possível atribuir valor à constante '{var_name}'")
             return
         
+        if var_node.type == 'array_access':
+            # O destino é um elemento: verifica e liga o acesso (e o índice)
+            target_type = self.check_expression_type(var_node)
+            if not self.check_element_target(var_node, var_symbol):
+                return
+        else:
+            self.bind(var_node, var_symbol)
+            target_type = var_symbol.type
+        
         # Verifica o tipo da expressão
         expr_type = self.check_expression_type(expr_node)
         
-        # Se o tipo da expressão for None, não verifica compatibilidade
-        if expr_type is None:
+        # Se algum dos tipos for None, não verifica compatibilidade
+        if target_type is None or expr_type is None:
             return
         
         # Verifica compatibilidade de tipos
-        if not self.are_types_compatible(var_symbol.type, expr_type):
-            self.errors.append(f"Erro na linha {assignment_node.line}: Tipos incompatíveis na atribuição. Esperado '{var_symbol.type}', encontrado '{expr_type}'")
+        if not self.are_types_compatible(target_type, expr_type):
+            self.errors.append(f"Erro na linha {assignment_node.line}: Tipos incompatíveis na atribuição. Esperado '{target_type}', encontrado '{expr_type}'")
     
     def analyze_if_statement(self, if_node):
         """Analisa um comando if."""
@@ -234,7 +331,7 @@ class SemanticAnalyzer:
         
         # Verifica se a condição é booleana
         condition_type = self.check_expression_type(condition_node)
-        if condition_type is not None and condition_type != 'boolean':
+        if condition_type is not None and condition_type is not BOOLEAN:
             self.errors.append(f"Erro na linha {if_node.line}: Condição do if deve ser booleana, encontrado '{condition_type}'")
         
         # Analisa o bloco then
@@ -252,7 +349,7 @@ class SemanticAnalyzer:
         
         # Verifica se a condição é booleana
         condition_type = self.check_expression_type(condition_node)
-        if condition_type is not None and condition_type != 'boolean':
+        if condition_type is not None and condition_type is not BOOLEAN:
             self.errors.append(f"Erro na linha {while_node.line}: Condição do while deve ser booleana, encontrado '{condition_type}'")
         
         # Analisa o corpo do loop
@@ -270,20 +367,54 @@ class SemanticAnalyzer:
         var_symbol = self.symbol_table.lookup(var_name)
         if not var_symbol:
             self.errors.append(f"Erro na linha {for_node.line}: Variável de controle '{var_name}' não declarada")
-        elif var_symbol.type != 'integer':
+        elif var_symbol.type is not INTEGER:
             self.errors.append(f"Erro na linha {for_node.line}: Variável de controle '{var_name}' deve ser do tipo integer")
+        else:
+            self.bind(for_node, var_symbol)
         
         # Verifica se as expressões de início e fim são inteiras
         start_type = self.check_expression_type(start_expr)
-        if start_type is not None and start_type != 'integer':
+        if start_type is not None and start_type is not INTEGER:
             self.errors.append(f"Erro na linha {for_node.line}: Expressão inicial do for deve ser inteira, encontrado '{start_type}'")
         
         end_type = self.check_expression_type(end_expr)
-        if end_type is not None and end_type != 'integer':
+        if end_type is not None and end_type is not INTEGER:
             self.errors.append(f"Erro na linha {for_node.line}: Expressão final do for deve ser inteira, encontrado '{end_type}'")
         
         # Analisa o corpo do loop
         self.analyze_statement(body_node)
+        
+        # O limite é avaliado uma só vez, antes do ciclo: se não for constante,
+        # fica guardado numa posição escondida. Uma variável que o ciclo não
+        # altera é lida diretamente, o que custa o mesmo que ler a posição
+        if end_expr.constant_value is None and not self.is_loop_invariant_variable(end_expr, for_node):
+            for_node.temporary = self.allocate_temporary()
+    
+    def is_loop_invariant_variable(self, expr_node, for_node):
+        """expr_node é uma variável que o ciclo não altera (atribuição, leitura, for ou, sendo global, chamada)?"""
+        binding = expr_node.binding
+        if (expr_node.type != 'variable' or binding is None or binding is for_node.binding
+                or binding.kind not in (GLOBAL, LOCAL, PARAMETER)):
+            return False
+        pending = [for_node.children[2]]
+        while pending:
+            node = pending.pop()
+            if node is None:
+                continue
+            kind = node.type
+            if kind == 'assignment':
+                if node.children[0].binding is binding:
+                    return False
+            elif kind == 'read_statement' and node.children:
+                if any(var_node.binding is binding for var_node in node.children[0].children):
+                    return False
+            elif kind == 'for_statement':
+                if node.binding is binding:
+                    return False
+            elif kind in ('procedure_call', 'function_call') and binding.kind == GLOBAL:
+                return False
+            pending.extend(node.children)
+        return True
     
     def analyze_procedure_call(self, call_node):
         """Analisa uma chamada de procedimento."""
@@ -299,6 +430,8 @@ class SemanticAnalyzer:
             self.errors.append(f"Erro na linha {call_node.line}: '{proc_name}' não é um procedimento")
             return
         
+        call_node.binding = proc_symbol.storage
+        
         # Verifica os argumentos
         if len(call_node.children) > 0:
             args_node = call_node.children[0]
@@ -320,6 +453,22 @@ class SemanticAnalyzer:
                 self.errors.append(f"Erro na linha {var_node.line}: Variável '{var_name}' não declarada")
             elif var_symbol.kind == 'constant':
                 self.errors.append(f"Erro na linha {var_node.line}: Não é possível ler para constante '{var_name}'")
+            else:
+                # Liga o nome (e o índice) e regista o tipo do valor a ler
+                self.check_expression_type(var_node)
+                if var_node.type == 'array_access':
+                    self.check_element_target(var_node, var_symbol)
+    
+    def check_element_target(self, var_node, var_symbol):
+        """Verifica se um elemento pode receber um valor (atribuição ou leitura); devolve se pode."""
+        if var_symbol.type is STRING:
+            self.errors.append(f"Erro na linha {var_node.line}: Não é possível alterar os caracteres da string '{var_node.value}'")
+            return False
+        if var_node.binding is not None and var_node.binding.kind != GLOBAL:
+            # Só os elementos dos arrays globais têm endereço no código gerado
+            self.errors.append(f"Erro na linha {var_node.line}: Não é possível alterar elementos do array local '{var_node.value}'")
+            return False
+        return True
     
     def analyze_write_statement(self, write_node):
         """Analisa um comando write/writeln."""
@@ -371,231 +520,255 @@ class SemanticAnalyzer:
             return
         
         # Verifica o tipo de cada argumento
+        param_types = subprogram_symbol.signature.params
         for i, arg_node in enumerate(args_node.children):
             arg_type = self.check_expression_type(arg_node)
-            param_type = subprogram_symbol.params[i].type
+            param_type = param_types[i]
             
             if arg_type is not None and not self.are_types_compatible(param_type, arg_type):
                 self.errors.append(f"Erro na linha {line}: Tipo incompatível para argumento {i+1} de '{subprogram_symbol.name}'. Esperado '{param_type}', encontrado '{arg_type}'")
     
     def check_expression_type(self, expr_node):
-        """Verifica o tipo de uma expressão."""
-        if expr_node is None:
+        """Verifica o tipo de uma expressão e guarda-o no nó (inferred_type) para a geração de código.
+        
+        Se a expressão for constante, o seu valor fica em constant_value.
+        """
+        if expr_node is not None:
+            handler = self.expression_handlers.get(expr_node.type)
+            if handler is not None:
+                return self.record_expression_type(expr_node, handler(expr_node))
+        return None
+    
+    def record_expression_type(self, expr_node, expr_type):
+        """Guarda no nó o tipo verificado (e o valor, se a expressão for constante); devolve o tipo."""
+        value = self.fold_constant(expr_node)
+        if value is not None:
+            expr_node.constant_value = value
+            expr_type = value_type(value)
+        expr_node.inferred_type = expr_type
+        return expr_type
+    
+    def fold_constant(self, expr_node):
+        """Valor de uma expressão já verificada, a partir dos valores dos filhos; None se não for constante."""
+        if expr_node.type == 'binary_op':
+            left_node, right_node = expr_node.children
+            return fold_binary(expr_node.value, left_node.constant_value, right_node.constant_value)
+        if expr_node.type == 'unary_op':
+            return fold_unary(expr_node.value, expr_node.children[0].constant_value)
+        if expr_node.type == 'variable':
+            binding = expr_node.binding
+            if binding is not None and binding.symbol.kind == 'constant':
+                return binding.symbol.value
+            return None
+        return literal_value(expr_node)
+    
+    def check_number(self, expr_node):
+        """Tipo de uma constante numérica."""
+        # Verifica se é inteiro ou real
+        if isinstance(expr_node.value, int):
+            return INTEGER
+        else:
+            return REAL
+    
+    def check_string(self, expr_node):
+        """Tipo de uma constante string."""
+        return STRING
+    
+    def check_boolean(self, expr_node):
+        """Tipo de uma constante booleana."""
+        return BOOLEAN
+    
+    def check_variable(self, expr_node):
+        """Tipo de uma variável."""
+        var_name = expr_node.value
+        var_symbol = self.symbol_table.lookup(var_name)
+        
+        if not var_symbol:
+            self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Variável '{var_name}' não declarada")
             return None
         
-        if expr_node.type == 'number':
-            # Verifica se é inteiro ou real
-            if isinstance(expr_node.value, int):
-                return 'integer'
+        self.bind(expr_node, var_symbol)
+        return var_symbol.type
+    
+    def check_array_access(self, expr_node):
+        """Tipo de um acesso a array ou a caractere de string."""
+        array_name = expr_node.value
+        index_node = expr_node.children[0]
+        
+        # Verifica se a variável existe
+        var_symbol = self.symbol_table.lookup(array_name)
+        if not var_symbol:
+            self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Variável '{array_name}' não declarada")
+            return None
+        
+        self.bind(expr_node, var_symbol)
+        
+        # Se for uma string, trata como acesso a caractere
+        if var_symbol.type is STRING:
+            # Verifica se o índice é inteiro
+            index_type = self.check_expression_type(index_node)
+            if index_type is not None and index_type is not INTEGER:
+                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Índice de string deve ser inteiro, encontrado '{index_type}'")
+            # Em Pascal, um caractere de string é tratado como integer (código ASCII)
+            return INTEGER
+        
+        # Se for um array
+        elif var_symbol.array_dims:
+            # Verifica se o índice é inteiro
+            index_type = self.check_expression_type(index_node)
+            if index_type is not None and index_type is not INTEGER:
+                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Índice de array deve ser inteiro, encontrado '{index_type}'")
+            
+            # Retorna o tipo do elemento do array
+            if isinstance(var_symbol.type, ArrayType):
+                return var_symbol.type.element
             else:
-                return 'real'
+                return INTEGER
         
-        elif expr_node.type == 'string':
-            return 'string'
+        # Se não for nem string nem array
+        else:
+            self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: '{array_name}' não é um array nem uma string")
+            return None
+    
+    def check_length_call(self, expr_node):
+        """Tipo de uma chamada a length()."""
+        arg_node = expr_node.children[0]
+        arg_type = self.check_expression_type(arg_node)
         
-        elif expr_node.type == 'boolean':
-            return 'boolean'
+        if arg_type is not None and arg_type is not STRING:
+            self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Função length() requer argumento string, encontrado '{arg_type}'")
+            return None
         
-        elif expr_node.type == 'variable':
-            var_name = expr_node.value
-            var_symbol = self.symbol_table.lookup(var_name)
-            
-            if not var_symbol:
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Variável '{var_name}' não declarada")
-                return None
-            
-            return var_symbol.type
+        return INTEGER  # length() retorna um inteiro
+    
+    def check_function_call(self, expr_node):
+        """Tipo de uma chamada de função."""
+        func_name = expr_node.value
+        
+        # Verifica se a função existe
+        func_symbol = self.symbol_table.lookup(func_name)
+        if not func_symbol:
+            self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Função '{func_name}' não declarada")
+            return None
         
-        elif expr_node.type == 'array_access':
-            array_name = expr_node.value
-            index_node = expr_node.children[0]
-            
-            # Verifica se a variável existe
-            var_symbol = self.symbol_table.lookup(array_name)
-            if not var_symbol:
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Variável '{array_name}' não declarada")
-                return None
-            
-            # Se for uma string, trata como acesso a caractere
-            if var_symbol.type == 'string':
-                # Verifica se o índice é inteiro
-                index_type = self.check_expression_type(index_node)
-                if index_type is not None and index_type != 'integer':
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Índice de string deve ser inteiro, encontrado '{index_type}'")
-                # Em Pascal, um caractere de string é tratado como integer (código ASCII)
-                return 'integer'
-            
-            # Se for um array
-            elif var_symbol.array_dims:
-                # Verifica se o índice é inteiro
-                index_type = self.check_expression_type(index_node)
-                if index_type is not None and index_type != 'integer':
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Índice de array deve ser inteiro, encontrado '{index_type}'")
-                
-                # Retorna o tipo do elemento do array
-                if 'array of' in var_symbol.type:
-                    return var_symbol.type.split(' of ')[1]
+        if func_symbol.kind != 'function':
+            self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: '{func_name}' não é uma função")
+            return None
+        
+        expr_node.binding = func_symbol.storage
+        
+        # Verifica os argumentos
+        if len(expr_node.children) > 0:
+            args_node = expr_node.children[0]
+            self.check_arguments(args_node, func_symbol, getattr(expr_node, 'line', 0))
+        
+        return func_symbol.type
+    
+    def check_binary_op(self, expr_node):
+        """Tipo de uma operação binária."""
+        left_node = expr_node.children[0]
+        right_node = expr_node.children[1]
+        operator = expr_node.value  # Lexema, como no código fonte (ex.: '+', 'div', 'AND')
+        
+        left_type = self.check_expression_type(left_node)
+        right_type = self.check_expression_type(right_node)
+        
+        if left_type is None or right_type is None:
+            return None
+        
+        # Operadores aritméticos
+        lexeme = operator.lower()
+        if lexeme in ('+', '-', '*', '/'):
+            if left_type in NUMERIC_TYPES and right_type in NUMERIC_TYPES:
+                # Se um dos operandos for real, o resultado é real
+                if left_type is REAL or right_type is REAL:
+                    return REAL
                 else:
-                    return 'integer'
-            
-            # Se não for nem string nem array
+                    return INTEGER
             else:
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: '{array_name}' não é um array nem uma string")
+                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador '{operator}' requer operandos numéricos")
                 return None
-            
-        # Em semantic.py, no método check_expression_type
-        elif expr_node.type == 'length_call':
-                arg_node = expr_node.children[0]
-                arg_type = self.check_expression_type(arg_node)
-
-                if arg_type is not None and arg_type != 'string':
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Função length() requer argumento string, encontrado '{arg_type}'")
-                    return None
-
-                return 'integer'  # length() retorna um inteiro
-
-        elif expr_node.type == 'function_call':
-            func_name = expr_node.value
-            
-            # Verifica se a função existe
-            func_symbol = self.symbol_table.lookup(func_name)
-            if not func_symbol:
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Função '{func_name}' não declarada")
+        
+        # Operadores div e mod
+        elif lexeme in ('div', 'mod'):
+            if left_type is INTEGER and right_type is INTEGER:
+                return INTEGER
+            else:
+                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador '{operator}' requer operandos inteiros")
                 return None
-            
-            if func_symbol.kind != 'function':
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: '{func_name}' não é uma função")
+        
+        # Operadores relacionais
+        elif lexeme in ('=', '<>', '<', '>', '<=', '>='):
+            left_type = comparison_type(left_node, left_type)
+            right_type = comparison_type(right_node, right_type)
+            if self.are_types_compatible(left_type, right_type):
+                return BOOLEAN
+            else:
+                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Tipos incompatíveis para operador '{operator}'")
                 return None
-            
-            # Verifica os argumentos
-            if len(expr_node.children) > 0:
-                args_node = expr_node.children[0]
-                self.check_arguments(args_node, func_symbol, getattr(expr_node, 'line', 0))
-            
-            return func_symbol.type
         
-        elif expr_node.type == 'binary_op':
-            left_node = expr_node.children[0]
-            right_node = expr_node.children[1]
-            operator = expr_node.value
-            
-            left_type = self.check_expression_type(left_node)
-            right_type = self.check_expression_type(right_node)
-            
-            if left_type is None or right_type is None:
+        # Operadores lógicos
+        elif lexeme in ('and', 'or'):
+            if left_type is BOOLEAN and right_type is BOOLEAN:
+                return BOOLEAN
+            else:
+                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador '{operator}' requer operandos booleanos")
                 return None
-            
-            # Operadores aritméticos
-            if operator in ['PLUS', 'MINUS', 'TIMES', 'DIVIDE']:
-                if left_type in ['integer', 'real'] and right_type in ['integer', 'real']:
-                    # Se um dos operandos for real, o resultado é real
-                    if left_type == 'real' or right_type == 'real':
-                        return 'real'
-                    else:
-                        return 'integer'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador '{operator}' requer operandos numéricos")
-                    return None
-            
-            # Operadores div e mod
-            elif operator in ['DIV', 'MOD']:
-                if left_type == 'integer' and right_type == 'integer':
-                    return 'integer'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador '{operator}' requer operandos inteiros")
-                    return None
-            
-            # Operadores relacionais
-            elif operator in ['EQ', 'NEQ', 'LT', 'GT', 'LTE', 'GTE']:
-                if self.are_types_compatible(left_type, right_type):
-                    return 'boolean'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Tipos incompatíveis para operador '{operator}'")
-                    return None
-            
-            # Operadores lógicos
-            elif operator in ['AND', 'OR']:
-                if left_type == 'boolean' and right_type == 'boolean':
-                    return 'boolean'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador '{operator}' requer operandos booleanos")
-                    return None
+    
+    def check_unary_op(self, expr_node):
+        """Tipo de uma operação unária."""
+        operand_node = expr_node.children[0]
+        operator = expr_node.value.lower()
         
-        elif expr_node.type == 'unary_op':
-            operand_node = expr_node.children[0]
-            operator = expr_node.value
-            
-            operand_type = self.check_expression_type(operand_node)
-            
-            if operand_type is None:
+        operand_type = self.check_expression_type(operand_node)
+        
+        if operand_type is None:
+            return None
+        
+        # Operador unário -
+        if operator == '-':
+            if operand_type in NUMERIC_TYPES:
+                return operand_type
+            else:
+                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador unário '-' requer operando numérico")
                 return None
-            
-            # Operador unário -
-            if operator == 'MINUS':
-                if operand_type in ['integer', 'real']:
-                    return operand_type
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador unário '-' requer operando numérico")
-                    return None
-            
-            # Operador not
-            elif operator == 'NOT':
-                if operand_type == 'boolean':
-                    return 'boolean'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador 'not' requer operando booleano")
-                    return None
         
-        return None
+        # Operador not
+        elif operator == 'not':
+            if operand_type is BOOLEAN:
+                return BOOLEAN
+            else:
+                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador 'not' requer operando booleano")
+                return None
     
-    def get_type_name(self, type_node):
-        """Obtém o nome do tipo a partir do nó de tipo."""
+    def get_type(self, type_node):
+        """Obtém o descritor do tipo a partir do nó de tipo."""
         if type_node.type == 'type':
-            return type_node.value
+            return scalar_type(type_node.value)
         elif type_node.type == 'array_type':
-            element_type = self.get_type_name(type_node.children[0])
-            return f"array of {element_type}"
+            element_type = self.get_type(type_node.children[0])
+            start, end = type_node.value
+            return array_type(element_type, start, end)
         return None
     
     def are_types_compatible(self, type1, type2):
-        """Verifica se dois tipos são compatíveis."""
+        """Verifica se dois tipos são compatíveis (um valor de type2 pode ser usado como type1)."""
         if type1 is None or type2 is None:
             return False
         
-        # Tipos iguais são compatíveis
-        if type1 == type2:
-            return True
-        
-        # Integer é compatível com real (mas não o contrário)
-        if type1 == 'real' and type2 == 'integer':
-            return True
-        
-        # Para strings e caracteres (representados como integer em Pascal)
-        # Caractere individual pode ser tratado como integer
-        if type1 == 'integer' and type2 == 'string':
-            return False  # String não pode ser atribuída a integer diretamente
-        
-        if type1 == 'string' and type2 == 'integer':
-            return False  # Integer não pode ser atribuído a string diretamente
-        
-        return False
+        # Os descritores são únicos: tipos iguais são o mesmo objeto
+        return type1 is type2 or (type1, type2) in COMPATIBLE_TYPES
     
     def evaluate_constant_expression(self, expr_node):
-        """Avalia uma expressão constante para determinar seu tipo e valor."""
-        if expr_node.type == 'number':
-            if isinstance(expr_node.value, int):
-                return 'integer', expr_node.value
-            else:
-                return 'real', expr_node.value
-        
-        elif expr_node.type == 'string':
-            return 'string', expr_node.value
-        
-        elif expr_node.type == 'boolean':
-            return 'boolean', expr_node.value.lower() == 'true'
-        
-        # Para simplificar, não avaliamos expressões complexas
-        return None, None
+        """Avalia uma expressão constante (literais, constantes já declaradas e operações sobre eles).
+        
+        Devolve (tipo, valor), ou (None, None) se não for avaliável em compilação.
+        """
+        self.check_expression_type(expr_node)
+        value = expr_node.constant_value
+        if value is None:
+            return None, None
+        return value_type(value), value
     
     def print_errors(self):
         """Imprime os erros encontrados."""
@@ -1,14 +1,136 @@
 # symboltable.py - Tabela de símbolos para o compilador Pascal
+import sys
+from ir import Instruction
+
+# ===== DESCRITORES DE TIPOS =====
+# Cada tipo é representado por um único objeto imutável (internado pelas
+# funções scalar_type/array_type/subprogram_type), pelo que dois tipos são
+# iguais se e só se forem o mesmo objeto: as comparações são por identidade.
+
+class ScalarType:
+    """Tipo simples (integer, real, boolean, string)."""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+    __repr__ = __str__
+
+class ArrayType:
+    """Array com limites e tipo dos elementos."""
+    __slots__ = ('element', 'low', 'high', 'name')
+
+    def __init__(self, element, low, high):
+        self.element = element
+        self.low = low
+        self.high = high
+        self.name = f"array of {element}"
+
+    def __str__(self):
+        return self.name
+
+    __repr__ = __str__
+
+class SubprogramType:
+    """Assinatura de uma função (result é o tipo devolvido) ou procedimento (result None)."""
+    __slots__ = ('params', 'result', 'name')
+
+    def __init__(self, params, result):
+        self.params = params
+        self.result = result
+        self.name = f"({', '.join(map(str, params))})" + (f": {result}" if result is not None else "")
+
+    def __str__(self):
+        return self.name
+
+    __repr__ = __str__
+
+_scalar_types = {}
+_array_types = {}
+_subprogram_types = {}
+
+def scalar_type(name):
+    """Descritor do tipo simples com este nome."""
+    descriptor = _scalar_types.get(name)
+    if descriptor is None:
+        name = sys.intern(name)
+        descriptor = _scalar_types.setdefault(name, ScalarType(name))
+    return descriptor
+
+def array_type(element, low, high):
+    """Descritor de array[low..high] of element."""
+    key = (element, low, high)
+    descriptor = _array_types.get(key)
+    if descriptor is None:
+        descriptor = _array_types.setdefault(key, ArrayType(element, low, high))
+    return descriptor
+
+def subprogram_type(params, result):
+    """Descritor da assinatura (tipos dos parâmetros, tipo devolvido)."""
+    key = (tuple(params), result)
+    descriptor = _subprogram_types.get(key)
+    if descriptor is None:
+        descriptor = _subprogram_types.setdefault(key, SubprogramType(*key))
+    return descriptor
+
+INTEGER = scalar_type('integer')
+REAL = scalar_type('real')
+BOOLEAN = scalar_type('boolean')
+STRING = scalar_type('string')
+NUMERIC_TYPES = frozenset((INTEGER, REAL))
+
+# ===== ARMAZENAMENTO =====
+# Onde vive o valor de um nome, decidido uma vez pela análise semântica e
+# ligado a cada nó da AST que o usa (ASTNode.binding)
+GLOBAL = 'global'          # Índice na pilha global (pushg/storeg)
+LOCAL = 'local'            # Offset positivo no frame (pushl/storel)
+PARAMETER = 'parameter'    # Offset negativo no frame (pushl/storel)
+RESULT = 'result'          # Valor de retorno da função atual (abaixo dos parâmetros: pushl/storel -(n + 1))
+LABEL = 'label'            # Rótulo de uma função ou procedimento (pusha)
+UNRESOLVED = 'unresolved'  # Nome sem armazenamento acessível (ex.: constantes)
+
+class Storage:
+    """Armazenamento de um nome; load e store são as instruções EWVM (ver ir) que o leem e escrevem."""
+    __slots__ = ('kind', 'index', 'symbol', 'load', 'store')
+
+    def __init__(self, kind, index, symbol):
+        self.kind = kind
+        self.index = index    # Índice global, offset no frame ou rótulo
+        self.symbol = symbol  # Símbolo declarado
+        if kind == GLOBAL:
+            self.load, self.store = Instruction("pushg", index), Instruction("storeg", index)
+        elif kind == LABEL:
+            self.load, self.store = Instruction("pusha", index), None
+        elif kind == UNRESOLVED:
+            # Só chega ao gerador para constantes, que são escritas pelo valor
+            self.load = self.store = None
+        else:
+            self.load, self.store = Instruction("pushl", index), Instruction("storel", index)
+
+    def __repr__(self):
+        return f"Storage({self.kind}, {self.index})"
+
 class Symbol:
+    __slots__ = ('name', 'type', 'kind', 'scope', 'line', 'value', 'params', 'array_dims', 'storage')
+
     def __init__(self, name, type, kind, scope, line, value=None):
         self.name = name        # Nome do símbolo
-        self.type = type        # Tipo do símbolo (integer, real, boolean, string, array, etc.)
+        self.type = type        # Descritor do tipo (INTEGER, array_type(...), etc.; devolvido, nas funções)
         self.kind = kind        # Tipo de símbolo (variable, constant, function, procedure, parameter)
         self.scope = scope      # Escopo do símbolo
         self.line = line        # Linha onde o símbolo foi declarado
         self.value = value      # Valor (para constantes)
         self.params = []        # Parâmetros (para funções e procedimentos)
         self.array_dims = None  # Dimensões (para arrays)
+        self.storage = None     # Armazenamento (variáveis, parâmetros e subprogramas)
+
+    @property
+    def signature(self):
+        """Assinatura de uma função ou procedimento (descritor SubprogramType)."""
+        return subprogram_type([param.type for param in self.params], self.type)
 
     def __str__(self):
         result = f"{self.name} ({self.kind}, {self.type}, escopo: {self.scope}, linha: {self.line})"
@@ -21,50 +143,75 @@ class Symbol:
             result += f", parâmetros: [{params_str}]"
         return result
 
+class Scope:
+    """Um escopo: os seus símbolos, o escopo pai e os escopos filhos."""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.path = f"{parent.path}.{name}" if parent else name  # Ex.: global.Func
+        self.symbols = {}       # Nome -> Symbol
+        self.children = {}      # Nome -> Scope
+        self.temporaries = 0    # Posições escondidas (sem nome) reservadas neste escopo
+
+    def child(self, name):
+        """Escopo filho com o nome dado (criado na primeira vez)."""
+        scope = self.children.get(name)
+        if scope is None:
+            scope = self.children[name] = Scope(name, self)
+        return scope
+
 class SymbolTable:
+    """Tabela de símbolos organizada como uma árvore de escopos.
+
+    Cada escopo guarda os seus símbolos num dicionário próprio; uma procura
+    consulta o escopo atual e sobe pelos pais, sem construir chaves.
+    """
+
     def __init__(self):
-        self.symbols = {}       
-        self.scopes = ["global"] 
-        self.current_scope = "global"
+        self.global_scope = Scope("global")
+        self.scope = self.global_scope  # Escopo atual
+    
+    @property
+    def current_scope(self):
+        """Nome completo do escopo atual (ex.: global.Func)."""
+        return self.scope.path
     
     def enter_scope(self, scope_name):
         """Entra em um novo escopo."""
-        new_scope = f"{self.current_scope}.{scope_name}"
-        self.scopes.append(new_scope)
-        self.current_scope = new_scope
-        return new_scope
+        self.scope = self.scope.child(scope_name)
+        return self.scope.path
     
     def exit_scope(self):
         """Sai do escopo atual."""
-        if len(self.scopes) > 1:
-            self.scopes.pop()
-            self.current_scope = self.scopes[-1]
-        return self.current_scope
+        if self.scope.parent is not None:
+            self.scope = self.scope.parent
+        return self.scope.path
     
     def add_symbol(self, name, type, kind, line, value=None):
         """Adiciona um símbolo à tabela."""
-        key = f"{self.current_scope}.{name}"
-        
-        if key in self.symbols:
+        symbols = self.scope.symbols
+        if name in symbols:
             return False
         
-        self.symbols[key] = Symbol(name, type, kind, self.current_scope, line, value)
+        symbols[sys.intern(name)] = Symbol(name, type, kind, self.scope.path, line, value)
         return True
     
     def lookup(self, name, current_scope_only=False):
         """Procura um símbolo na tabela."""
         # Procura no escopo atual
-        key = f"{self.current_scope}.{name}"
-        if key in self.symbols:
-            return self.symbols[key]
+        scope = self.scope
+        symbol = scope.symbols.get(name)
+        if symbol is not None or current_scope_only:
+            return symbol
         
-        if not current_scope_only:
-            scope = self.current_scope
-            while "." in scope:
-                scope = scope.rsplit(".", 1)[0]  
-                key = f"{scope}.{name}"
-                if key in self.symbols:
-                    return self.symbols[key]
+        # Procura nos escopos envolventes
+        scope = scope.parent
+        while scope is not None:
+            symbol = scope.symbols.get(name)
+            if symbol is not None:
+                return symbol
+            scope = scope.parent
         
         return None
     
@@ -85,10 +232,19 @@ class SymbolTable:
             return True
         return False
     
+    def all_symbols(self):
+        """Pares (escopo.nome, símbolo) de todos os escopos."""
+        stack = [self.global_scope]
+        while stack:
+            scope = stack.pop()
+            for name, symbol in scope.symbols.items():
+                yield f"{scope.path}.{name}", symbol
+            stack.extend(scope.children.values())
+    
     def print_table(self):
         """Imprime a tabela de símbolos."""
         print("\n=== TABELA DE SÍMBOLOS ===")
-        for key, symbol in sorted(self.symbols.items()):
+        for key, symbol in sorted(self.all_symbols()):
             print(f"{key}: {symbol}")
 
 if __name__ == "__main__":
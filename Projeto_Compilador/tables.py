@@ -0,0 +1,106 @@
+# tables.py - Tabelas PLY persistidas (lextab/parsetab) com versão
+import os
+import re
+import shutil
+import tempfile
+import hashlib
+import contextlib
+import importlib.util
+import ply
+
+# Diretório onde ficam os módulos gerados (pode ser redefinido por variável de ambiente)
+TABLES_DIR = os.environ.get(
+    "PASCAL_TABLES_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "_tables"),
+)
+
+def fingerprint(*source_files):
+    """Calcula a impressão digital das fontes que definem as tabelas.
+
+    Qualquer alteração ao lexer, à gramática ou à versão do PLY produz um
+    valor diferente e, por isso, um módulo de tabelas com outro nome.
+    """
+    digest = hashlib.sha1(ply.__version__.encode())
+    for path in source_files:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+def table_name(prefix, *source_files):
+    """Nome versionado do módulo de tabelas (ex.: parsetab_1a2b3c4d5e6f)."""
+    return f"{prefix}_{fingerprint(*source_files)}"
+
+def load_table(name):
+    """Carrega o módulo de tabelas se já existir; senão devolve None.
+
+    Um ficheiro que não se consegue executar (truncado ou de outra versão do
+    PLY) conta como inexistente: as tabelas são geradas outra vez.
+    """
+    path = os.path.join(TABLES_DIR, f"{name}.py")
+    if not os.path.exists(path):
+        return None
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        return None
+    return module
+
+@contextlib.contextmanager
+def generating(name):
+    """Dá ao PLY um diretório temporário para escrever o módulo name e, no fim,
+    publica-o em TABLES_DIR com os.replace e remove as versões antigas.
+
+    Com vários processos a compilar em paralelo (make -j), cada um escreve no
+    seu diretório e nenhum chega a ler um módulo a meio da escrita.
+    """
+    try:
+        os.makedirs(TABLES_DIR, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix=f".{name}.{os.getpid()}.", dir=TABLES_DIR)
+    except OSError:
+        temp_dir = tempfile.mkdtemp()  # Sem escrita em TABLES_DIR: as tabelas não ficam guardadas
+    try:
+        yield temp_dir
+        try:
+            os.replace(os.path.join(temp_dir, f"{name}.py"), os.path.join(TABLES_DIR, f"{name}.py"))
+        except OSError:
+            return
+        remove_tables(name.rsplit('_', 1)[0], keep=name)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def remove_tables(prefix, keep=None):
+    """Remove de TABLES_DIR os módulos versionados de prefix (exceto keep)."""
+    pattern = re.compile(rf"{re.escape(prefix)}_[0-9a-f]{{12}}\.py")
+    try:
+        filenames = os.listdir(TABLES_DIR)
+    except OSError:
+        return
+    for filename in filenames:
+        if pattern.fullmatch(filename) and filename != f"{keep}.py":
+            try:
+                os.remove(os.path.join(TABLES_DIR, filename))
+            except OSError:
+                pass
+
+def build_tables():
+    """Passo de build: regenera as tabelas atuais (com validação completa) e
+    remove as versões antigas. Devolve a lista de ficheiros gerados."""
+    import ply.yacc as yacc
+    import lexer
+    import parser
+
+    os.makedirs(TABLES_DIR, exist_ok=True)
+    for prefix in ("lextab", "lextab_regex", "parsetab"):
+        remove_tables(prefix)
+
+    for reserved_table in (True, False):
+        lexobj = lexer.build_lexer(reserved_table, optimize=False)
+        lexobj.writetab(lexer.lextab_name(reserved_table), TABLES_DIR)
+
+    yacc.yacc(module=parser, tabmodule=parser.parsetab_name(), outputdir=TABLES_DIR, debug=False)
+
+    names = [lexer.lextab_name(True), lexer.lextab_name(False), parser.parsetab_name()]
+    return [os.path.join(TABLES_DIR, f"{name}.py") for name in names]
@@ -191,5 +191,1056 @@ def run_tests():
             else:
                 print(f"❌ Teste falhou!")
 
+def tokens_of(lexer, code):
+    """Devolve a lista (tipo, valor, linha, posição) dos tokens de code."""
+    lexer.input(code)
+    lexer.lineno = 1
+    return [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in lexer]
+
+def test_reserved_table_lexer_matches_regex_lexer():
+    """O lexer com tabela de palavras reservadas produz os mesmos tokens."""
+    from lexer import build_lexer
+    table_lexer = build_lexer(reserved_table=True)
+    regex_lexer = build_lexer(reserved_table=False)
+    
+    sources = list(examples.values())
+    sources.append("BEGIN End end_x Do2 downto DownTo1 WriteLn readLN lengthy Or{c}or and_ 'it''s' 1.5 :=<>..")
+    for code in sources:
+        assert tokens_of(table_lexer, code) == tokens_of(regex_lexer, code)
+
+def test_table_names_follow_source_changes():
+    """O nome do módulo de tabelas muda quando a gramática muda."""
+    from tables import table_name
+    with tempfile.TemporaryDirectory() as temp_dir:
+        grammar_file = os.path.join(temp_dir, "grammar.py")
+        with open(grammar_file, 'w') as f:
+            f.write("def p_a(p):\n    'a : ID'\n")
+        first = table_name('parsetab', grammar_file)
+        assert table_name('parsetab', grammar_file) == first
+        
+        with open(grammar_file, 'a') as f:
+            f.write("def p_b(p):\n    'a : INTEGER_CONST'\n")
+        assert table_name('parsetab', grammar_file) != first
+
+def test_broken_tables_are_regenerated_and_old_versions_removed(monkeypatch):
+    """Um parsetab truncado é gerado outra vez; as versões antigas desaparecem."""
+    import tables
+    import parser as parser_module
+    with tempfile.TemporaryDirectory() as temp_dir:
+        monkeypatch.setattr(tables, "TABLES_DIR", temp_dir)
+        name = parser_module.parsetab_name()
+        stale = os.path.join(temp_dir, "parsetab_000000000000.py")
+        with open(stale, 'w') as f:
+            f.write("_tabversion = '3.10'\n")
+        with open(os.path.join(temp_dir, f"{name}.py"), 'w') as f:
+            f.write("_tabversion = '3.10'\n_lr_action_items = {'PROGRAM':([0,],[")
+
+        parser = parser_module.build_parser()
+        assert parser.parse("program P; begin end.", lexer=parser_module.lexer_module.lexer.clone())
+        assert tables.load_table(name) is not None
+        assert sorted(os.listdir(temp_dir)) == [f"{name}.py"]
+
+def test_compilers_run_concurrently():
+    """Várias instâncias de Compiler compilam em paralelo sem interferirem."""
+    from concurrent.futures import ThreadPoolExecutor
+    from compiler import Compiler
+    
+    sources = list(examples.values()) * 4
+    expected = [Compiler().compile(code) for code in sources]
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda code: Compiler().compile(code), sources))
+    
+    assert results == expected
+    assert all(results)
+
+def test_compiler_line_numbers_restart_per_source():
+    """O número de linha não transita de uma compilação para a seguinte."""
+    from compiler import Compiler
+    compiler = Compiler()
+    code = examples["Exemplo 3: Fatorial"]
+    first = compiler.parse(code)
+    second = compiler.parse(code)
+    assert first.children[1].line == second.children[1].line == 5
+
+def test_ast_nodes_are_compact():
+    """Os nós da AST não têm __dict__ e as folhas partilham o tuplo de filhos vazio."""
+    from parser import EMPTY_CHILDREN
+    from compiler import Compiler
+    ast = Compiler().parse(examples["Exemplo 3: Fatorial"])
+    
+    leaves = []
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        assert not hasattr(node, '__dict__')
+        if not node.children:
+            leaves.append(node)
+        stack.extend(node.children)
+    
+    assert leaves and all(leaf.children is EMPTY_CHILDREN for leaf in leaves)
+
+def test_token_buffer_lexes_source_once():
+    """A listagem de tokens e o parser partilham um único passo do lexer."""
+    from compiler import Compiler
+    compiler = Compiler()
+    code = examples["Exemplo 3: Fatorial"]
+    
+    calls = []
+    lexer_token = compiler.lexer.token
+    compiler.lexer.token = lambda: calls.append(1) or lexer_token()
+    
+    tokens = compiler.tokenize(code)
+    dumped = [(tok.type, tok.lineno) for tok in tokens]
+    ast = compiler.parse(code, tokens)
+    
+    assert len(calls) == len(dumped) + 1  # + o None do fim do código
+    assert ast is not None and ast.children[1].line == 5
+    assert compiler.analyze(ast)
+    assert compiler.generate(ast) == Compiler().compile(code)
+
+def test_parallel_batch_matches_sequential(capsys):
+    """--all -j N gera os mesmos .vm e mantém a ordem dos arquivos."""
+    from main import compile_all_examples
+    
+    def compile_dir(jobs):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i, code in enumerate(examples.values(), 1):
+                with open(os.path.join(temp_dir, f"example{i}.pas"), 'w') as f:
+                    f.write(code)
+            assert compile_all_examples(temp_dir, debug=False, jobs=jobs)
+            outputs = []
+            for i in range(1, len(examples) + 1):
+                with open(os.path.join(temp_dir, f"example{i}.vm")) as f:
+                    outputs.append(f.read())
+        printed = capsys.readouterr().out
+        compiled = [line for line in printed.splitlines() if line.startswith("Compilando: ")]
+        return outputs, [os.path.basename(line) for line in compiled]
+    
+    assert compile_dir(jobs=3) == compile_dir(jobs=1)
+
+def test_build_cache_skips_unchanged_sources():
+    """Fontes sem alterações são servidas da cache; o .vm é reposto se mudar."""
+    from buildcache import BuildCache
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = os.path.join(temp_dir, "prog.pas")
+        output_file = os.path.join(temp_dir, "prog.vm")
+        with open(input_file, 'w') as f:
+            f.write(examples["Exemplo 3: Fatorial"])
+        cache_dir = os.path.join(temp_dir, ".pascache")
+        
+        cache = BuildCache(cache_dir)
+        assert not cache.lookup(input_file, output_file)
+        assert compile_file(input_file, output_file, debug=False)
+        cache.store(input_file, output_file, 0.5)
+        cache.save()
+        with open(output_file) as f:
+            expected = f.read()
+        
+        with open(output_file, 'w') as f:
+            f.write("corrompido\n")
+        cache = BuildCache(cache_dir)
+        assert cache.lookup(input_file, output_file)
+        assert cache.time_saved == 0.5
+        with open(output_file) as f:
+            assert f.read() == expected
+        
+        # Outra versão do compilador (ou outras opções) não reutiliza a entrada
+        assert not BuildCache(cache_dir, options=("outra",)).lookup(input_file, output_file)
+
+def test_ast_cache_round_trip_and_versioning():
+    """A AST guardada gera o mesmo código; entradas de outra gramática ou com erros são ignoradas."""
+    import astcache
+    from compiler import Compiler
+    
+    code = examples["Exemplo 3: Fatorial"]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = astcache.ASTCache(temp_dir)
+        expected = Compiler(ast_cache=cache).compile(code)
+        assert os.path.exists(cache.path(code))
+        
+        cached = cache.load(code)
+        assert cached is not None and cached.children[1].line == 5
+        compiler = Compiler()
+        assert compiler.analyze(cached) and compiler.generate(cached) == expected
+        
+        # Cabeçalho de outra versão da gramática: a entrada não é usada
+        with open(cache.path(code), 'rb') as f:
+            data = f.read()
+        with open(cache.path(code), 'wb') as f:
+            f.write(data.replace(astcache.grammar_fingerprint().encode(), b"000000000000", 1))
+        assert cache.load(code) is None
+        
+        # Um programa com erros léxicos não é guardado
+        bad = code.replace("fat := 1;", "fat := 1; @")
+        assert bad != code
+        Compiler(ast_cache=cache).parse(bad)
+        assert cache.load(bad) is None
+
+def test_passes_dispatch_through_tables():
+    """Os dois passes despacham por tabela, com métodos ligados à própria instância."""
+    import semantic
+    import codegen
+    
+    analyzer = semantic.SemanticAnalyzer()
+    assert set(analyzer.statement_handlers) == set(semantic.STATEMENT_TYPES)
+    assert analyzer.expression_handlers['binary_op'].__self__ is analyzer
+    
+    generator = codegen.CodeGenerator(analyzer.symbol_table)
+    assert set(generator.expression_handlers) == set(codegen.EXPRESSION_TYPES)
+    assert generator.statement_handlers['function_call'] == generator.generate_function_call
+    
+    # Tipos sem método continuam a ser ignorados, como nas antigas cadeias if/elif
+    from parser import ASTNode
+    assert analyzer.check_expression_type(ASTNode('desconhecido')) is None
+    generator.generate_statement(ASTNode('desconhecido'))
+    assert generator.builder.finish().instruction_count() == 0
+
+def test_scope_tree_lookup_and_print_table(capsys):
+    """Procuras sobem pela árvore de escopos; print_table lista 'escopo.nome' ordenado."""
+    from symboltable import SymbolTable
+    table = SymbolTable()
+    table.add_symbol('x', 'integer', 'variable', 1)
+    table.add_symbol('outer', None, 'procedure', 2)
+    assert table.enter_scope('outer') == 'global.outer'
+    table.add_symbol('y', 'real', 'variable', 3)
+    table.enter_scope('inner')
+    table.add_symbol('x', 'boolean', 'variable', 4)
+    
+    assert table.lookup('x').type == 'boolean'
+    assert table.lookup('y').scope == 'global.outer'
+    assert table.lookup('y', current_scope_only=True) is None
+    assert not table.add_symbol('x', 'integer', 'variable', 5)
+    
+    assert table.exit_scope() == 'global.outer'
+    assert table.lookup('x').type == 'integer'
+    table.exit_scope()
+    assert table.exit_scope() == 'global'
+    
+    table.print_table()
+    keys = [line.split(': ')[0] for line in capsys.readouterr().out.splitlines()[2:]]
+    assert keys == ['global.outer', 'global.outer.inner.x', 'global.outer.y', 'global.x']
+
+def test_profile_json_reports_phases_and_counts():
+    """--profile-json regista as fases do pipeline e os contadores."""
+    import json
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = os.path.join(temp_dir, "prog.pas")
+        json_file = os.path.join(temp_dir, "prog.profile.json")
+        with open(input_file, 'w') as f:
+            f.write(examples["Exemplo 3: Fatorial"])
+        assert compile_file(input_file, os.path.join(temp_dir, "prog.vm"), debug=False,
+                            profile_json=json_file)
+        with open(json_file) as f:
+            profile = json.load(f)
+    
+    phases = [phase["phase"] for phase in profile["phases"]]
+    assert phases == ["análise léxica", "análise sintática", "análise semântica",
+                      "geração de código", "código morto", "serialização", "escrita do .vm"]
+    assert all(phase["peak_memory"] is not None for phase in profile["phases"])
+    assert profile["counters"]["tokens"] > profile["counters"]["nós da AST"] > 0
+    assert profile["counters"]["instruções"] > 0
+
+def test_type_descriptors_are_interned():
+    """Tipos iguais são o mesmo descritor; os símbolos não têm __dict__."""
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from symboltable import Symbol, INTEGER, REAL, STRING, array_type, scalar_type
+
+    assert scalar_type('integer') is INTEGER
+    assert array_type(INTEGER, 1, 5) is array_type(INTEGER, 1, 5)
+    assert array_type(INTEGER, 1, 5) is not array_type(INTEGER, 0, 5)
+    assert str(array_type(REAL, 1, 5)) == 'array of real'
+    assert not hasattr(Symbol('x', INTEGER, 'variable', 'global', 1), '__dict__')
+
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(parse_code(examples["Exemplo 5: Soma de Array"]))
+    numeros = analyzer.symbol_table.lookup('numeros')
+    assert numeros.type is array_type(INTEGER, 1, 5)
+    assert numeros.type.element is INTEGER
+
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(parse_code(examples["Exemplo 7: Binário para Inteiro (com função)"]))
+    signature = analyzer.symbol_table.lookup('BinToInt').signature
+    assert signature.params == (STRING,) and signature.result is INTEGER
+
+def test_semantic_pass_binds_names_to_storage():
+    """Cada variável e chamada fica ligada ao seu armazenamento antes da geração de código."""
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from symboltable import GLOBAL, LOCAL, PARAMETER, RESULT, LABEL
+    from compiler import Compiler
+    import ewvm
+
+    ast = parse_code(examples["Exemplo 7: Binário para Inteiro (com função)"])
+    assert SemanticAnalyzer().analyze(ast)
+    
+    bindings = {}
+    for_statements = []
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if node.type == 'for_statement':
+            for_statements.append(node)
+        elif node.type in ('variable', 'array_access', 'function_call'):
+            bindings.setdefault((node.type, node.value), set()).add((node.binding.kind, node.binding.index))
+        stack.extend(node.children)
+    
+    assert bindings[('variable', 'bin')] == {(PARAMETER, -1), (GLOBAL, 0)}
+    assert bindings[('variable', 'potencia')] == {(LOCAL, 3)}
+    assert bindings[('variable', 'valor')] == {(LOCAL, 2), (GLOBAL, 1)}
+    assert bindings[('variable', 'BinToInt')] == {(RESULT, -2)}  # Abaixo do único parâmetro
+    assert bindings[('function_call', 'BinToInt')] == {(LABEL, 'BinToInt')}
+    assert bindings[('array_access', 'bin')] == {(PARAMETER, -1)}
+    assert [(node.binding.kind, node.binding.index) for node in for_statements] == [(LOCAL, 1)]
+
+    # Nomes sem armazenamento são erros (antes saía só um comentário, e nada no modo release);
+    # as constantes continuam a ser escritas pelo valor
+    source = """
+    program Nomes;
+    const N = 5;
+    type T = integer;
+    var x: integer;
+    function F(a: integer): integer;
+    begin
+      F := a
+    end;
+    procedure P;
+    begin
+      writeln(N)
+    end;
+    begin
+      %s;
+      writeln(x)
+    end.
+    """
+    for statement, name in (("x := F", "F"), ("F := 3", "F"), ("x := P", "P"), ("x := T", "T")):
+        for release in (False, True):
+            compiler = Compiler(release=release)
+            assert compiler.compile(source % statement) is None
+            assert compiler.analyzer.errors == [f"Erro na linha 15: '{name}' não é uma variável acessível neste ponto"]
+    assert ewvm.run(Compiler(release=True).compile(source % "x := N + F(2)")).output == "7\n"
+
+def test_codegen_builds_control_flow_graph():
+    """O gerador divide as instruções tipadas em blocos básicos ligados pelos saltos."""
+    from compiler import Compiler
+    from codegen import CodeGenerator
+    from ir import Instruction, serialize
+    
+    source = """
+program Ciclo;
+var i: integer;
+begin
+    i := 0;
+    while i < 3 do
+        i := i + 1;
+    writeln(i)
+end.
+"""
+    for release in (False, True):
+        compiler = Compiler(release=release)
+        ast = compiler.parse(source)
+        assert compiler.analyze(ast)
+        cfg = CodeGenerator(compiler.analyzer.symbol_table, release).generate_cfg(ast)
+        # Sem passes, o serializador dá exatamente o .vm de sempre
+        assert serialize(cfg) == compiler.generate(ast)
+    
+    entry, test, body, end = cfg.blocks
+    assert [block.label for block in cfg.blocks] == [None, 'WHILE0', None, 'ENDWHILE1']
+    assert test.instructions() == [Instruction("pushg", 0), Instruction("pushi", 3),
+                                   Instruction("inf"), Instruction("jz", "ENDWHILE1")]
+    cfg.link()  # As arestas só são ligadas pelas passagens que as usam
+    assert entry.successors == [test] and test.successors == [end, body]
+    assert body.successors == [test] and test.predecessors == [entry, body]
+    assert end.successors == [] and end.last_instruction() == Instruction("stop")
+    assert cfg.instruction_count() == sum(1 for line in serialize(cfg) if not line.endswith(":"))
+
+def test_codegen_uses_inferred_expression_types():
+    """write/read escolhem a instrução pelo tipo inferido, também para locais e expressões."""
+    from compiler import Compiler
+    code = Compiler().compile("""
+program Tipos;
+var x: integer; v: array[1..2] of real;
+procedure mostra(n: integer);
+var r: real; s: string;
+begin
+    readln(r, s);
+    writeln(r, s, s[1], n, length(s))
+end;
+begin
+    readln(x, v[x]);
+    writeln(v[1]);
+    mostra(x)
+end.
+""")
+    instructions = [line for line in code if line in ('atoi', 'atof', 'writei', 'writef', 'writes')]
+    assert instructions == ['atoi', 'atof', 'writef',
+                            'atof', 'writef', 'writes', 'writei', 'writei', 'writei']
+
+    # Operações não avaliadas em compilação também ficam com o tipo (lexemas do parser)
+    code = Compiler().compile("""
+program Operacoes;
+var x: real; n: integer; s: string;
+begin
+    writeln(x * 2.0);
+    writeln(x + n);
+    writeln(-x);
+    writeln(n div 2, n < 3, not (s[1] = 'a'))
+end.
+""")
+    writes = [line for line in code if line in ('writei', 'writef', 'writes')]
+    assert writes == ['writef', 'writef', 'writef', 'writei', 'writei', 'writei']
+
+def cfg_of(lines):
+    """Grafo de fluxo de controlo com as linhas .vm dadas (instruções, rótulos e comentários)."""
+    from ir import Instruction, Annotation, BlockBuilder, TERMINATORS
+    builder = BlockBuilder()
+    for line in lines:
+        if line.startswith("//"):
+            builder.append(Annotation(line))
+        elif line.endswith(":"):
+            builder.place_label(line[:-1])
+        else:
+            opcode, _, argument = line.partition(" ")
+            for convert in (int, float, str):
+                try:
+                    argument = convert(argument) if argument else None
+                    break
+                except ValueError:
+                    pass
+            builder.append(Instruction(opcode, argument))
+            if opcode in TERMINATORS:
+                builder.end_block()
+    return builder.finish()
+
+def test_peephole_rules_and_counts():
+    """Cada regra reescreve o seu padrão nos blocos básicos, sem os atravessar, e conta o que removeu."""
+    from peephole import PeepholeOptimizer, PeepholeError
+    from ir import serialize
+    
+    def optimize(optimizer, code):
+        cfg = cfg_of(code)
+        optimizer.optimize(cfg)
+        return serialize(cfg)
+    
+    code = ["pushi 5", "pushi -1", "mul",
+            "pushg 0", "pushi 0", "equal", "not", "jz ELSE0",
+            "storeg 1", "// comentário", "pushg 1",
+            "pushl 2", "storel 2",
+            "pushi 0", "padd",
+            "jump ENDIF1", "ELSE0:", "ENDIF1:",
+            "storeg 3", "L:", "pushg 3"]
+    optimizer = PeepholeOptimizer()
+    assert optimize(optimizer, code) == [
+        "pushi -5",
+        "pushg 0", "jz ELSE0",
+        "storeg 1", "// comentário", "pushg 1",
+        "ELSE0:", "ENDIF1:",
+        "storeg 3", "L:", "pushg 3"]
+    assert optimizer.removed == {"negate-constant": 2, "truth-test": 3, "identity": 2,
+                                 "load-store": 2, "jump-to-next": 1}
+    assert (optimizer.instructions_before, optimizer.instructions_after) == (17, 7)
+    
+    only_identity = PeepholeOptimizer(["identity"])
+    assert optimize(only_identity, ["pushi 5", "pushi -1", "mul", "pushi 1", "mul"]) == ["pushi 5", "pushi -1", "mul"]
+    # x div 1 só é x com x inteiro (div é a divisão inteira)
+    assert optimize(only_identity, ["pushg 0", "pushi 1", "div"]) == ["pushg 0", "pushi 1", "div"]
+    assert optimize(only_identity, ["pushg 0", "pushi 1", "charat", "// c", "pushi 1", "div"]) == [
+        "pushg 0", "pushi 1", "charat", "// c"]
+    try:
+        PeepholeOptimizer(["nao-existe"])
+        assert False, "regra desconhecida aceite"
+    except PeepholeError:
+        pass
+    try:
+        PeepholeOptimizer(["store-load"])  # Trocava duas instruções por outras duas
+        assert False, "regra retirada aceite"
+    except PeepholeError:
+        pass
+
+def test_peephole_preserves_behaviour_and_saves_steps():
+    """O código otimizado escreve o mesmo na EWVM e executa menos instruções."""
+    import ewvm
+    from compiler import Compiler
+    from peephole import PeepholeOptimizer
+    
+    inputs = {"Exemplo 2: Maior de 3": ["3", "9", "4"], "Exemplo 3: Fatorial": ["5"],
+              "Exemplo 4: Número Primo": ["7"], "Exemplo 5: Soma de Array": ["1", "2", "3", "4", "5"],
+              "Exemplo 6: Binário para Inteiro": ["1011"]}
+    plain_steps = optimized_steps = 0
+    for name, lines in inputs.items():
+        plain = ewvm.run(Compiler().compile(examples[name]), lines)
+        optimized = ewvm.run(Compiler(peephole=PeepholeOptimizer()).compile(examples[name]), lines)
+        assert optimized.output == plain.output
+        assert optimized.steps <= plain.steps
+        plain_steps += plain.steps
+        optimized_steps += optimized.steps
+    assert optimized_steps < plain_steps
+
+def test_release_mode_drops_annotations_only():
+    """--release gera as mesmas instruções sem comentários nem linhas em branco."""
+    import ewvm
+    from compiler import Compiler
+    from main import build_options, parse_release
+    
+    for name, source in examples.items():
+        annotated = Compiler().compile(source)
+        release = Compiler(release=True).compile(source)
+        assert release == [line for line in annotated if line and not line.startswith("//")], name
+    
+    code = Compiler(release=True).compile(examples["Exemplo 3: Fatorial"])
+    assert ewvm.run(code, ["5"]).output == ewvm.run(Compiler().compile(examples["Exemplo 3: Fatorial"]), ["5"]).output
+    assert parse_release(["main.py", "a.pas", "--release"]) and not parse_release(["main.py", "a.pas", "--debug"])
+    assert build_options(None, True) != build_options(None)
+
+def test_arrays_are_allocated_with_pushn_and_assignable():
+    """Um array ocupa uma instrução qualquer que seja o tamanho e aceita a[i] := ..."""
+    import ewvm
+    from compiler import Compiler
+    
+    source = """
+    program Vetor;
+    var a: array[1..%d] of integer; i, s: integer;
+    begin
+      for i := 1 to 10 do
+        a[i] := i * i;
+      a[%d] := a[2] + a[3];
+      s := 0;
+      for i := 1 to 10 do
+        s := s + a[i];
+      writeln(s, ' = ', a[%d])
+    end.
+    """
+    small = Compiler(release=True).compile(source % (10, 10, 10))
+    large = Compiler(release=True).compile(source % (100000, 100000, 100000))
+    assert "pushn 100000" in large and len(large) == len(small)
+    assert ewvm.run(small).output == "298 = 13\n"  # 1+4+...+81 + (4+9)
+    assert ewvm.run(large).output == "385 = 13\n"
+    
+    compiler = Compiler()
+    assert compiler.compile(source.replace("a[i] := i * i", "a[i] := 'x'") % (10, 10, 10)) is None
+    
+    # Só os elementos dos arrays globais podem receber valores
+    targets = """
+    program Destinos;
+    var g: array[1..3] of integer; s: string;
+    procedure Altera(x: integer);
+    var v: array[1..3] of integer;
+    begin
+      %s
+    end;
+    begin
+      Altera(1)
+    end.
+    """
+    for statement in ("v[1] := x", "readln(v[1])", "s[1] := 'a'", "readln(s[1])"):
+        compiler = Compiler()
+        assert compiler.compile(targets % statement) is None
+        assert len(compiler.analyzer.errors) == 1
+    assert ewvm.run(Compiler().compile(targets % "g[1] := x; writeln(g[1])")).output == "1\n"
+
+
+def test_constant_expressions_are_folded_and_dead_branches_pruned():
+    """Constantes e expressões sobre elas são avaliadas em compilação; if com condição constante perde o ramo morto."""
+    import ewvm
+    from compiler import Compiler
+    
+    source = """
+    program Constantes;
+    const
+      N = 10;
+      HALF = N div 2;
+      LIMIT = -HALF * 3 + 40;
+      RATE = 1.5 * 2;
+      DEBUG = not true;
+      NAME = 'total';
+    var i, total: integer;
+    begin
+      total := 0;
+      for i := 1 to N do
+        total := total + (LIMIT - HALF) * 2;
+      if DEBUG or (LIMIT < N) then writeln('morto') else writeln(NAME, ': ', total);
+      writeln(RATE)
+    end.
+    """
+    compiler = Compiler()
+    code = compiler.compile(source)
+    assert code is not None, compiler.analyzer.errors
+    table = compiler.analyzer.symbol_table
+    assert [table.lookup(name).value for name in ("HALF", "LIMIT", "RATE", "DEBUG")] == [5, 25, 3.0, False]
+    assert "pushi 40" in code and 'pushs "morto"' not in code
+    assert not any(line.startswith("// Erro") for line in code)
+    assert ewvm.run(code).output == "total: 400\n3.0\n"
+    
+    # Só são aceites expressões avaliáveis em compilação
+    assert Compiler().compile(source.replace("HALF = N div 2", "HALF = N div 0")) is None
+
+
+def test_procedure_locals_start_at_offset_one():
+    """As variáveis locais de um procedimento começam no offset 1, como nas funções: o offset 0 também é reservado."""
+    import ewvm
+    from compiler import Compiler
+    
+    source = """
+    program Procedimento;
+    var r: integer;
+    procedure Conta(n: integer);
+    var i, s: integer;
+    begin
+      s := 0;
+      for i := 1 to n do
+        s := s + i;
+      r := s
+    end;
+    begin
+      Conta(4);
+      writeln(r)
+    end.
+    """
+    assert ewvm.run(Compiler().compile(source)).output == "10\n"
+
+
+def test_for_limit_is_evaluated_once():
+    """O limite do for é calculado antes do ciclo, numa posição escondida (global ou local)."""
+    import ewvm
+    from compiler import Compiler
+    
+    source = """
+    program Limite;
+    var i, n, total: integer;
+    procedure Conta(texto: string);
+    var i, c: integer;
+    begin
+      c := 0;
+      for i := 1 to length(texto) do
+        c := c + 1;
+      writeln(c)
+    end;
+    begin
+      n := 4;
+      total := 0;
+      for i := 1 to n * 2 do
+      begin
+        n := n + 1;
+        total := total + i
+      end;
+      writeln(total, ', ', n);
+      Conta('abcdef');
+      for i := 1 to 3 do
+        total := total + i;
+      writeln(total)
+    end.
+    """
+    code = Compiler(release=True).compile(source)
+    # Globais i, n, total + 1 posição escondida; locais i, c + 1 no procedimento
+    assert code.count("pushn 1") == 2 and "storeg 3" in code and "storel 3" in code
+    assert code.count("strlen") == 1
+    # O corpo altera n, mas o ciclo faz as 8 iterações calculadas à entrada
+    assert ewvm.run(code).output == "36, 12\n6\n42\n"
+    
+    # Uma variável que o ciclo não altera é lida diretamente, sem posição escondida
+    source = """
+    program Variavel;
+    var i, n, total: integer;
+    procedure Nada;
+    begin
+    end;
+    begin
+      n := 4;
+      total := 0;
+      for i := 1 to n do
+        total := total + i;
+      for i := 1 to n do
+      begin
+        Nada;
+        total := total + 1
+      end;
+      for i := 1 to n do
+        readln(n);
+      for n := 1 to i do
+        total := total + n;
+      writeln(total, ', ', n)
+    end.
+    """
+    code = Compiler(release=True).compile(source)
+    # Só o ciclo com a chamada (n é global) e o que lê n precisam de posições
+    assert "pushn 2" in code and "storeg 3" in code and "storeg 4" in code and "storeg 5" not in code
+    assert ewvm.run(code, ["1", "2", "3", "9"]).output == "29, 6\n"
+
+
+def test_short_circuit_conditions_skip_right_operand():
+    """Com short_circuit o operando da direita de and/or só é avaliado se for preciso."""
+    import pytest
+    import ewvm
+    from compiler import Compiler
+    from main import build_options
+    
+    source = """
+    program Curto;
+    var i, c: integer; texto: string;
+    begin
+      texto := 'banana';
+      c := 0;
+      for i := 0 to 6 do
+        if (i > 0) and (texto[i] = 97) or (i = 0) then
+          c := c + 1;
+      i := 7;
+      while (i > 6) or (texto[i] = 110) do
+        i := i - 1;
+      writeln(c, ', ', i)
+    end.
+    """
+    # Sem short-circuit, texto[0] e texto[7] são lidos e a EWVM falha
+    with pytest.raises(ewvm.VMError):
+        ewvm.run(Compiler().compile(source))
+    code = Compiler(short_circuit=True).compile(source)
+    assert "and" not in code and "or" not in code
+    assert ewvm.run(code).output == "4, 6\n"
+    assert build_options(None, short_circuit=True) != build_options(None)
+
+
+def test_function_results_reach_the_caller():
+    """O valor de retorno fica abaixo dos argumentos, numa posição reservada por quem chama."""
+    import ewvm
+    from compiler import Compiler
+    
+    source = """
+    program Funcoes;
+    function Dobro(n: integer): integer;
+    begin
+      Dobro := n * 2;
+      if Dobro > 10 then Dobro := Dobro - 1
+    end;
+    function Soma(a, b: integer): integer;
+    begin
+      Soma := a + b
+    end;
+    begin
+      writeln(Dobro(3), ', ', Dobro(8), ', ', Soma(Dobro(2), 5))
+    end.
+    """
+    assert ewvm.run(Compiler().compile(source)).output == "6, 15, 9\n"
+    
+    code = Compiler().compile(examples["Exemplo 7: Binário para Inteiro (com função)"])
+    assert ewvm.run(code, ["1011"]).output.endswith("é: 11\n")
+
+
+TAIL_RECURSION_PROGRAM = """
+program Recursao;
+var r: integer;
+
+function MDC(a, b: integer): integer;
+begin
+  if b = 0 then
+    MDC := a
+  else
+    MDC := MDC(b, a mod b);
+end;
+
+function Soma(n, acc: integer): integer;
+begin
+  if n = 0 then
+    Soma := acc
+  else
+  begin
+    Soma := Soma(n - 1, acc + n);
+  end;
+end;
+
+begin
+  r := Soma(%d, 0);
+  writeln(r, ', ', MDC(832040, 514229), ', ', MDC(r, 10))
+end.
+"""
+
+def test_self_tail_calls_run_in_constant_stack():
+    """F := F(...) no fim de F reutiliza o frame: a pilha não cresce com a profundidade da recursão."""
+    import ewvm
+    from compiler import Compiler
+    from codegen import CodeGenerator
+    
+    class NoTailCalls(CodeGenerator):
+        def find_tail_calls(self, statement_node, found):
+            pass
+    
+    def run(depth, generator_class=CodeGenerator):
+        compiler = Compiler()
+        ast = compiler.parse(TAIL_RECURSION_PROGRAM % depth)
+        assert compiler.analyze(ast)
+        return ewvm.run(generator_class(compiler.analyzer.symbol_table, True).generate(ast))
+    
+    shallow, deep = run(10), run(2000)
+    assert shallow.output == "55, 1, 5\n" and deep.output == "2001000, 1, 10\n"
+    assert deep.max_calls == shallow.max_calls == 1
+    assert deep.max_stack == shallow.max_stack
+    
+    # Com chamadas normais, a pilha cresce e são executadas mais instruções
+    plain = run(2000, NoTailCalls)
+    assert plain.output == deep.output
+    assert plain.max_calls > 2000 and plain.steps > deep.steps
+
+
+DEAD_CODE_PROGRAM = """
+program Biblioteca;
+const depurar = false;
+var x: integer;
+
+function Dobro(n: integer): integer;
+begin
+    Dobro := n * 2
+end;
+
+function Quadruplo(n: integer): integer;
+begin
+    Quadruplo := Dobro(Dobro(n))
+end;
+
+procedure Nunca;
+begin
+    writeln(Quadruplo(1))
+end;
+
+function Fatorial(n: integer): integer;
+begin
+    if n <= 1 then
+        Fatorial := 1
+    else
+        Fatorial := n * Fatorial(n - 1)
+end;
+
+begin
+    x := Dobro(21);
+    while depurar do
+        writeln(Fatorial(x));
+    if x > 0 then
+        writeln(x)
+end.
+"""
+
+def test_dead_code_and_unused_subprograms_are_removed():
+    """Só ficam os subprogramas chamados a partir do programa e os blocos alcançáveis."""
+    import ewvm
+    from compiler import Compiler
+    from profiling import count_instructions
+    
+    compiler = Compiler(release=True)
+    code = compiler.compile(DEAD_CODE_PROGRAM)
+    result = compiler.dead_code_result
+    # Quadruplo só é chamada por Nunca; Fatorial só no corpo de um while constante
+    assert result.subprograms == ['Quadruplo', 'Nunca', 'Fatorial']
+    labels = [line[:-1] for line in code if line.endswith(":")]
+    assert labels == ['ELSE2', 'Dobro']  # Sem o ciclo nem o rótulo do fim do if
+    assert not any(line.startswith("jump") for line in code)
+    
+    full = Compiler(release=True, dead_code=False).compile(DEAD_CODE_PROGRAM)
+    assert count_instructions(full) - count_instructions(code) == result.instructions
+    before, after = ewvm.run(full), ewvm.run(code)
+    assert after.output == before.output == "42\n"
+    assert after.steps < before.steps
+    
+    # Nos exemplos, o código morto removido não muda o comportamento
+    for name, inputs in (("Exemplo 6: Binário para Inteiro", ["1011"]),
+                         ("Exemplo 7: Binário para Inteiro (com função)", ["1011"])):
+        source = examples[name]
+        assert (ewvm.run(Compiler().compile(source), inputs).output
+                == ewvm.run(Compiler(dead_code=False).compile(source), inputs).output)
+
+    # --no-dead-code chega ao .vm escrito por compile_file (sem passagens, é o que o
+    # gerador produz) e entra na chave da cache de build
+    from main import build_options
+    from codegen import CodeGenerator
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = os.path.join(temp_dir, "morto.pas")
+        with open(input_file, 'w') as f:
+            f.write(DEAD_CODE_PROGRAM)
+        for dead_code, expected in ((True, code), (False, full)):
+            output_file = os.path.join(temp_dir, f"morto_{dead_code}.vm")
+            assert compile_file(input_file, output_file, debug=False, release=True, dead_code=dead_code)
+            with open(output_file) as f:
+                assert f.read().splitlines() == expected
+    compiler = Compiler(release=True)
+    ast = compiler.parse(DEAD_CODE_PROGRAM)
+    assert compiler.analyze(ast)
+    assert CodeGenerator(compiler.analyzer.symbol_table, release=True).generate(ast) == full
+    assert build_options(None, dead_code=False) != build_options(None)
+
+
+COMMON_SUBEXPRESSION_PROGRAM = """
+program Comuns;
+var a, b, c, x, y, i: integer;
+    v: array[1..5] of integer;
+
+function Muda(n: integer): integer;
+begin
+    a := a + n;
+    Muda := n
+end;
+
+begin
+    a := -2; b := 3; c := 0;
+    x := (a * b) * (a * b) + (a * b);
+    a := a + 1;
+    y := (a * b) + (a * b);
+    writeln(x, ', ', y);
+    x := (a + b) + Muda(1) + (a + b);
+    writeln(x);
+    for i := 1 to 4 do
+        v[i + 1] := v[i] + v[i + 1] + i;
+    writeln(v[5]);
+    a := -2;
+    if (c > 0) and (a * b > 3) or (a * b < 0) then
+        writeln('sim')
+    else
+        writeln('nao')
+end.
+"""
+
+def test_common_subexpressions_are_reused_within_blocks():
+    """a * b e o endereço de v[i + 1] são calculados uma vez; escritas e chamadas obrigam a recalcular."""
+    import ewvm
+    from compiler import Compiler
+    from codegen import CodeGenerator
+    
+    compiler = Compiler()
+    ast = compiler.parse(COMMON_SUBEXPRESSION_PROGRAM)
+    assert compiler.analyze(ast)
+    symbol_table = compiler.analyzer.symbol_table
+    for short_circuit in (False, True):
+        # Sem redução de força, que trataria os endereços de v[i] e v[i + 1] no ciclo
+        code = CodeGenerator(symbol_table, True, short_circuit, common_subexpressions=True,
+                             strength_reduction=False).generate(ast)
+        plain = CodeGenerator(symbol_table, True, short_circuit, strength_reduction=False).generate(ast)
+        # Uma posição escondida, guardada duas vezes: a * b em x e o endereço de v[i + 1]
+        assert "pushn 1" in code and code.count("dup 1") == 2
+        assert code.count("pushg 11") == 3
+        # Só desaparecem dois mul e o i + 1 do endereço: a + b à volta de Muda(1), a * b depois
+        # de a mudar e a * b no operando da condição que pode não ser avaliado são recalculados
+        assert code.count("mul") == plain.count("mul") - 2
+        assert code.count("add") == plain.count("add") - 1
+        result, before = ewvm.run(code), ewvm.run(plain)
+        assert result.output == before.output == "30, -6\n6\n10\nsim\n"
+        assert result.steps < before.steps
+    
+    # Nos exemplos: readln(numeros[i]); soma := soma + numeros[i] calcula o endereço uma vez
+    source = examples["Exemplo 5: Soma de Array"]
+    inputs = ["1", "2", "3", "4", "5"]
+    ast = compiler.parse(source)
+    assert compiler.analyze(ast)
+    symbol_table = compiler.analyzer.symbol_table
+    result = ewvm.run(CodeGenerator(symbol_table, common_subexpressions=True, strength_reduction=False).generate(ast),
+                      inputs)
+    plain = CodeGenerator(symbol_table, strength_reduction=False).generate(ast)
+    before = ewvm.run(plain, inputs)
+    assert result.output == before.output and result.steps < before.steps
+
+    # Com a redução de força ligada (o padrão), que já guarda esse endereço, nenhum
+    # dos exemplos muda: a poupança nos exemplos é zero, e por isso fica desligada por omissão
+    for number in range(1, 10):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), f"example{number}.pas"),
+                  encoding='utf-8') as f:
+            source = f.read()
+        for release in (False, True):
+            assert (Compiler(release=release, common_subexpressions=True).compile(source)
+                    == Compiler(release=release).compile(source))
+
+    # É opcional (--cse) e entra na chave da cache de build
+    from main import build_options
+    source = COMMON_SUBEXPRESSION_PROGRAM
+    assert Compiler(common_subexpressions=True).compile(source) != Compiler().compile(source)
+    assert build_options(None, common_subexpressions=True) != build_options(None)
+
+
+SWEEP_PROGRAM = """
+program Varrimento;
+var i, j, t, s, n: integer;
+    v: array[1..8] of integer;
+
+procedure Conta;
+begin
+    n := n + 1
+end;
+
+function Quadrados(k: integer): integer;
+var m, r: integer;
+begin
+    r := 0;
+    for m := k downto 1 do
+        r := r + v[m] * v[m];
+    Quadrados := r
+end;
+
+begin
+    for i := 1 to 8 do
+        v[i] := (i * 5) mod 8;
+    for i := 7 downto 1 do
+        for j := 1 to i do
+            if v[j] > v[j + 1] then
+            begin
+                t := v[j]; v[j] := v[j + 1]; v[j + 1] := t
+            end;
+    for i := 1 to 8 do
+        write(v[i], '; ');
+    writeln;
+    s := 0;
+    n := 0;
+    for i := 1 to 4 do
+    begin
+        Conta;
+        s := s + v[i] + v[i + 4]
+    end;
+    t := 0;
+    for i := 1 to 7 do
+        t := t + v[i + 1] * (i + 1) + (i + 1) * (i + 1);
+    writeln(s, ', ', n, ', ', Quadrados(8), ', ', t)
+end.
+"""
+
+def test_for_loops_keep_running_element_addresses():
+    """Nos ciclos for, v[i] e v[i + c] leem um endereço que avança com i em vez de o calcular."""
+    import ewvm
+    from compiler import Compiler
+    from codegen import CodeGenerator
+    
+    compiler = Compiler()
+    ast = compiler.parse(SWEEP_PROGRAM)
+    assert compiler.analyze(ast)
+    symbol_table = compiler.analyzer.symbol_table
+    code = CodeGenerator(symbol_table, common_subexpressions=True).generate(ast)
+    running = [line for line in code if line.endswith("atualizado a cada iteração")]
+    # O ciclo que chama Conta fica como está: i é global e Conta poderia alterá-lo
+    assert running == ["// Endereço de v[i], atualizado a cada iteração",
+                       "// Endereço de v[j], atualizado a cada iteração",
+                       "// Endereço de v[i], atualizado a cada iteração",
+                       "// Endereço de v[i], atualizado a cada iteração",
+                       "// Endereço de v[m], atualizado a cada iteração"]
+    # pushgp só no início dos cinco ciclos e nos dois acessos do ciclo com a chamada
+    assert code.count("pushgp") == 7
+    # i + 1 é reutilizado, mas calculado fora de v[i + 1], cujo índice não é gerado
+    assert code.count("// Subexpressão comum, já calculada") == 2
+    assert "pushi -1" in code  # downto
+    
+    expected = "0; 1; 2; 3; 4; 5; 6; 7; \n28, 4, 140, 371\n"
+    for short_circuit in (False, True):
+        reduced = ewvm.run(CodeGenerator(symbol_table, True, short_circuit).generate(ast))
+        plain = ewvm.run(CodeGenerator(symbol_table, True, short_circuit, strength_reduction=False).generate(ast))
+        assert reduced.output == plain.output == expected
+        assert reduced.steps < plain.steps
+    
+    # Exemplo 5: o endereço de numeros[i] serve à leitura e à soma
+    source = examples["Exemplo 5: Soma de Array"]
+    inputs = ["1", "2", "3", "4", "5"]
+    code = Compiler().compile(source)
+    assert code.count("pushgp") == 1
+    assert ewvm.run(code, inputs).output.endswith("é: 15\n")
+
+
 if __name__ == "__main__":
     run_tests()
\ No newline at end of file
@@ -0,0 +1,26 @@
+# visitor.py - Despacho por tipo de nó partilhado pelos passes sobre a AST
+
+class NodeVisitor:
+    """Base dos passes sobre a AST (análise semântica e geração de código).
+
+    Cada subclasse declara em DISPATCH as suas tabelas de despacho:
+
+        DISPATCH = {
+            'statement_handlers': ('analyze_', ('assignment', 'if_statement', ...)),
+        }
+
+    Ao criar o passe, cada tabela passa a ser um atributo com o dicionário
+    {tipo de nó: método ligado prefixo + tipo}. Visitar um nó custa assim uma
+    consulta ao dicionário, em vez de uma comparação de strings por tipo:
+
+        handler = self.statement_handlers.get(node.type)
+        if handler is not None:
+            handler(node)
+    """
+
+    DISPATCH = {}
+
+    def __init__(self):
+        for table_name, (prefix, node_types) in self.DISPATCH.items():
+            setattr(self, table_name, {node_type: getattr(self, prefix + node_type)
+                                       for node_type in node_types})